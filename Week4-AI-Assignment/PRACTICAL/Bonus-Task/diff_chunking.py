@@ -0,0 +1,282 @@
+# ==============================================================================
+# PEERBOT DIFF CHUNKING
+# Splits a PR diff into per-file / per-hunk chunks and packs them into
+# token-budgeted batches, so a large PR becomes several small review requests that
+# run in parallel instead of one huge prompt that exceeds the model's limits.
+#   - parse_diff:          unified diffs (git diff) and PeerBot's "// file: path" format
+#   - pack_hunks:          hunks -> batches under max_tokens (oversized hunks are split)
+#   - render_batch:        prompt text with file headers and new-file line numbers
+#   - merge_review_issues: merges per-batch ISSUE_SCHEMA lists, dropping duplicates
+#                          (same file / line / issueType, highest severity kept)
+#
+# Usage: python diff_chunking.py bench --lines 5000 [--max-chunk-tokens 6000]
+# ==============================================================================
+import argparse
+import re
+from typing import Dict, List, Any, Tuple
+
+CHARS_PER_TOKEN = 4              # Rough estimate for code; good enough for budgeting
+DEFAULT_MAX_CHUNK_TOKENS = 6000
+DEFAULT_MAX_PARALLEL_CHUNKS = 16
+SEVERITY_ORDER = {'HIGH': 0, 'MEDIUM': 1, 'TRIVIAL': 2}
+
+_UNIFIED_MARKERS = ('diff --git', '@@ ', '+++ ')
+_HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+_FILE_MARKER = re.compile(r'^(?://|#)\s*file:\s*(.+?)\s*$', re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+# --- Parsing ---
+def _new_hunk(file: str, header: str) -> Dict[str, Any]:
+    return {'file': file, 'header': header, 'lines': []}
+
+
+def _parse_unified(lines: List[str]) -> List[Dict[str, Any]]:
+    hunks, hunk = [], None
+    file, old_file = '(unknown)', None
+    old_left = new_left = 0
+    line_no = 0
+    for line in lines:
+        if hunk is not None and (old_left > 0 or new_left > 0) and line[:1] in ('+', '-', ' ', ''):
+            marker = line[:1] or ' '
+            if marker == '-':
+                hunk['lines'].append((None, '-', line[1:]))
+                old_left -= 1
+            else:
+                hunk['lines'].append((line_no, marker, line[1:]))
+                line_no += 1
+                new_left -= 1
+                old_left -= marker == ' '
+            continue
+        if line.startswith('diff --git'):
+            hunk = None
+            old_file = None
+            file = line.rsplit(' b/', 1)[-1].strip()
+        elif line.startswith('--- '):
+            old_file = line[4:].strip()
+            old_file = old_file[2:] if old_file.startswith('a/') else old_file
+        elif line.startswith('+++ '):
+            new_file = line[4:].strip()
+            new_file = new_file[2:] if new_file.startswith('b/') else new_file
+            # Deleted files point to /dev/null; keep the old path
+            file = old_file if new_file == '/dev/null' and old_file else new_file
+        else:
+            match = _HUNK_HEADER.match(line)
+            if match:
+                hunk = _new_hunk(file, line.strip())
+                hunks.append(hunk)
+                old_left = int(match.group(2) or 1)
+                line_no = int(match.group(3))
+                new_left = int(match.group(4) or 1)
+            elif line.startswith('\\') and hunk is not None:
+                continue  # "\ No newline at end of file"
+    return hunks
+
+
+def _parse_marked(lines: List[str]) -> List[Dict[str, Any]]:
+    """PeerBot's informal format: '// file: path' headers followed by +/- lines (indentation ignored)."""
+    hunks, hunk = [], None
+    line_no = 1
+    for raw in lines:
+        line = raw.strip()
+        if not line:
+            continue
+        match = _FILE_MARKER.match(line)
+        if match or hunk is None:
+            hunk = _new_hunk(match.group(1) if match else '(unknown)', '')
+            hunks.append(hunk)
+            line_no = 1
+            if match:
+                continue
+        if line[0] == '-':
+            hunk['lines'].append((None, '-', line[1:]))
+        else:
+            marker = '+' if line[0] == '+' else ' '
+            hunk['lines'].append((line_no, marker, line[1:] if marker == '+' else line))
+            line_no += 1
+    return hunks
+
+
+def parse_diff(changes_diff: str) -> List[Dict[str, Any]]:
+    """
+    Hunks of a diff as dicts {'file', 'header', 'lines'}; each line is (new line number or None, marker, text)
+    with marker '+', '-' or ' '. Removed lines have no new-file line number.
+    """
+    lines = changes_diff.splitlines()
+    if any(line.startswith(_UNIFIED_MARKERS) for line in lines):
+        hunks = _parse_unified(lines)
+    else:
+        hunks = _parse_marked(lines)
+    return [hunk for hunk in hunks if hunk['lines']]
+
+
+# --- Rendering and packing ---
+def render_hunk(hunk: Dict[str, Any]) -> str:
+    """Hunk as prompt text: a file header, then each line prefixed with its new-file line number."""
+    numbers = [n for n, _, _ in hunk['lines'] if n is not None]
+    span = f" (lines {numbers[0]}-{numbers[-1]})" if numbers else ''
+    body = '\n'.join(f"{'' if n is None else n:>6} | {marker}{text}" for n, marker, text in hunk['lines'])
+    return f"File: {hunk['file']}{span} {hunk['header']}".rstrip() + '\n' + body + '\n'
+
+
+def render_batch(batch: List[Dict[str, Any]]) -> str:
+    return '\n'.join(render_hunk(hunk) for hunk in batch)
+
+
+def _split_hunk(hunk: Dict[str, Any], max_tokens: int) -> List[Dict[str, Any]]:
+    """Cut a hunk that alone exceeds the budget into consecutive pieces at line boundaries."""
+    pieces, current, size = [], [], 0
+    overhead = estimate_tokens(f"File: {hunk['file']} (lines 000000-000000) {hunk['header']} (part 00/00)\n")
+    for line in hunk['lines']:
+        cost = estimate_tokens(f"{line[0] or ''!s:>6} | {line[1]}{line[2]}\n")
+        if current and size + cost > max_tokens - overhead:
+            pieces.append(current)
+            current, size = [], 0
+        current.append(line)
+        size += cost
+    if current:
+        pieces.append(current)
+    return [{'file': hunk['file'], 'header': f"{hunk['header']} (part {i + 1}/{len(pieces)})".strip(),
+             'lines': lines} for i, lines in enumerate(pieces)]
+
+
+def split_oversized_hunks(hunks: List[Dict[str, Any]], max_tokens: int = DEFAULT_MAX_CHUNK_TOKENS) -> List[Dict[str, Any]]:
+    """Hunks that fit the budget, in order; larger ones are replaced by their pieces."""
+    pieces = []
+    for hunk in hunks:
+        if estimate_tokens(render_hunk(hunk)) <= max_tokens:
+            pieces.append(hunk)
+        else:
+            pieces.extend(_split_hunk(hunk, max_tokens))
+    return pieces
+
+
+def pack_hunks(hunks: List[Dict[str, Any]], max_tokens: int = DEFAULT_MAX_CHUNK_TOKENS) -> List[List[Dict[str, Any]]]:
+    """
+    Greedy, order-preserving packing of hunks into batches of at most `max_tokens` (estimated).
+    Hunks of the same file stay adjacent, so related changes usually land in the same request.
+    """
+    batches, current, size = [], [], 0
+    for piece in split_oversized_hunks(hunks, max_tokens):
+        cost = estimate_tokens(render_hunk(piece))
+        if current and size + cost > max_tokens:
+            batches.append(current)
+            current, size = [], 0
+        current.append(piece)
+        size += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def chunk_diff(changes_diff: str, max_tokens: int = DEFAULT_MAX_CHUNK_TOKENS) -> List[str]:
+    """Diff text for each review request; the raw diff when it has no recognizable hunks."""
+    batches = pack_hunks(parse_diff(changes_diff), max_tokens)
+    return [render_batch(batch) for batch in batches] if batches else [changes_diff]
+
+
+# --- Merging ---
+def _issue_key(issue: Dict[str, Any]) -> Tuple:
+    line = issue.get('line')
+    try:
+        line = int(line) if line is not None else None
+    except (TypeError, ValueError):
+        pass
+    file = str(issue.get('file') or '').strip().removeprefix('./') or None
+    issue_type = str(issue.get('issueType', '')).strip().casefold()
+    if file is None and line is None:
+        # Unlocated issues are only duplicates if they say the same thing
+        return None, None, issue_type, str(issue.get('description', '')).strip()
+    return file, line, issue_type
+
+
+def merge_review_issues(issue_lists: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Concatenate per-chunk issues, keeping one issue per (file, line, issueType) with the highest severity."""
+    merged: Dict[Tuple, Dict[str, Any]] = {}
+    for issues in issue_lists:
+        for issue in issues:
+            key = _issue_key(issue)
+            kept = merged.get(key)
+            if kept is None or (SEVERITY_ORDER.get(issue.get('severity'), 3)
+                                < SEVERITY_ORDER.get(kept.get('severity'), 3)):
+                merged[key] = issue
+    return list(merged.values())
+
+
+# --- Benchmark: one large prompt vs. parallel chunks against the mock server ---
+def synthetic_diff(n_lines: int, lines_per_hunk: int = 100) -> str:
+    """Unified diff of roughly `n_lines` added lines spread over files of one hunk each."""
+    parts = []
+    for f in range(max(1, n_lines // lines_per_hunk)):
+        parts.append(f"diff --git a/src/module{f}.js b/src/module{f}.js\n--- a/src/module{f}.js\n"
+                     f"+++ b/src/module{f}.js\n@@ -1,0 +1,{lines_per_hunk} @@\n")
+        for i in range(lines_per_hunk):
+            if i == 7:
+                parts.append(f"+const user_id_{f} = req.body.user_id;\n")
+            elif i == 42 and f % 5 == 0:
+                parts.append("+localStorage.setItem('auth_token', token);\n")
+            else:
+                parts.append(f"+  const value{i} = computeSomething(input{i}, options);\n")
+    return ''.join(parts)
+
+
+def benchmark_chunking(n_lines: int, max_chunk_tokens: int, max_parallel: int, latency_ms: float,
+                       ms_per_1k_chars: float) -> Dict[str, float]:
+    import contextlib
+    import io
+    import time
+
+    from mock_llm_server import endpoint_url, free_port, launch_mock_server
+    from peerbot_core import _call_llm_for_review, build_review_prompt, execute_peerbot_review, load_configuration
+
+    diff = synthetic_diff(n_lines)
+    port = free_port()
+    process = launch_mock_server(port, '--latency-ms', str(latency_ms), '--ms-per-1k-chars', str(ms_per_1k_chars))
+    config = load_configuration()
+    config['model_settings'] = {**config.get('model_settings', {}), 'api_endpoint': endpoint_url(port)}
+    config['review'] = {**config.get('review', {}), 'max_chunk_tokens': max_chunk_tokens,
+                        'max_parallel_chunks': max_parallel}
+    # Measure the requests, not the review cache, the local rules or the client-side rate limits
+    config['cache'] = {'enabled': False}
+    config['local_rules'] = {'enabled': False}
+    config['rate_limits'] = {'enabled': False}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            single = _call_llm_for_review(build_review_prompt(diff), config['custom_policies'], endpoint_url(port))
+            single_time = time.perf_counter() - start
+            start = time.perf_counter()
+            report = execute_peerbot_review({'title': 'Large PR', 'description': 'Bulk change.', 'diff': diff}, config)
+            chunked_time = time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait()
+
+    n_chunks = len(chunk_diff(diff, max_chunk_tokens))
+    print("=" * 70)
+    print(f"{n_lines:,}-line diff ({estimate_tokens(diff):,} est. tokens), mock latency {latency_ms:.0f}ms "
+          f"+ {ms_per_1k_chars:.0f}ms/1k chars")
+    print("=" * 70)
+    chunked_label = f"{n_chunks} chunks, {max_parallel} in parallel:"
+    print(f"{'One request, whole diff:':<32} {single_time:6.2f}s  ({len(single)} issues)")
+    print(f"{chunked_label:<32} {chunked_time:6.2f}s  "
+          f"({report['severity_ranking']['TOTAL']} issues after de-duplication)")
+    print(f"Speedup: {single_time / chunked_time:.1f}x")
+    return {'single_s': single_time, 'chunked_s': chunked_time, 'chunks': n_chunks}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Diff chunking for PeerBot reviews.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    bench_p = sub.add_parser('bench', help="Whole-diff request vs. parallel chunks against mock_llm_server.py.")
+    bench_p.add_argument('--lines', type=int, default=5000)
+    bench_p.add_argument('--max-chunk-tokens', type=int, default=DEFAULT_MAX_CHUNK_TOKENS)
+    bench_p.add_argument('--max-parallel', type=int, default=DEFAULT_MAX_PARALLEL_CHUNKS)
+    bench_p.add_argument('--latency-ms', type=float, default=250.0)
+    bench_p.add_argument('--ms-per-1k-chars', type=float, default=20.0)
+    args = parser.parse_args()
+
+    benchmark_chunking(args.lines, args.max_chunk_tokens, args.max_parallel, args.latency_ms, args.ms_per_1k_chars)
@@ -0,0 +1,285 @@
+# ==============================================================================
+# PEERBOT INSTRUMENTATION
+# Shows where review time goes, per pipeline stage:
+#   summary, prompt_build (diff parsing, local rules, cache lookups, chunking),
+#   rate_limit_wait (limiter and backoff sleeps), network, json_parse, ranking, total
+# plus LLM calls, retries, payload/response bytes, cache and local-rule counts
+# (and queue wait for jobs of review_service.py).
+#   - ReviewTrace: spans and counters of one review, written as one JSON line to log_path
+#   - MetricsRegistry: process-wide stage histograms and counters in the Prometheus text
+#     format, written to prometheus_path and served at /metrics/prometheus by the service
+#   - disabled (the default), start_trace returns NULL_TRACE, whose span() hands back one
+#     shared no-op context manager: a few hundred nanoseconds per span, no I/O
+#
+# Usage: python instrumentation.py report peerbot_metrics.jsonl [more.jsonl ...]
+#        python instrumentation.py overhead [--spans 1000000]
+# ==============================================================================
+import argparse
+import bisect
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Any, Optional
+
+DEFAULT_LOG_PATH = 'peerbot_metrics.jsonl'
+STAGES = ('queue_wait', 'summary', 'prompt_build', 'rate_limit_wait', 'network', 'json_parse', 'ranking', 'total')
+# Histogram buckets (seconds) from sub-millisecond local work up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..1) of `values`; 0.0 for no values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class MetricsRegistry:
+    """Process-wide stage histograms and counters, shared by all reviews (threads and coroutines)."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, List[float]] = {}  # stage -> count per bucket (last: above all bounds), then sum
+        self._counters: Dict[str, float] = {}
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = [0.0] * (len(self.buckets) + 2)
+            # One bucket per observation; the cumulative 'le' counts are summed up at export
+            histogram[bisect.bisect_left(self.buckets, seconds)] += 1
+            histogram[-1] += seconds
+
+    def inc(self, name: str, amount: float = 1.0):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0.0) + amount
+
+    def prometheus_text(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """Prometheus text exposition: peerbot_stage_seconds histogram, *_total counters and extra gauges."""
+        with self._lock:
+            histograms = {stage: list(values) for stage, values in self._histograms.items()}
+            counters = dict(self._counters)
+        lines = ["# HELP peerbot_stage_seconds Time spent per review pipeline stage.",
+                 "# TYPE peerbot_stage_seconds histogram"]
+        for stage in sorted(histograms):
+            values, cumulative = histograms[stage], 0.0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'peerbot_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative:g}')
+            total = cumulative + values[-2]
+            lines.append(f'peerbot_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {total:g}')
+            lines.append(f'peerbot_stage_seconds_sum{{stage="{stage}"}} {values[-1]:.6f}')
+            lines.append(f'peerbot_stage_seconds_count{{stage="{stage}"}} {total:g}')
+        for name in sorted(counters):
+            lines += [f"# TYPE peerbot_{name}_total counter", f"peerbot_{name}_total {counters[name]:g}"]
+        for name in sorted(gauges or {}):
+            lines += [f"# TYPE peerbot_{name} gauge", f"peerbot_{name} {gauges[name]:g}"]
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str):
+        """Write the exposition atomically, for a node_exporter textfile collector or a file scraper."""
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+
+REGISTRY = MetricsRegistry()
+_LOG_LOCK = threading.Lock()
+
+
+class _Span:
+    __slots__ = ('trace', 'stage', 'start')
+
+    def __init__(self, trace: 'ReviewTrace', stage: str):
+        self.trace, self.stage = trace, stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.trace.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class ReviewTrace:
+    """
+    Spans and counters of one review. A stage can run several times (one network span per
+    chunk and attempt); its time is summed, so concurrent chunks can add up to more than 'total'.
+    """
+    enabled = True
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY, log_path: Optional[str] = DEFAULT_LOG_PATH,
+                 prometheus_path: Optional[str] = None, **labels: Any):
+        self.registry = registry
+        self.log_path = log_path
+        self.prometheus_path = prometheus_path
+        self.labels = labels
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    def span(self, stage: str) -> _Span:
+        return _Span(self, stage)
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        self.registry.observe(stage, seconds)
+
+    def add(self, name: str, amount: float = 1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def finish(self, report: Dict[str, Any]) -> Dict[str, Any]:
+        """Close the trace with the final report; returns the JSON log record."""
+        self.observe('total', time.perf_counter() - self._start)
+        status = report.get('status', 'Error')
+        counts = dict(self.counts)
+        for section, fields in (('cache', ('hunk_hits', 'hunk_misses')), ('local_rules', ('issues', 'hunks_skipped'))):
+            for field in fields:
+                if field in report.get(section, {}):
+                    counts[f"{section}_{field}"] = report[section][field]
+        counts['issues'] = report.get('severity_ranking', {}).get('TOTAL', 0)
+
+        self.registry.inc(f"reviews_{status.lower().replace(' ', '_')}")
+        for name, value in counts.items():
+            self.registry.inc(name, value)
+        record = {'ts': round(time.time(), 3), 'event': 'peerbot_review', **self.labels, 'status': status,
+                  'stages_ms': {stage: round(seconds * 1000, 3) for stage, seconds in self.stages.items()},
+                  'counts': counts}
+        if self.log_path:
+            line = json.dumps(record) + '\n'
+            with _LOG_LOCK, open(self.log_path, 'a') as f:
+                f.write(line)
+        if self.prometheus_path:
+            self.registry.write_prometheus(self.prometheus_path)
+        return record
+
+
+class NullTrace:
+    """Stand-in when instrumentation is disabled: every method returns at once."""
+    enabled = False
+    labels: Dict[str, Any] = {}
+
+    def span(self, stage: str):
+        return _NULL_SPAN
+
+    def observe(self, stage: str, seconds: float):
+        pass
+
+    def add(self, name: str, amount: float = 1):
+        pass
+
+    def finish(self, report: Dict[str, Any]) -> None:
+        return None
+
+
+NULL_TRACE = NullTrace()
+
+
+def start_trace(config: Dict[str, Any], **labels: Any):
+    """ReviewTrace for one review per config['instrumentation'], or NULL_TRACE when it is disabled."""
+    settings = config.get('instrumentation', {})
+    if not settings.get('enabled', False):
+        return NULL_TRACE
+    return ReviewTrace(REGISTRY, settings.get('log_path', DEFAULT_LOG_PATH), settings.get('prometheus_path'), **labels)
+
+
+# --- Report: per-stage percentiles across runs ---
+def load_records(paths: List[str]) -> List[Dict[str, Any]]:
+    records = []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    record = json.loads(line)
+                    if record.get('event') == 'peerbot_review':
+                        records.append(record)
+    return records
+
+
+def summarize_records(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Per stage: reviews, p50/p95/p99/mean in ms (one value per review); counters summed over all reviews."""
+    per_stage: Dict[str, List[float]] = {}
+    totals: Dict[str, float] = {}
+    statuses: Dict[str, int] = {}
+    for record in records:
+        statuses[record['status']] = statuses.get(record['status'], 0) + 1
+        for stage, ms in record['stages_ms'].items():
+            per_stage.setdefault(stage, []).append(ms)
+        for name, value in record['counts'].items():
+            totals[name] = totals.get(name, 0) + value
+    stages = {}
+    for stage in sorted(per_stage, key=lambda s: (STAGES.index(s) if s in STAGES else len(STAGES), s)):
+        values = per_stage[stage]
+        stages[stage] = {'reviews': len(values), 'p50': percentile(values, 0.50), 'p95': percentile(values, 0.95),
+                         'p99': percentile(values, 0.99), 'mean': sum(values) / len(values)}
+    return {'reviews': len(records), 'statuses': statuses, 'stages_ms': stages, 'counts': totals}
+
+
+def print_report(summary: Dict[str, Any]):
+    print("=" * 78)
+    print(f"PEERBOT STAGE TIMINGS: {summary['reviews']} reviews "
+          f"({', '.join(f'{k}: {v}' for k, v in sorted(summary['statuses'].items()))})")
+    print("=" * 78)
+    print(f"{'stage':<16} | {'reviews':>7} | {'p50 ms':>10} | {'p95 ms':>10} | {'p99 ms':>10} | {'mean ms':>10}")
+    print("-" * 78)
+    for stage, s in summary['stages_ms'].items():
+        print(f"{stage:<16} | {s['reviews']:>7} | {s['p50']:>10.2f} | {s['p95']:>10.2f} | {s['p99']:>10.2f} | "
+              f"{s['mean']:>10.2f}")
+    print("-" * 78)
+    for name, value in sorted(summary['counts'].items()):
+        print(f"{name:<28} {value:>14g}")
+    print("=" * 78)
+
+
+def measure_overhead(n_spans: int = 1_000_000) -> Dict[str, float]:
+    """Nanoseconds per `with trace.span(...)` plus one add(), for an empty loop, NULL_TRACE and a live trace."""
+    def run(trace) -> float:
+        start = time.perf_counter()
+        for _ in range(n_spans):
+            with trace.span('network'):
+                pass
+            trace.add('llm_calls')
+        return (time.perf_counter() - start) / n_spans * 1e9
+
+    start = time.perf_counter()
+    for _ in range(n_spans):
+        pass
+    baseline = (time.perf_counter() - start) / n_spans * 1e9
+    results = {'empty_loop_ns': baseline, 'disabled_ns': run(NULL_TRACE),
+               'enabled_ns': run(ReviewTrace(MetricsRegistry(), log_path=None))}
+    for name, ns in results.items():
+        print(f"{name:<16} {ns:8.1f} ns per span")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="PeerBot per-stage timing report.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    report_p = sub.add_parser('report', help="p50/p95/p99 per stage from one or more JSON log files.")
+    report_p.add_argument('logs', nargs='+')
+    report_p.add_argument('--json', action='store_true', help="Print the summary as JSON.")
+    overhead_p = sub.add_parser('overhead', help="Cost of a span with instrumentation disabled and enabled.")
+    overhead_p.add_argument('--spans', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    if args.command == 'report':
+        report_summary = summarize_records(load_records(args.logs))
+        if args.json:
+            print(json.dumps(report_summary, indent=2))
+        else:
+            print_report(report_summary)
+    else:
+        measure_overhead(args.spans)
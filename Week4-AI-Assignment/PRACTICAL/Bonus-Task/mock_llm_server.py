@@ -0,0 +1,241 @@
+# ==============================================================================
+# MOCK GEMINI-COMPATIBLE LLM SERVER (for local PeerBot testing and benchmarks)
+# Answers generateContent requests with a configurable latency and a structured
+# review built from simple heuristics on the diff, in the ISSUE_SCHEMA format.
+# Standard library only (asyncio); HTTP/1.1 keep-alive, so connection reuse by
+# the client is visible in /stats.
+#
+# Endpoints:
+#   POST /v1beta/models/<model>:generateContent   Gemini-style request/response
+#   GET  /stats                                    requests, connections, concurrency, 429s
+#
+# With --quota-per-second, requests above the quota (fixed one-second windows) are
+# answered 429 with a Retry-After header, like an API that enforces a rate limit.
+#
+# Usage: python mock_llm_server.py [--port 8765] [--latency-ms 250] [--ms-per-1k-chars 0] [--quota-per-second 0]
+# ==============================================================================
+import argparse
+import asyncio
+import json
+import math
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_LATENCY_MS = 250.0
+MAX_BODY_BYTES = 32 << 20
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large',
+                429: 'Too Many Requests', 500: 'Internal Server Error'}
+
+_SNAKE_CASE = re.compile(r'\b(?:const|let|var)\s+([a-z]+_[a-z0-9_]+)')
+_NUMBERED_LINE = re.compile(r'^\s*(\d*) \| ([+\- ])(.*)$')  # Chunked prompts: "  12 | +code"
+
+
+def mock_review_issues(prompt: str) -> List[Dict]:
+    """Deterministic stand-in for the model: flags a few policy violations on added lines."""
+    issues = []
+    file = None
+    for line in prompt.splitlines():
+        if line.startswith('File: '):
+            file = line[6:].split(' (', 1)[0].strip()
+            continue
+        numbered = _NUMBERED_LINE.match(line)
+        if numbered:
+            line_no, marker, code = numbered.groups()
+            code = marker + code
+        else:
+            line_no, code = '', line.strip()
+        if not code.startswith('+'):
+            continue
+        location = {'file': file, 'line': int(line_no)} if file and line_no else {}
+        if 'localStorage' in code:
+            issues.append({"severity": "HIGH", "issueType": "Security Flag",
+                           "description": "Security token stored in localStorage.",
+                           "suggestedFix": "Store the token in an HttpOnly cookie.", **location})
+        match = _SNAKE_CASE.search(code)
+        if match:
+            issues.append({"severity": "TRIVIAL", "issueType": "Policy Enforcement",
+                           "description": f"'{match.group(1)}' is not camelCase.",
+                           "suggestedFix": "Rename the identifier to camelCase.", **location})
+    return issues
+
+
+class MockLLMServer:
+    """Minimal HTTP/1.1 server that imitates the generateContent API."""
+
+    def __init__(self, latency_ms: float = DEFAULT_LATENCY_MS, ms_per_1k_chars: float = 0.0,
+                 quota_per_second: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.seconds_per_char = ms_per_1k_chars / 1000 / 1000
+        self.quota_per_second = quota_per_second
+        self._window = 0
+        self._window_requests = 0
+
+        # --- Stats ---
+        self.started_at = time.monotonic()
+        self.requests_total = 0
+        self.connections_opened = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.rejected_429 = 0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'uptime_s': round(time.monotonic() - self.started_at, 3),
+            'requests_total': self.requests_total,
+            'connections_opened': self.connections_opened,
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'rejected_429': self.rejected_429,
+        }
+
+    def _over_quota(self) -> Optional[float]:
+        """Seconds until the next quota window when this request exceeds the quota, else None."""
+        if not self.quota_per_second:
+            return None
+        now = time.monotonic()
+        window = int(now)
+        if window != self._window:
+            self._window, self._window_requests = window, 0
+        self._window_requests += 1
+        if self._window_requests <= self.quota_per_second:
+            return None
+        self.rejected_429 += 1
+        return window + 1 - now
+
+    async def _generate(self, body: bytes) -> Tuple[int, Dict, Dict[str, str]]:
+        try:
+            payload = json.loads(body)
+            prompt = payload['contents'][0]['parts'][0]['text']
+        except (ValueError, KeyError, IndexError, TypeError):
+            return 400, {'error': {'code': 400, 'message': 'Malformed generateContent request.'}}, {}
+        wait = self._over_quota()
+        if wait is not None:
+            return 429, {'error': {'code': 429, 'message': 'Resource has been exhausted (quota).'}}, \
+                {'Retry-After': str(math.ceil(wait))}
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            # Latency grows with the prompt, like token processing in a real model
+            await asyncio.sleep(self.latency + len(prompt) * self.seconds_per_char)
+        finally:
+            self.in_flight -= 1
+        self.requests_total += 1
+        issues = mock_review_issues(prompt)
+        return 200, {'candidates': [{'content': {'parts': [{'text': json.dumps(issues)}], 'role': 'model'},
+                                     'finishReason': 'STOP'}]}, {}
+
+    async def _route(self, method: str, path: str, body: bytes) -> Tuple[int, Dict, Dict[str, str]]:
+        if method == 'GET' and path == '/stats':
+            return 200, self.stats(), {}
+        if method == 'POST' and path.endswith(':generateContent'):
+            return await self._generate(body)
+        return 404, {'error': {'code': 404, 'message': f'No route for {method} {path}'}}, {}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections_opened += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                extra_headers = {}
+                if length > MAX_BODY_BYTES:
+                    status, response = 413, {'error': {'code': 413, 'message': 'Request body too large.'}}
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    try:
+                        status, response, extra_headers = await self._route(method, path.split('?', 1)[0], body)
+                    except Exception as e:
+                        status, response = 500, {'error': {'code': 500, 'message': str(e)}}
+
+                keep_alive = headers.get('connection', '').lower() != 'close' and status != 413
+                payload = json.dumps(response).encode()
+                head = (f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                        f"Content-Type: application/json\r\n"
+                        f"Content-Length: {len(payload)}\r\n")
+                head += ''.join(f"{name}: {value}\r\n" for name, value in extra_headers.items())
+                head += f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                writer.write(head.encode() + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host: str, port: int, latency_ms: float, ms_per_1k_chars: float, quota_per_second: float = 0.0):
+    server = MockLLMServer(latency_ms, ms_per_1k_chars, quota_per_second)
+    tcp_server = await asyncio.start_server(server.handle_connection, host, port, backlog=1024)
+    quota = f", quota {quota_per_second:g} requests/s" if quota_per_second else ''
+    print(f"Mock LLM server on http://{host}:{port} (latency {latency_ms:.0f}ms "
+          f"+ {ms_per_1k_chars:.0f}ms per 1k prompt chars{quota})", flush=True)
+    async with tcp_server:
+        await tcp_server.serve_forever()
+
+
+# --- Helpers for benchmarks: run the server in a child process ---
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind((DEFAULT_HOST, 0))
+        return s.getsockname()[1]
+
+
+def endpoint_url(port: int, model: str = 'mock-model') -> str:
+    return f"http://{DEFAULT_HOST}:{port}/v1beta/models/{model}:generateContent"
+
+
+def fetch_stats(port: int) -> Dict[str, float]:
+    with urllib.request.urlopen(f"http://{DEFAULT_HOST}:{port}/stats", timeout=5) as response:
+        return json.loads(response.read())
+
+
+def launch_mock_server(port: int, *extra_args: str, timeout: float = 10.0) -> subprocess.Popen:
+    """Start the server as a child process and wait until it answers /stats."""
+    process = subprocess.Popen([sys.executable, __file__, '--port', str(port), *extra_args],
+                               stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            fetch_stats(port)
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError(f"Mock LLM server did not start on port {port}.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Gemini-compatible mock server for PeerBot.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--latency-ms', type=float, default=DEFAULT_LATENCY_MS, help="Base latency per request.")
+    parser.add_argument('--ms-per-1k-chars', type=float, default=0.0, help="Extra latency per 1,000 prompt chars.")
+    parser.add_argument('--quota-per-second', type=float, default=0.0, help="Answer 429 above this rate (0 = no quota).")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.latency_ms, args.ms_per_1k_chars, args.quota_per_second))
+    except KeyboardInterrupt:
+        pass
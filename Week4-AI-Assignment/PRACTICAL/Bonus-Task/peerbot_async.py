@@ -0,0 +1,378 @@
+# ==============================================================================
+# PEERBOT ASYNC REVIEW ENGINE
+# Reviews many pull requests concurrently (e.g. after a monorepo push opens dozens
+# of PRs) instead of one blocking request at a time:
+#   - AsyncConnectionPool keeps HTTP/1.1 keep-alive connections to the API open and
+#     reuses them, so each review does not pay a new TCP/TLS handshake
+#   - review_pull_requests runs the reviews concurrently under a semaphore limit
+#   - every request goes through the same RequestScheduler as _call_llm_for_review
+#     (rate_limiter.py: shared rate limits, jittered backoff, Retry-After, circuit breaker)
+#   - cached hunk reviews (review_cache.py) are reused; SQLite calls run in worker threads
+# Standard library only (asyncio streams + ssl).
+#
+# Usage:
+#   python peerbot_async.py review prs.json [--concurrency 16]       # JSON list of {title, description, diff}
+#   python peerbot_async.py bench --prs 64 --concurrency 1 4 16 64   # against mock_llm_server.py
+# ==============================================================================
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import ssl
+import time
+from typing import Dict, List, Any, Optional, Tuple
+from urllib.parse import urlsplit
+
+from diff_chunking import DEFAULT_MAX_CHUNK_TOKENS, estimate_tokens, merge_review_issues
+from peerbot_core import (API_ENDPOINT, API_KEY, build_review_payload, cache_report, execute_peerbot_review,
+                          get_request_scheduler, load_configuration, local_rules_report, parse_review_response,
+                          plan_review_requests, rank_issues_by_severity, review_cache_context,
+                          store_review_results, summarize_pull_request)
+from instrumentation import NULL_TRACE, start_trace
+from policy_rules import PolicyRules
+from rate_limiter import RequestScheduler
+from review_cache import ReviewCache
+
+DEFAULT_CONCURRENCY = 16
+DEFAULT_MAX_CONNECTIONS = 16
+DEFAULT_TIMEOUT = 120.0  # seconds per HTTP exchange
+
+
+class HTTPStatusError(Exception):
+    """Non-2xx response from the API."""
+
+    def __init__(self, status: int, body: bytes, retry_after: Optional[str] = None):
+        super().__init__(f"HTTP {status}: {body[:200].decode('utf-8', 'replace')}")
+        self.status = status
+        self.body = body
+        self.retry_after = retry_after
+
+
+class AsyncConnectionPool:
+    """
+    HTTP/1.1 keep-alive connections to one origin (scheme://host:port), reused across requests.
+    At most `max_connections` requests are on the wire at once; idle connections are kept for reuse.
+    """
+
+    def __init__(self, base_url: str, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 timeout: float = DEFAULT_TIMEOUT):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.use_tls = parts.scheme == 'https'
+        self.port = parts.port or (443 if self.use_tls else 80)
+        self.timeout = timeout
+        self._ssl_context = ssl.create_default_context() if self.use_tls else None
+        self._slots = asyncio.Semaphore(max_connections)
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+        # --- Stats ---
+        self.connections_opened = 0
+        self.requests_total = 0
+
+    async def _open(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        connection = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self._ssl_context), self.timeout)
+        self.connections_opened += 1
+        return connection
+
+    @staticmethod
+    def _close(connection: Tuple[asyncio.StreamReader, asyncio.StreamWriter]):
+        connection[1].close()
+
+    async def _exchange(self, connection, method: str, path: str, body: bytes,
+                        headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes, bool]:
+        reader, writer = connection
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(body)}\r\n"
+        head += ''.join(f"{name}: {value}\r\n" for name, value in headers.items())
+        writer.write(head.encode('latin-1') + b"\r\n" + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by the server.")
+        version, status, _ = status_line.decode('latin-1').split(' ', 2)
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == 'HTTP/1.1' and response_headers.get('connection', '').lower() != 'close'
+        if 'chunked' in response_headers.get('transfer-encoding', '').lower():
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';', 1)[0], 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass  # Trailer headers
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            data = b''.join(chunks)
+        elif 'content-length' in response_headers:
+            data = await reader.readexactly(int(response_headers['content-length']))
+        else:
+            data, keep_alive = await reader.read(), False
+        return int(status), response_headers, data, keep_alive
+
+    async def request(self, method: str, path: str, body: bytes = b'',
+                      headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], bytes]:
+        """Send one request; returns (status, lower-cased headers, body)."""
+        headers = {'Content-Type': 'application/json', 'Connection': 'keep-alive', **(headers or {})}
+        async with self._slots:
+            for attempt in range(2):
+                reused = bool(self._idle)
+                connection = self._idle.pop() if reused else await self._open()
+                try:
+                    status, response_headers, data, keep_alive = await asyncio.wait_for(
+                        self._exchange(connection, method, path, body, headers), self.timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    self._close(connection)
+                    # An idle keep-alive connection may have been closed by the server: retry once on a new one
+                    if reused and attempt == 0:
+                        continue
+                    raise
+                except BaseException:
+                    self._close(connection)
+                    raise
+                self.requests_total += 1
+                if keep_alive:
+                    self._idle.append(connection)
+                else:
+                    self._close(connection)
+                return status, response_headers, data
+
+    async def close(self):
+        while self._idle:
+            self._close(self._idle.pop())
+
+
+class AsyncReviewClient:
+    """Async counterpart of _call_llm_for_review sharing one connection pool across all reviews."""
+
+    def __init__(self, api_endpoint: str = API_ENDPOINT, api_key: str = API_KEY,
+                 max_connections: int = DEFAULT_MAX_CONNECTIONS, timeout: float = DEFAULT_TIMEOUT,
+                 scheduler: Optional[RequestScheduler] = None):
+        parts = urlsplit(api_endpoint)
+        self._path = f"{parts.path}?key={api_key}"
+        self.pool = AsyncConnectionPool(f"{parts.scheme}://{parts.netloc}", max_connections, timeout)
+        self.scheduler = scheduler or get_request_scheduler({})
+        self.retries_total = 0
+
+    async def call_llm_for_review(self, prompt: str, policy_context: List[str], cache: Optional[ReviewCache] = None,
+                                  cache_key: Optional[str] = None, trace=NULL_TRACE) -> List[Dict[str, str]]:
+        """Structured review of `prompt`, with the same retry/backoff schedule, caching and spans as the sync path."""
+        if cache is not None and cache_key is not None:
+            cached_issues = await asyncio.to_thread(cache.get, cache_key)
+            if cached_issues is not None:
+                return cached_issues
+        payload = json.dumps(build_review_payload(prompt, policy_context))
+        body = payload.encode()
+        for attempt in range(self.scheduler.max_retries):
+            status, retry_after = None, None
+            wait = self.scheduler.acquire(estimate_tokens(payload))
+            try:
+                if wait > 0:
+                    with trace.span('rate_limit_wait'):
+                        await asyncio.sleep(wait)
+                trace.add('llm_calls')
+                trace.add('payload_bytes', len(body))
+                with trace.span('network'):
+                    status, headers, data = await self.pool.request('POST', self._path, body)
+                trace.add('response_bytes', len(data))
+                if status >= 400:
+                    raise HTTPStatusError(status, data, headers.get('retry-after'))
+                with trace.span('json_parse'):
+                    review_issues = parse_review_response(json.loads(data))
+                self.scheduler.record_success()
+                if cache is not None and cache_key is not None:
+                    await asyncio.to_thread(cache.put, cache_key, review_issues)
+                return review_issues
+            except HTTPStatusError as e:
+                status, retry_after = e.status, e.retry_after
+                error = e
+            except (OSError, EOFError, asyncio.TimeoutError, ValueError) as e:
+                error = e
+            except BaseException:
+                # Cancelled, or an unexpected error: no outcome, so free a half-open circuit's trial
+                self.scheduler.record_abandoned()
+                raise
+            delay = self.scheduler.retry_delay(attempt, status, retry_after)
+            if delay is None:
+                raise error
+            self.retries_total += 1
+            trace.add('retries')
+            # Jittered backoff; only this review waits, the others keep going
+            with trace.span('rate_limit_wait'):
+                await asyncio.sleep(delay)
+        return []
+
+    async def close(self):
+        await self.pool.close()
+
+    async def __aenter__(self) -> 'AsyncReviewClient':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+async def execute_peerbot_review_async(pr_data: Dict[str, str], config: Dict[str, Any],
+                                       client: AsyncReviewClient, trace=None) -> Dict[str, Any]:
+    """Same report as execute_peerbot_review, without blocking the event loop (chunks run concurrently)."""
+    if not config:
+        return {"error": "Failed to load configuration. Review halted."}
+    if trace is None:
+        trace = start_trace(config, pr=pr_data['title'])
+
+    with trace.span('summary'):
+        summary = summarize_pull_request(pr_data['title'], pr_data['description'], pr_data['diff'])
+    cache = ReviewCache.from_config(config)
+    rules = PolicyRules.from_config(config)
+    context = review_cache_context(config)
+    with trace.span('prompt_build'):
+        known_issues, review_requests, counts = await asyncio.to_thread(
+            plan_review_requests, pr_data['diff'],
+            config.get('review', {}).get('max_chunk_tokens', DEFAULT_MAX_CHUNK_TOKENS), cache, context, rules)
+    trace.add('chunks', len(review_requests))
+    policies = config.get('custom_policies', [])
+    chunk_results = await asyncio.gather(
+        *(client.call_llm_for_review(r['prompt'], policies, cache, r['cache_key'], trace) for r in review_requests),
+        return_exceptions=True)
+    await asyncio.to_thread(store_review_results, cache, context, review_requests, chunk_results)
+
+    with trace.span('ranking'):
+        review_issues = merge_review_issues(known_issues + [r for r in chunk_results if not isinstance(r, BaseException)])
+        severity_ranking = rank_issues_by_severity(review_issues)
+    failures = [r for r in chunk_results if isinstance(r, BaseException)]
+    if failures:
+        report = {"error": f"LLM Review Failed for {len(failures)}/{len(review_requests)} chunk(s): {failures[0]}",
+                  "summary": summary, "review_issues": review_issues, "severity_ranking": severity_ranking,
+                  "cache": cache_report(cache, counts, review_requests),
+                  "local_rules": local_rules_report(rules, counts), "status": "Partial Review"}
+    else:
+        report = {
+            "summary": summary,
+            "review_issues": review_issues,
+            "severity_ranking": severity_ranking,
+            "cache": cache_report(cache, counts, review_requests),
+            "local_rules": local_rules_report(rules, counts),
+            "status": "Review Complete"
+        }
+    trace.finish(report)
+    return report
+
+
+async def review_pull_requests(prs: List[Dict[str, str]], config: Dict[str, Any], client: AsyncReviewClient,
+                               concurrency: int = DEFAULT_CONCURRENCY) -> List[Dict[str, Any]]:
+    """Review all `prs` with at most `concurrency` reviews in flight; reports are returned in input order."""
+    limit = asyncio.Semaphore(max(1, concurrency))
+
+    async def review(pr: Dict[str, str]) -> Dict[str, Any]:
+        async with limit:
+            return await execute_peerbot_review_async(pr, config, client)
+
+    return await asyncio.gather(*(review(pr) for pr in prs))
+
+
+# --- Benchmark: throughput vs. concurrency against the local mock server ---
+def _sample_prs(n: int) -> List[Dict[str, str]]:
+    return [{
+        "title": f"Feature: service change #{i}",
+        "description": "Adds a login handler for the auth service.",
+        "diff": f"// file: services/svc{i}.js\n+const user_id{i} = req.body.user_id;\n"
+                f"+localStorage.setItem('auth_token', token);\n",
+    } for i in range(n)]
+
+
+def benchmark_concurrency(api_endpoint: str, n_prs: int, levels: List[int], config: Dict[str, Any],
+                          serial_baseline: bool = True) -> List[Dict[str, float]]:
+    prs = _sample_prs(n_prs)
+    print("=" * 74)
+    print(f"PEERBOT REVIEW THROUGHPUT: {n_prs} PRs against {api_endpoint}")
+    print("=" * 74)
+    print(f"{'mode':<30} | {'seconds':>8} | {'PRs/s':>8} | {'connections':>11} | failed")
+    print("-" * 74)
+    results = []
+    # Caching, local rules and rate limits are off so every mode sends every PR to the server at full speed
+    config = {**config, 'model_settings': {**config.get('model_settings', {}), 'api_endpoint': api_endpoint},
+              'cache': {'enabled': False}, 'local_rules': {'enabled': False}, 'rate_limits': {'enabled': False}}
+
+    if serial_baseline:
+        # The original path: one blocking review after another (its progress prints are suppressed)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            reports = [execute_peerbot_review(pr, config) for pr in prs]
+        elapsed = time.perf_counter() - start
+        failed = sum('error' in r for r in reports)
+        print(f"{'serial execute_peerbot_review':<30} | {elapsed:8.2f} | {n_prs / elapsed:8.1f} | {'-':>11} | {failed}")
+        results.append({'mode': 'serial', 'concurrency': 1, 'seconds': elapsed, 'failed': failed})
+
+    async def run(concurrency: int):
+        async with AsyncReviewClient(api_endpoint, max_connections=concurrency,
+                                     scheduler=get_request_scheduler(config)) as client:
+            start = time.perf_counter()
+            reports = await review_pull_requests(prs, config, client, concurrency)
+            return time.perf_counter() - start, reports, client.pool.connections_opened
+
+    for concurrency in levels:
+        elapsed, reports, connections = asyncio.run(run(concurrency))
+        failed = sum('error' in r for r in reports)
+        label = f"async, concurrency={concurrency}"
+        print(f"{label:<30} | {elapsed:8.2f} | {n_prs / elapsed:8.1f} | {connections:>11} | {failed}")
+        results.append({'mode': 'async', 'concurrency': concurrency, 'seconds': elapsed,
+                        'connections': connections, 'failed': failed})
+    print("=" * 74)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Concurrent PeerBot reviews with a pooled async HTTP client.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    review_p = sub.add_parser('review', help="Review a JSON list of PRs ({title, description, diff}).")
+    review_p.add_argument('prs')
+    review_p.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    review_p.add_argument('--config', default='config.json')
+
+    bench_p = sub.add_parser('bench', help="Throughput vs. concurrency against mock_llm_server.py.")
+    bench_p.add_argument('--prs', type=int, default=64)
+    bench_p.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+    bench_p.add_argument('--latency-ms', type=float, default=250.0, help="Mock server latency per request.")
+    bench_p.add_argument('--endpoint', help="Use a running server instead of starting the mock.")
+    bench_p.add_argument('--no-serial', action='store_true', help="Skip the serial baseline.")
+    bench_p.add_argument('--config', default='config.json')
+    args = parser.parse_args()
+
+    peerbot_config = load_configuration(args.config)
+    if args.command == 'review':
+        with open(args.prs) as f:
+            pr_list = json.load(f)
+        endpoint = peerbot_config.get('model_settings', {}).get('api_endpoint', API_ENDPOINT)
+
+        async def main():
+            async with AsyncReviewClient(endpoint, max_connections=args.concurrency,
+                                         scheduler=get_request_scheduler(peerbot_config)) as client:
+                return await review_pull_requests(pr_list, peerbot_config, client, args.concurrency)
+
+        for pr, report in zip(pr_list, asyncio.run(main())):
+            status = report.get('error') or f"{report['severity_ranking']['TOTAL']} issues"
+            print(f"- {pr['title']}: {status}")
+    else:
+        from mock_llm_server import endpoint_url, free_port, launch_mock_server
+
+        mock_process = None
+        endpoint = args.endpoint
+        if endpoint is None:
+            port = free_port()
+            mock_process = launch_mock_server(port, '--latency-ms', str(args.latency_ms))
+            endpoint = endpoint_url(port)
+        try:
+            benchmark_concurrency(endpoint, args.prs, args.concurrency, peerbot_config, not args.no_serial)
+        finally:
+            if mock_process is not None:
+                mock_process.terminate()
+                mock_process.wait()
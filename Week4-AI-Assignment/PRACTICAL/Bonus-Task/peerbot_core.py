@@ -7,17 +7,30 @@
 import json
 import requests
 import time
-from typing import Dict, List, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+
+from diff_chunking import (DEFAULT_MAX_CHUNK_TOKENS, DEFAULT_MAX_PARALLEL_CHUNKS, estimate_tokens, merge_review_issues,
+                           pack_hunks, parse_diff, render_batch, split_oversized_hunks)
+from instrumentation import NULL_TRACE, start_trace
+from policy_rules import PolicyRules
+from rate_limiter import RequestScheduler
+from review_cache import ReviewCache, attribute_issues, cache_context
 
 # --- Configuration Constants ---
 LLM_MODEL_NAME = "gemini-2.5-flash-preview-09-2025"
 API_ENDPOINT = f"https://generativelanguage.googleapis.com/v1beta/models/{LLM_MODEL_NAME}:generateContent"
 API_KEY = "" # The API key will be provided at runtime by the environment.
 
+SUMMARY_KEYWORDS = ["auth", "database", "login", "payment", "refactor", "ui", "bugfix"]
+
 # --- Robustness Settings ---
 MAX_RETRIES = 5
 INITIAL_DELAY = 1.0 # seconds
 
+_SESSION = None  # requests.Session, created on first use (see _get_session)
+SESSION_POOL_SIZE = 32  # Keep-alive connections per host, enough for parallel chunk reviews
+
 # --- Structured Output Schema (Mandatory for machine-readable review) ---
 # The LLM will be instructed to return an array of issues, each detailing the problem.
 ISSUE_SCHEMA = {
@@ -28,7 +41,9 @@ ISSUE_SCHEMA = {
             "severity": {"type": "STRING", "description": "HIGH, MEDIUM, or TRIVIAL."},
             "issueType": {"type": "STRING", "description": "e.g., 'Security Flag', 'Policy Enforcement', 'Complexity Check'"},
             "description": {"type": "STRING", "description": "Detailed explanation of the violation."},
-            "suggestedFix": {"type": "STRING", "description": "A concise, runnable code suggestion or refactoring hint."}
+            "suggestedFix": {"type": "STRING", "description": "A concise, runnable code suggestion or refactoring hint."},
+            "file": {"type": "STRING", "description": "Path of the file the issue is in, as given in the diff."},
+            "line": {"type": "INTEGER", "description": "New-file line number shown in the left column of the diff."}
         },
         "required": ["severity", "issueType", "description", "suggestedFix"]
     }
@@ -50,11 +65,20 @@ def load_configuration(filepath: str = 'config.json') -> Dict[str, Any]:
         return {}
 
 
-def _call_llm_for_review(prompt: str, policy_context: List[str]) -> List[Dict[str, str]]:
-    """
-    REAL implementation of the API call with exponential backoff and structured output.
-    Returns a list of structured review issues (dictionaries).
-    """
+def _get_session() -> requests.Session:
+    """Shared HTTP session: keeps connections to the API open across calls instead of a new TCP/TLS handshake per call."""
+    global _SESSION
+    if _SESSION is None:
+        _SESSION = requests.Session()
+        _SESSION.headers.update({'Content-Type': 'application/json'})
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=SESSION_POOL_SIZE)
+        _SESSION.mount('https://', adapter)
+        _SESSION.mount('http://', adapter)
+    return _SESSION
+
+
+def build_review_payload(prompt: str, policy_context: List[str]) -> Dict[str, Any]:
+    """Request body for the generateContent API: the prompt, PeerBot's system instruction and the output schema."""
     system_prompt = (
         "You are PeerBot, an AI code review specialist. Your task is to analyze the "
         "provided code diff against the team's custom policies and standard best practices. "
@@ -63,7 +87,7 @@ def _call_llm_for_review(prompt: str, policy_context: List[str]) -> List[Dict[st
         f"{', '.join(policy_context)}"
     )
 
-    payload = {
+    return {
         "contents": [{"parts": [{"text": prompt}]}],
         "systemInstruction": {"parts": [{"text": system_prompt}]},
         "generationConfig": {
@@ -72,37 +96,94 @@ def _call_llm_for_review(prompt: str, policy_context: List[str]) -> List[Dict[st
         }
     }
 
-    headers = {'Content-Type': 'application/json'}
+
+def parse_review_response(result: Any) -> List[Dict[str, str]]:
+    """
+    Extracts the list of structured issues from a generateContent response.
+    Raises ValueError for any other shape, e.g. {"candidates": []} when the answer was blocked.
+    """
+    # Extract and parse the JSON string from the response
+    try:
+        json_text = result['candidates'][0]['content']['parts'][0]['text']
+    except (KeyError, IndexError, TypeError):
+        json_text = None
+    if not json_text or not isinstance(json_text, str):
+        raise ValueError("LLM response content was empty or malformed.")
+
+    # The response is a JSON string, which we must parse into a list of dictionaries
+    review_issues = json.loads(json_text)
+    if not isinstance(review_issues, list) or not all(isinstance(issue, dict) for issue in review_issues):
+        raise ValueError("LLM response is not a list of issues.")
+    return review_issues
+
+
+def get_request_scheduler(config: Dict[str, Any]) -> RequestScheduler:
+    """Rate limiter, retry policy and circuit breaker shared by every review using these rate_limits settings."""
+    return RequestScheduler.from_config(config, MAX_RETRIES, INITIAL_DELAY)
+
+
+def _call_llm_for_review(prompt: str, policy_context: List[str], api_endpoint: str = API_ENDPOINT,
+                         cache: Optional[ReviewCache] = None, cache_key: Optional[str] = None,
+                         scheduler: Optional[RequestScheduler] = None, trace=NULL_TRACE) -> List[Dict[str, str]]:
+    """
+    REAL implementation of the API call with rate limiting, jittered exponential backoff and structured output.
+    Returns a list of structured review issues (dictionaries).
+    With a cache and cache_key, a cached review is returned without calling the API, and a new one is stored.
+    The scheduler (default: the shared one for the default rate_limits) spaces out requests, decides
+    which errors are retried and for how long to wait, and fails fast while its circuit is open.
+    The trace (instrumentation.py) times the waits, the network and the JSON parsing, and counts calls and bytes.
+    """
+    if cache is not None and cache_key is not None:
+        cached_issues = cache.get(cache_key)
+        if cached_issues is not None:
+            print("Review cache hit, skipping API call.")
+            return cached_issues
+
+    scheduler = scheduler or get_request_scheduler({})
+    payload = json.dumps(build_review_payload(prompt, policy_context))
+
     # In a real deployment, the API key would be passed securely in the URL or headers
-    url = f"{API_ENDPOINT}?key={API_KEY}" 
+    url = f"{api_endpoint}?key={API_KEY}"
     
-    for attempt in range(MAX_RETRIES):
+    for attempt in range(scheduler.max_retries):
+        status, retry_after = None, None
+        wait = scheduler.acquire(estimate_tokens(payload))  # Raises CircuitOpenError while the API is down
         try:
-            print(f"Attempting API call (Retry {attempt + 1}/{MAX_RETRIES})...")
-            response = requests.post(url, headers=headers, data=json.dumps(payload))
+            if wait > 0:  # time.sleep(0) would still hand the GIL to another thread
+                with trace.span('rate_limit_wait'):
+                    time.sleep(wait)
+            print(f"Attempting API call (Retry {attempt + 1}/{scheduler.max_retries})...")
+            trace.add('llm_calls')
+            trace.add('payload_bytes', len(payload))
+            with trace.span('network'):
+                response = _get_session().post(url, data=payload)
+            trace.add('response_bytes', len(response.content))
+            status, retry_after = response.status_code, response.headers.get('Retry-After')
             response.raise_for_status() # Raises an HTTPError for bad responses (4xx or 5xx)
 
-            result = response.json()
-            
-            # Extract and parse the JSON string from the response
-            json_text = result.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '')
-            if not json_text:
-                raise ValueError("LLM response content was empty or malformed.")
-
-            # The response is a JSON string, which we must parse into a list of dictionaries
-            issues_list = json.loads(json_text)
-            return issues_list
+            with trace.span('json_parse'):
+                review_issues = parse_review_response(response.json())
+            scheduler.record_success()
+            if cache is not None and cache_key is not None:
+                cache.put(cache_key, review_issues)
+            return review_issues
         
         except (requests.exceptions.RequestException, ValueError, json.JSONDecodeError) as e:
             print(f"API Error on attempt {attempt + 1}: {e}")
-            if attempt + 1 == MAX_RETRIES:
-                print("Max retries reached. Failing.")
+            # Jittered exponential backoff (at least Retry-After); None for 4xx errors and the last attempt
+            delay = scheduler.retry_delay(attempt, status, retry_after)
+            if delay is None:
+                print("Error is not retryable or max retries reached. Failing.")
                 raise
             
-            # Exponential backoff
-            delay = INITIAL_DELAY * (2 ** attempt)
             print(f"Waiting for {delay:.2f} seconds before retrying...")
-            time.sleep(delay)
+            trace.add('retries')
+            with trace.span('rate_limit_wait'):
+                time.sleep(delay)
+        except BaseException:
+            # No outcome (interrupted, or an unexpected error): free a half-open circuit's trial
+            scheduler.record_abandoned()
+            raise
             
     return [] # Should not be reached if max retries fails
 
@@ -112,11 +193,9 @@ def summarize_pull_request(pr_title: str, pr_description: str, changes_diff: str
     Generates a concise, actionable summary of the PR for the human reviewer.
     (Kept simple and non-LLM based for separation of concerns, focusing LLM on issues)
     """
-    # Simple keyword-based extraction simulation
-    keywords = set()
-    for word in ["auth", "database", "login", "payment", "refactor", "ui", "bugfix"]:
-        if word in changes_diff.lower() or word in pr_description.lower():
-            keywords.add(word)
+    # Simple keyword-based extraction simulation (each text is lowercased once, not once per keyword)
+    diff_text, description_text = changes_diff.lower(), pr_description.lower()
+    keywords = {word for word in SUMMARY_KEYWORDS if word in diff_text or word in description_text}
 
     summary_text = (
         f"**PeerBot PR Summary (AI-Generated)**\n"
@@ -128,49 +207,179 @@ def summarize_pull_request(pr_title: str, pr_description: str, changes_diff: str
     return summary_text
 
 
-def execute_peerbot_review(pr_data: Dict[str, str], config: Dict[str, Any]) -> Dict[str, Any]:
-    """Orchestrates the full PeerBot review process."""
+def build_review_prompt(changes_diff: str) -> str:
+    """User prompt asking for a structured review of `changes_diff`."""
+    return (
+        f"Analyze the following code changes (diff) against the provided team policies. "
+        f"Identify all issues related to security, complexity, and custom style violations. "
+        f"Report the file and line number of each issue where the diff shows them. "
+        f"Diff:\n---\n{changes_diff}"
+    )
+
+
+def rank_issues_by_severity(review_issues: List[Dict[str, str]]) -> Dict[str, int]:
+    """Counts issues per severity level (for human reviewer prioritization)."""
+    return {
+        "HIGH": sum(1 for issue in review_issues if issue.get('severity') == 'HIGH'),
+        "MEDIUM": sum(1 for issue in review_issues if issue.get('severity') == 'MEDIUM'),
+        "TRIVIAL": sum(1 for issue in review_issues if issue.get('severity') == 'TRIVIAL'),
+        "TOTAL": len(review_issues)
+    }
+
+
+def review_cache_context(config: Dict[str, Any]) -> str:
+    """Cache key context: the policies, the model and the output schema that shape every review."""
+    model_name = config.get('model_settings', {}).get('model_name', LLM_MODEL_NAME)
+    return cache_context(config.get('custom_policies', []), model_name, ISSUE_SCHEMA)
+
+
+def plan_review_requests(changes_diff: str, max_tokens: int, cache: Optional[ReviewCache] = None,
+                         context: str = '', rules: Optional[PolicyRules] = None
+                         ) -> Tuple[List[List[Dict[str, Any]]], List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Split a diff into review requests, leaving out hunks that add no code (resolved by the local
+    policy rules) and hunks whose review is already cached.
+    Returns (known issue lists, requests, counts): known issues are the local rule findings and
+    the cached reviews; counts has 'local_issues', 'local_hunks' (resolved locally) and 'cached_hunks'.
+    Each request is {'prompt', 'batch', 'cache_key'}: 'batch' holds the hunks of a chunk; a diff without
+    recognizable hunks becomes one whole-diff request, cached under 'cache_key' instead.
+    """
+    counts = {'local_issues': 0, 'local_hunks': 0, 'cached_hunks': 0}
+    hunks = split_oversized_hunks(parse_diff(changes_diff), max_tokens)
+    if not hunks:
+        cache_key = ReviewCache.make_key(changes_diff.strip(), context) if cache is not None else None
+        return [], [{'prompt': build_review_prompt(changes_diff), 'batch': None, 'cache_key': cache_key}], counts
+
+    known, missing = [], []
+    for hunk in hunks:
+        if rules is not None:
+            local_issues, resolved = rules.triage_hunk(hunk)
+            known.append(local_issues)
+            counts['local_issues'] += len(local_issues)
+            if resolved:
+                counts['local_hunks'] += 1
+                continue
+        issues = cache.lookup_hunk(hunk, context) if cache is not None else None
+        if issues is None:
+            missing.append(hunk)
+        else:
+            known.append(issues)
+            counts['cached_hunks'] += 1
+    review_requests = [{'prompt': build_review_prompt(render_batch(batch)), 'batch': batch, 'cache_key': None}
+                       for batch in pack_hunks(missing, max_tokens)]
+    return known, review_requests, counts
+
+
+def store_review_results(cache: Optional[ReviewCache], context: str, review_requests: List[Dict[str, Any]],
+                         results: List[Any]):
+    """Cache the issues of every successfully reviewed chunk, split back onto its hunks."""
+    if cache is None:
+        return
+    for request, result in zip(review_requests, results):
+        if request['batch'] is None or isinstance(result, BaseException):
+            continue
+        for hunk, issues in zip(request['batch'], attribute_issues(request['batch'], result)):
+            cache.store_hunk(hunk, context, issues)
+
+
+def cache_report(cache: Optional[ReviewCache], counts: Dict[str, int],
+                 review_requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Cache section of the final report: this review's hunk hits/misses and the cache totals."""
+    if cache is None:
+        return {"enabled": False}
+    reviewed_hunks = sum(len(r['batch']) for r in review_requests if r['batch'] is not None)
+    return {"enabled": True, "hunk_hits": counts['cached_hunks'], "hunk_misses": reviewed_hunks, **cache.stats()}
+
+
+def local_rules_report(rules: Optional[PolicyRules], counts: Dict[str, int]) -> Dict[str, Any]:
+    """Local rules section of the final report: issues found locally and hunks that skipped the LLM."""
+    if rules is None:
+        return {"enabled": False}
+    return {"enabled": True, "issues": counts['local_issues'], "hunks_skipped": counts['local_hunks']}
+
+
+def _review_prompts(prompts: List[str], policy_context: List[str], api_endpoint: str,
+                    max_parallel: int, cache: Optional[ReviewCache] = None,
+                    cache_keys: Optional[List[Optional[str]]] = None,
+                    scheduler: Optional[RequestScheduler] = None, trace=NULL_TRACE) -> List[Any]:
+    """Issue list (or the exception raised) for each prompt; several prompts are reviewed in parallel threads."""
+    cache_keys = cache_keys or [None] * len(prompts)
+
+    def review(i: int):
+        try:
+            return _call_llm_for_review(prompts[i], policy_context, api_endpoint, cache, cache_keys[i], scheduler, trace)
+        except Exception as e:
+            return e
+
+    if len(prompts) <= 1:
+        return [review(i) for i in range(len(prompts))]
+    with ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(prompts)))) as pool:
+        return list(pool.map(review, range(len(prompts))))
+
+
+def execute_peerbot_review(pr_data: Dict[str, str], config: Dict[str, Any], trace=None) -> Dict[str, Any]:
+    """Orchestrates the full PeerBot review process (timed per stage when config['instrumentation'] is enabled)."""
     if not config:
         return {"error": "Failed to load configuration. Review halted."}
+    if trace is None:
+        trace = start_trace(config, pr=pr_data['title'])
 
     pr_title = pr_data['title']
     pr_description = pr_data['description']
     changes_diff = pr_data['diff']
     custom_policies = config.get('custom_policies', [])
+    # Optional override, e.g. to point PeerBot at a local Gemini-compatible stub server
+    api_endpoint = config.get('model_settings', {}).get('api_endpoint', API_ENDPOINT)
 
     print("\n[STEP 1/3] Generating PR Summary...")
-    summary = summarize_pull_request(pr_title, pr_description, changes_diff)
+    with trace.span('summary'):
+        summary = summarize_pull_request(pr_title, pr_description, changes_diff)
 
     print("\n[STEP 2/3] Calling REAL LLM API for Structured Review...")
-    prompt = (
-        f"Analyze the following code changes (diff) against the provided team policies. "
-        f"Identify all issues related to security, complexity, and custom style violations. "
-        f"Diff:\n---\n{changes_diff}"
-    )
-    
-    review_issues: List[Dict[str, str]] = []
-    try:
-        review_issues = _call_llm_for_review(prompt, custom_policies)
-    except Exception as e:
-        print(f"Critical error during LLM review: {e}")
-        return {"error": f"LLM Review Failed: {e}", "summary": summary, "status": "Partial Review"}
+    # Large diffs are split into token-budgeted chunks that are reviewed in parallel;
+    # the local policy rules run first, and hunks that add no code never reach the LLM;
+    # hunks reviewed before (same code, policies and model) come from the review cache
+    review_settings = config.get('review', {})
+    cache = ReviewCache.from_config(config)
+    rules = PolicyRules.from_config(config)
+    context = review_cache_context(config)
+    with trace.span('prompt_build'):
+        known_issues, review_requests, counts = plan_review_requests(
+            changes_diff, review_settings.get('max_chunk_tokens', DEFAULT_MAX_CHUNK_TOKENS), cache, context, rules)
+    trace.add('chunks', len(review_requests))
+    print(f"Reviewing {len(review_requests)} chunk(s); {counts['local_hunks']} hunk(s) resolved by local rules, "
+          f"{counts['cached_hunks']} from the review cache...")
+    chunk_results = _review_prompts([r['prompt'] for r in review_requests], custom_policies, api_endpoint,
+                                    review_settings.get('max_parallel_chunks', DEFAULT_MAX_PARALLEL_CHUNKS),
+                                    cache, [r['cache_key'] for r in review_requests], get_request_scheduler(config),
+                                    trace)
+    store_review_results(cache, context, review_requests, chunk_results)
+
+    with trace.span('ranking'):
+        review_issues = merge_review_issues(known_issues + [r for r in chunk_results if not isinstance(r, Exception)])
+        severity_ranking = rank_issues_by_severity(review_issues)
+    failures = [r for r in chunk_results if isinstance(r, Exception)]
+    if failures:
+        print(f"Critical error during LLM review: {failures[0]}")
+        report = {"error": f"LLM Review Failed for {len(failures)}/{len(review_requests)} chunk(s): {failures[0]}",
+                  "summary": summary, "review_issues": review_issues, "severity_ranking": severity_ranking,
+                  "cache": cache_report(cache, counts, review_requests),
+                  "local_rules": local_rules_report(rules, counts), "status": "Partial Review"}
+        trace.finish(report)
+        return report
 
     print("\n[STEP 3/3] Finalizing Review Report...")
     
-    # Analyze the structured issues to determine severity ranking
-    severity_ranking = {
-        "HIGH": sum(1 for issue in review_issues if issue.get('severity') == 'HIGH'),
-        "MEDIUM": sum(1 for issue in review_issues if issue.get('severity') == 'MEDIUM'),
-        "TRIVIAL": sum(1 for issue in review_issues if issue.get('severity') == 'TRIVIAL'),
-        "TOTAL": len(review_issues)
-    }
-
-    return {
+    report = {
         "summary": summary,
         "review_issues": review_issues, # Now a list of dictionaries, not a single string
         "severity_ranking": severity_ranking,
+        "cache": cache_report(cache, counts, review_requests),
+        "local_rules": local_rules_report(rules, counts),
         "status": "Review Complete"
     }
+    trace.finish(report)
+    return report
 
 
 if __name__ == '__main__':
@@ -217,6 +426,8 @@ if __name__ == '__main__':
         if review_report.get('review_issues'):
             for i, issue in enumerate(review_report['review_issues']):
                 print(f"\n[ISSUE {i+1} / {issue.get('severity', 'UNKNOWN')}] ({issue.get('issueType', 'N/A')})")
+                if issue.get('file'):
+                    print(f"Location: {issue['file']}:{issue.get('line', '?')}")
                 print(f"Description: {issue.get('description', 'No description provided.')}")
                 print(f"Suggested Fix: {issue.get('suggestedFix', 'N/A')}")
         else:
@@ -227,6 +438,18 @@ if __name__ == '__main__':
         for severity, count in review_report['severity_ranking'].items():
             print(f"- {severity}: {count} critical items")
 
+        local_stats = review_report.get('local_rules', {})
+        if local_stats.get('enabled'):
+            print("\n--- LOCAL POLICY RULES ---")
+            print(f"- {local_stats['issues']} issue(s) found locally, {local_stats['hunks_skipped']} hunk(s) skipped the LLM")
+
+        cache_stats = review_report.get('cache', {})
+        if cache_stats.get('enabled'):
+            print("\n--- REVIEW CACHE ---")
+            print(f"- This review: {cache_stats['hunk_hits']} hunk(s) from cache, {cache_stats['hunk_misses']} sent to the LLM")
+            print(f"- Cache totals: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                  f"{cache_stats['entries']} entries ({cache_stats['bytes'] / 1024:.1f} KB)")
+
         print("=============================================")
         print(f"Review Status: {review_report['status']}")
     else:
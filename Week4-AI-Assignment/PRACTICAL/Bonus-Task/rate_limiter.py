@@ -0,0 +1,347 @@
+# ==============================================================================
+# PEERBOT RATE LIMITER AND RETRY SCHEDULER
+# Keeps all review workers (threads of execute_peerbot_review and coroutines of
+# peerbot_async) under the API quota, and spreads their retries out:
+#   - TokenBucket / RateLimiter: requests per minute and tokens per minute, shared by
+#     every caller; a 429 halves the request rate (additive recovery on success)
+#   - backoff: full jitter, random.uniform(0, min(max_delay, base * 2**attempt)), so
+#     workers that failed together do not retry together; Retry-After is honored
+#   - classification: 408/425/429/5xx and network errors are retried, other 4xx are not
+#   - CircuitBreaker: after repeated server/network failures, calls fail fast for a while;
+#     a half-open trial that never reports back is released after trial_timeout
+# acquire() and retry_delay() only return delays, so the same RequestScheduler serves
+# time.sleep (sync) and asyncio.sleep (async) callers.
+#
+# Usage: python rate_limiter.py simulate [--requests 200] [--workers 32] [--quota-per-second 20]
+# ==============================================================================
+import argparse
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional, Tuple
+
+DEFAULT_REQUESTS_PER_MINUTE = 60
+DEFAULT_TOKENS_PER_MINUTE = 250_000
+DEFAULT_BURST_SECONDS = 10.0      # Bucket capacity: this many seconds of quota
+DEFAULT_MAX_DELAY = 60.0          # Cap of a single backoff delay (seconds)
+DEFAULT_FAILURE_THRESHOLD = 5     # Consecutive server/network failures that open the circuit
+DEFAULT_RESET_TIMEOUT = 30.0      # Seconds the circuit stays open before a trial request
+DEFAULT_TRIAL_TIMEOUT = 120.0     # Seconds after which a trial with no outcome stops blocking new trials
+
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+MIN_RATE_FACTOR = 0.1            # A 429 halves the request rate, down to this fraction
+RATE_INCREASE = 0.05             # Each success gives back this fraction of the request rate
+RATE_DECREASE_INTERVAL = 1.0     # Seconds between two halvings
+
+_SCHEDULERS: Dict[Tuple, 'RequestScheduler'] = {}
+_SCHEDULERS_LOCK = threading.Lock()
+
+
+class CircuitOpenError(Exception):
+    """The API failed repeatedly; calls are rejected without a request until the reset timeout passes."""
+
+
+def is_retryable(status: Optional[int]) -> bool:
+    """Network errors (no status) and malformed 2xx bodies are retried; 4xx other than 408/425/429 are not."""
+    return status is None or status < 400 or status in RETRYABLE_STATUSES
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date form)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. reserve() takes the tokens right away (the bucket may go into
+    debt) and returns how long the caller must wait, so callers queue up fairly without polling.
+    """
+
+    def __init__(self, rate_per_minute: float, burst_seconds: float = DEFAULT_BURST_SECONDS):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0, rate_factor: float = 1.0) -> float:
+        with self._lock:
+            now = time.monotonic()
+            rate = self.rate * rate_factor
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * rate)
+            self._updated = now
+            self._tokens -= amount
+            return 0.0 if self._tokens >= 0 else -self._tokens / rate
+
+
+class RateLimiter:
+    """Request and token budgets shared by all workers; None disables a budget."""
+
+    def __init__(self, requests_per_minute: Optional[float] = DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: Optional[float] = DEFAULT_TOKENS_PER_MINUTE,
+                 burst_seconds: float = DEFAULT_BURST_SECONDS):
+        self.requests = TokenBucket(requests_per_minute, burst_seconds) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, burst_seconds) if tokens_per_minute else None
+        self.rate_factor = 1.0
+        self._paused_until = 0.0
+        self._last_decrease = float('-inf')
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> float:
+        """Seconds to wait before sending a request of about `tokens` tokens."""
+        with self._lock:
+            factor, paused_until = self.rate_factor, self._paused_until
+        delay = max(0.0, paused_until - time.monotonic())
+        if self.requests is not None:
+            delay = max(delay, self.requests.reserve(1, factor))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.reserve(tokens))
+        return delay
+
+    def throttled(self, retry_after: Optional[float]):
+        """
+        A 429: pause every worker for Retry-After and halve the request rate. The 429s of requests
+        that were already in flight arrive together, so the rate is halved at most once per second.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_decrease >= RATE_DECREASE_INTERVAL:
+                self.rate_factor = max(MIN_RATE_FACTOR, self.rate_factor / 2)
+                self._last_decrease = now
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+
+    def succeeded(self):
+        with self._lock:
+            self.rate_factor = min(1.0, self.rate_factor + RATE_INCREASE)
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures -> half-open (one trial) after `reset_timeout`.
+    The trial's caller must report record_success, record_failure or release_trial; a trial that has not
+    reported after `trial_timeout` seconds (a caller killed mid-request) no longer blocks the next one.
+    """
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD, reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+                 trial_timeout: float = DEFAULT_TRIAL_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.trial_timeout = trial_timeout
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_started = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Raise CircuitOpenError unless a request may be sent now."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == 'open' and now - self._opened_at >= self.reset_timeout:
+                self.state, self._trial_started = 'half-open', None
+            if self._trial_started is not None and now - self._trial_started >= self.trial_timeout:
+                self._trial_started = None
+            if self.state == 'open' or (self.state == 'half-open' and self._trial_started is not None):
+                raise CircuitOpenError(f"Circuit open after {self._failures} consecutive API failures; "
+                                       f"retrying after {self.reset_timeout:.0f}s.")
+            if self.state == 'half-open':
+                self._trial_started = now
+
+    def record_success(self):
+        with self._lock:
+            self.state, self._failures, self._trial_started = 'closed', 0, None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == 'half-open' or self._failures >= self.failure_threshold:
+                self.state, self._opened_at, self._trial_started = 'open', time.monotonic(), None
+
+    def release_trial(self):
+        """A request ended without an outcome (cancelled, interrupted): let the next caller make the trial.
+        The breaker does not know which caller holds the trial, so at worst one extra trial is sent."""
+        with self._lock:
+            self._trial_started = None
+
+
+class RequestScheduler:
+    """
+    Rate limiting, retry decisions and circuit breaking for one API quota.
+    Callers do: wait acquire(tokens); send; then record_success() or wait retry_delay(...)
+    (None means give up and raise).
+    """
+
+    def __init__(self, limiter: Optional[RateLimiter] = None, breaker: Optional[CircuitBreaker] = None,
+                 max_retries: int = 5, base_delay: float = 1.0, max_delay: float = DEFAULT_MAX_DELAY,
+                 jitter: bool = True, honor_retry_after: bool = True, seed: Optional[int] = None):
+        self.limiter = limiter
+        self.breaker = breaker
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.honor_retry_after = honor_retry_after
+        self._random = random.Random(seed)
+
+        # --- Stats ---
+        self.stats = {'requests': 0, 'successes': 0, 'retries': 0, 'throttled': 0, 'gave_up': 0,
+                      'circuit_rejections': 0}
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], max_retries: int, base_delay: float) -> 'RequestScheduler':
+        """Shared scheduler for config['rate_limits']; callers with the same settings share one quota."""
+        settings = config.get('rate_limits', {})
+        key = (tuple(sorted(settings.items())), max_retries, base_delay)
+        with _SCHEDULERS_LOCK:
+            if key not in _SCHEDULERS:
+                limiter = None
+                if settings.get('enabled', True):
+                    limiter = RateLimiter(settings.get('requests_per_minute', DEFAULT_REQUESTS_PER_MINUTE),
+                                          settings.get('tokens_per_minute', DEFAULT_TOKENS_PER_MINUTE),
+                                          settings.get('burst_seconds', DEFAULT_BURST_SECONDS))
+                breaker = CircuitBreaker(settings.get('circuit_failure_threshold', DEFAULT_FAILURE_THRESHOLD),
+                                         settings.get('circuit_reset_seconds', DEFAULT_RESET_TIMEOUT),
+                                         settings.get('circuit_trial_timeout_seconds', DEFAULT_TRIAL_TIMEOUT))
+                _SCHEDULERS[key] = cls(limiter, breaker, max_retries, base_delay,
+                                       settings.get('max_backoff_seconds', DEFAULT_MAX_DELAY))
+            return _SCHEDULERS[key]
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def acquire(self, tokens: int) -> float:
+        """Seconds to wait before the next request (raises CircuitOpenError when the circuit is open)."""
+        if self.breaker is not None:
+            try:
+                self.breaker.allow()
+            except CircuitOpenError:
+                self._count('circuit_rejections')
+                raise
+        self._count('requests')
+        return self.limiter.reserve(tokens) if self.limiter is not None else 0.0
+
+    def record_success(self):
+        self._count('successes')
+        if self.breaker is not None:
+            self.breaker.record_success()
+        if self.limiter is not None:
+            self.limiter.succeeded()
+
+    def record_abandoned(self):
+        """The request sent after acquire() ended with no success or failure to report."""
+        if self.breaker is not None:
+            self.breaker.release_trial()
+
+    def backoff(self, attempt: int) -> float:
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return self._random.uniform(0, ceiling) if self.jitter else ceiling
+
+    def retry_delay(self, attempt: int, status: Optional[int] = None,
+                    retry_after: Optional[str] = None) -> Optional[float]:
+        """Delay before retrying a failed attempt (0-based), or None when the error is final."""
+        wait = parse_retry_after(retry_after) if self.honor_retry_after else None
+        if status == 429:
+            self._count('throttled')
+            if self.limiter is not None:
+                self.limiter.throttled(wait)
+        if self.breaker is not None:
+            # Only network errors and 5xx count against the server; any other answer shows it is up
+            if status is None or status >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+
+        if not is_retryable(status) or attempt + 1 >= self.max_retries:
+            self._count('gave_up')
+            return None
+        self._count('retries')
+        delay = self.backoff(attempt)
+        return max(delay, wait) if wait is not None else delay
+
+
+# --- Simulation: goodput against a mock server with a scripted quota ---
+def simulate_goodput(n_requests: int, workers: int, quota_per_second: float, latency_ms: float,
+                     base_delay: float) -> Dict[str, Dict[str, float]]:
+    """
+    Send `n_requests` reviews from `workers` threads through _call_llm_for_review against a mock
+    server that answers 429 (with Retry-After) above `quota_per_second`, once with the old retry
+    behavior (no limiter, no jitter, Retry-After ignored) and once with the scheduler.
+    """
+    import contextlib
+    import io
+    from concurrent.futures import ThreadPoolExecutor
+
+    from mock_llm_server import endpoint_url, fetch_stats, free_port, launch_mock_server
+    from peerbot_core import MAX_RETRIES, _call_llm_for_review
+
+    limit_per_minute = quota_per_second * 60 * 0.9
+    modes = {
+        'fixed backoff (old)': RequestScheduler(None, None, MAX_RETRIES, base_delay, jitter=False,
+                                                honor_retry_after=False, seed=1),
+        # A burst of one request: a full bucket (or refills straddling two of the mock's fixed one-second
+        # windows) would send more than the quota in one window, and every 429 halves the rate
+        'rate limiter + jitter': RequestScheduler(RateLimiter(limit_per_minute, None, burst_seconds=60 / limit_per_minute),
+                                                  CircuitBreaker(), MAX_RETRIES, base_delay, seed=1),
+    }
+    print("=" * 82)
+    print(f"GOODPUT: {n_requests} requests, {workers} workers, server quota {quota_per_second:g}/s, "
+          f"latency {latency_ms:.0f}ms")
+    print("=" * 82)
+    print(f"{'mode':<24} | {'seconds':>7} | {'ok':>4} | {'failed':>6} | {'HTTP calls':>10} | {'429s':>5} | "
+          f"{'goodput/s':>9}")
+    print("-" * 82)
+    results = {}
+    for name, scheduler in modes.items():
+        port = free_port()
+        process = launch_mock_server(port, '--latency-ms', str(latency_ms), '--quota-per-second', str(quota_per_second))
+        try:
+            def review(i: int) -> bool:
+                try:
+                    _call_llm_for_review(f"// file: s{i}.js\n+const x{i} = 1;\n", [], endpoint_url(port),
+                                         scheduler=scheduler)
+                    return True
+                except Exception:
+                    return False
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(workers) as pool:
+                outcomes = list(pool.map(review, range(n_requests)))
+            elapsed = time.perf_counter() - start
+            server = fetch_stats(port)
+        finally:
+            process.terminate()
+            process.wait()
+        ok = sum(outcomes)
+        calls = server['requests_total'] + server['rejected_429']
+        print(f"{name:<24} | {elapsed:7.2f} | {ok:>4} | {n_requests - ok:>6} | {calls:>10} | "
+              f"{server['rejected_429']:>5} | {ok / elapsed:9.1f}")
+        results[name] = {'seconds': elapsed, 'ok': ok, 'http_calls': calls, 'rejected_429': server['rejected_429']}
+    print("=" * 82)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="PeerBot API rate limiting and retry scheduling.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sim_p = sub.add_parser('simulate', help="Goodput with and without the scheduler against a quota-enforcing mock.")
+    sim_p.add_argument('--requests', type=int, default=200)
+    sim_p.add_argument('--workers', type=int, default=32)
+    sim_p.add_argument('--quota-per-second', type=float, default=20.0)
+    sim_p.add_argument('--latency-ms', type=float, default=100.0)
+    sim_p.add_argument('--base-delay', type=float, default=0.25, help="Backoff base (INITIAL_DELAY in production).")
+    args = parser.parse_args()
+
+    simulate_goodput(args.requests, args.workers, args.quota_per_second, args.latency_ms, args.base_delay)
@@ -0,0 +1,213 @@
+# ==============================================================================
+# PEERBOT REVIEW CACHE
+# Persistent, content-addressed cache of LLM review results, so unchanged hunks
+# are never sent to the model again when a PR receives a new push.
+#   - Key: SHA-256 of (normalized hunk text, custom_policies, model name, ISSUE_SCHEMA);
+#     changing a policy, the model or the schema invalidates every entry
+#   - Value: the parsed ISSUE_SCHEMA issue list, with line numbers stored relative
+#     to the hunk, so a hunk that only moved (or whose file was renamed) still hits
+#   - Storage: SQLite in WAL mode (safe for concurrent writers, threads or processes),
+#     LRU eviction bounded by entry count and total size
+#
+# Usage: python review_cache.py stats [--path peerbot_review_cache.sqlite3]
+#        python review_cache.py clear [--path ...]
+# ==============================================================================
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Any, Optional
+
+DEFAULT_CACHE_PATH = 'peerbot_review_cache.sqlite3'
+DEFAULT_MAX_ENTRIES = 20_000
+DEFAULT_MAX_MB = 64.0
+
+_OPEN_CACHES: Dict[str, 'ReviewCache'] = {}
+_OPEN_CACHES_LOCK = threading.Lock()
+
+
+def cache_context(policies: List[str], model_name: str, schema: Dict[str, Any]) -> str:
+    """Everything besides the code that shapes a review; part of every key."""
+    return json.dumps([list(policies), model_name, schema], sort_keys=True)
+
+
+def normalize_hunk_text(hunk: Dict[str, Any]) -> str:
+    """Diff markers and code of a hunk, without line numbers or trailing whitespace."""
+    return '\n'.join(f"{marker}{text.rstrip()}" for _, marker, text in hunk['lines'])
+
+
+def _first_line(hunk: Dict[str, Any]) -> Optional[int]:
+    return next((n for n, _, _ in hunk['lines'] if n is not None), None)
+
+
+class ReviewCache:
+    """LRU, size-bounded issue cache in one SQLite file; one connection per thread."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_mb: float = DEFAULT_MAX_MB):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 2**20)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        with self._connection() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS reviews (key TEXT PRIMARY KEY, issues TEXT NOT NULL, "
+                       "size INTEGER NOT NULL, last_access REAL NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS reviews_lru ON reviews (last_access)")
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> Optional['ReviewCache']:
+        """Shared cache instance for config['cache'] (None when caching is disabled)."""
+        settings = config.get('cache', {})
+        if not settings.get('enabled', False):
+            return None
+        path = os.path.abspath(settings.get('path', DEFAULT_CACHE_PATH))
+        with _OPEN_CACHES_LOCK:
+            if path not in _OPEN_CACHES:
+                _OPEN_CACHES[path] = cls(path, settings.get('max_entries', DEFAULT_MAX_ENTRIES),
+                                         settings.get('max_mb', DEFAULT_MAX_MB))
+            return _OPEN_CACHES[path]
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            # Autocommit mode; writes use explicit BEGIN IMMEDIATE transactions. The timeout makes
+            # concurrent writers wait for the lock instead of failing with "database is locked".
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    # --- Keys ---
+    @staticmethod
+    def make_key(text: str, context: str) -> str:
+        return hashlib.sha256(f"{context}\0{text}".encode('utf-8')).hexdigest()
+
+    # --- Raw access ---
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        db = self._connection()
+        row = db.execute("SELECT issues FROM reviews WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if row is None:
+            return None
+        db.execute("UPDATE reviews SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key: str, issues: List[Dict[str, Any]]):
+        data = json.dumps(issues)
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("INSERT OR REPLACE INTO reviews (key, issues, size, last_access) VALUES (?, ?, ?, ?)",
+                       (key, data, len(data), time.time()))
+            self._evict(db)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _evict(self, db: sqlite3.Connection):
+        """Drop least recently used entries until both bounds hold (runs inside the write transaction)."""
+        count, total = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM reviews").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        excess_entries, excess_bytes = count - self.max_entries, total - self.max_bytes
+        doomed, freed = [], 0
+        for key, size in db.execute("SELECT key, size FROM reviews ORDER BY last_access"):
+            if len(doomed) >= excess_entries and freed >= excess_bytes:
+                break
+            doomed.append((key,))
+            freed += size
+        db.executemany("DELETE FROM reviews WHERE key = ?", doomed)
+
+    # --- Hunk-level access (line numbers relative to the hunk) ---
+    def lookup_hunk(self, hunk: Dict[str, Any], context: str) -> Optional[List[Dict[str, Any]]]:
+        """Cached issues of an unchanged hunk, re-anchored to its current file and line numbers."""
+        stored = self.get(self.make_key(normalize_hunk_text(hunk), context))
+        if stored is None:
+            return None
+        base = _first_line(hunk)
+        issues = []
+        for issue in stored:
+            issue = dict(issue)
+            if issue.pop('_located', False):
+                issue['file'] = hunk['file']
+            if isinstance(issue.get('line'), int) and base is not None:
+                issue['line'] += base
+            issues.append(issue)
+        return issues
+
+    def store_hunk(self, hunk: Dict[str, Any], context: str, issues: List[Dict[str, Any]]):
+        base = _first_line(hunk)
+        stored = []
+        for issue in issues:
+            issue = dict(issue)
+            if issue.get('file'):
+                issue['_located'] = True
+                del issue['file']
+            if isinstance(issue.get('line'), int) and base is not None:
+                issue['line'] -= base
+            stored.append(issue)
+        self.put(self.make_key(normalize_hunk_text(hunk), context), stored)
+
+    # --- Stats ---
+    def stats(self) -> Dict[str, Any]:
+        count, total = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM reviews").fetchone()
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {'hits': hits, 'misses': misses,
+                'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+                'entries': count, 'bytes': total}
+
+    def clear(self):
+        self._connection().execute("DELETE FROM reviews")
+
+
+def attribute_issues(batch: List[Dict[str, Any]], issues: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    Split the issues of one batched request back onto its hunks, by file and line range.
+    Issues without a usable location go to every hunk of their file (or to the first hunk),
+    so a later cache hit still reproduces them; duplicates are merged away by merge_review_issues.
+    """
+    per_hunk: List[List[Dict[str, Any]]] = [[] for _ in batch]
+    spans = []
+    for hunk in batch:
+        numbers = [n for n, _, _ in hunk['lines'] if n is not None]
+        spans.append((hunk['file'], min(numbers) if numbers else None, max(numbers) if numbers else None))
+
+    for issue in issues:
+        file = str(issue.get('file') or '').strip().removeprefix('./')
+        line = issue.get('line')
+        targets = [i for i, (f, lo, hi) in enumerate(spans)
+                   if f == file and isinstance(line, int) and lo is not None and lo <= line <= hi][:1]
+        if not targets:
+            targets = [i for i, (f, _, _) in enumerate(spans) if f == file] or [0]
+        for i in targets:
+            per_hunk[i].append(issue)
+    return per_hunk
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect or clear the PeerBot review cache.")
+    parser.add_argument('command', choices=['stats', 'clear'])
+    parser.add_argument('--path', default=DEFAULT_CACHE_PATH)
+    args = parser.parse_args()
+
+    cache = ReviewCache(args.path)
+    if args.command == 'clear':
+        cache.clear()
+        print(f"Cleared {args.path}.")
+    else:
+        stats = cache.stats()
+        print(f"{args.path}: {stats['entries']} entries, {stats['bytes'] / 2**20:.2f} MB")
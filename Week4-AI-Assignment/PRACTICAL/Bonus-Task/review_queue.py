@@ -0,0 +1,235 @@
+# ==============================================================================
+# PEERBOT REVIEW JOB QUEUE
+# Durable queue of pull-request review jobs for review_service.py, in one SQLite file:
+#   - coalescing: a new revision of a PR supersedes its queued job, and a job that
+#     finishes after a newer revision arrived is marked superseded instead of done
+#   - at most one running job per PR, so revisions of one PR never race each other
+#   - duplicate webhook deliveries (the revision of the PR's newest job) map to that job;
+#     a revision that comes back after a newer push (force-push back) is queued again
+#   - backpressure: enqueue refuses new PRs once max_depth jobs are waiting
+#   - crash safety: jobs left 'running' by a dead process are re-queued on startup;
+#     a failing job is retried with a delay; either way a job is marked failed after
+#     max_attempts, and superseded instead of re-queued once a newer revision exists
+#   - per-job timestamps (enqueued, started, finished) for latency metrics
+#
+# Usage: python review_queue.py stats [--path peerbot_jobs.sqlite3]
+#        python review_queue.py jobs [--status queued] [--limit 20]
+# ==============================================================================
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Any, Optional
+
+from instrumentation import percentile
+
+DEFAULT_QUEUE_PATH = 'peerbot_jobs.sqlite3'
+DEFAULT_MAX_DEPTH = 500          # Waiting jobs before enqueue refuses new PRs
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_KEEP_FINISHED = 10_000   # Finished jobs kept for /jobs and latency metrics
+
+JOB_STATUSES = ('queued', 'running', 'done', 'failed', 'superseded')
+FINISHED_STATUSES = ('done', 'failed', 'superseded')
+
+
+def _job_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    job = dict(row)
+    job['payload'] = json.loads(job['payload'])
+    if job['result'] is not None:
+        job['result'] = json.loads(job['result'])
+    return job
+
+
+class ReviewQueue:
+    """SQLite (WAL) review job queue, safe to share between threads; one connection per thread."""
+
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH, max_depth: int = DEFAULT_MAX_DEPTH,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.max_depth = max_depth
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        db = self._connection()
+        db.execute("CREATE TABLE IF NOT EXISTS jobs ("
+                   "id INTEGER PRIMARY KEY AUTOINCREMENT, pr_key TEXT NOT NULL, revision TEXT NOT NULL, "
+                   "payload TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+                   "available_at REAL NOT NULL, enqueued_at REAL NOT NULL, started_at REAL, finished_at REAL, "
+                   "result TEXT, error TEXT)")
+        db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+        db.execute("CREATE INDEX IF NOT EXISTS jobs_pr ON jobs (pr_key, status)")
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            # Autocommit mode; every state change is one BEGIN IMMEDIATE transaction
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _transaction(self, work):
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(db)
+            db.execute("COMMIT")
+            return result
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    # --- Producer side ---
+    def enqueue(self, pr_key: str, revision: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Queue a review of one PR revision. Returns {'status': 'queued'|'duplicate'|'rejected',
+        'job_id', 'superseded'}; 'rejected' (job_id None) means the queue is full.
+        Only the PR's newest job makes a delivery a duplicate: a revision already reviewed before a
+        newer push is the PR head again when it comes back, so its review must be the latest one.
+        """
+        def work(db: sqlite3.Connection) -> Dict[str, Any]:
+            newest = db.execute("SELECT id, revision, status FROM jobs WHERE pr_key = ? ORDER BY id DESC LIMIT 1",
+                                (pr_key,)).fetchone()
+            if (newest is not None and newest['revision'] == revision
+                    and newest['status'] in ('queued', 'running', 'done')):
+                return {'status': 'duplicate', 'job_id': newest['id'], 'superseded': 0}
+            replaces = db.execute("SELECT COUNT(*) FROM jobs WHERE pr_key = ? AND status = 'queued'",
+                                  (pr_key,)).fetchone()[0]
+            # A push to a PR that is already waiting replaces its job, so it never grows the queue
+            if not replaces and self._count(db, 'queued') >= self.max_depth:
+                return {'status': 'rejected', 'job_id': None, 'superseded': 0}
+            now = time.time()
+            superseded = db.execute("UPDATE jobs SET status = 'superseded', finished_at = ? "
+                                    "WHERE pr_key = ? AND status = 'queued'", (now, pr_key)).rowcount
+            job_id = db.execute("INSERT INTO jobs (pr_key, revision, payload, status, available_at, enqueued_at) "
+                                "VALUES (?, ?, ?, 'queued', ?, ?)",
+                                (pr_key, revision, json.dumps(payload), now, now)).lastrowid
+            return {'status': 'queued', 'job_id': job_id, 'superseded': superseded}
+        return self._transaction(work)
+
+    # --- Worker side ---
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Oldest due job of a PR with no running job, marked running; None when nothing is due."""
+        def work(db: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+            now = time.time()
+            row = db.execute("SELECT * FROM jobs WHERE status = 'queued' AND available_at <= ? AND pr_key NOT IN "
+                             "(SELECT pr_key FROM jobs WHERE status = 'running') ORDER BY id LIMIT 1",
+                             (now,)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                       (now, row['id']))
+            job = _job_dict(row)
+            job.update(status='running', started_at=now, attempts=job['attempts'] + 1)
+            return job
+        return self._transaction(work)
+
+    def complete(self, job_id: int, result: Dict[str, Any]) -> str:
+        """Store the report; the job ends 'superseded' if a newer revision of its PR is queued."""
+        def work(db: sqlite3.Connection) -> str:
+            newer = db.execute("SELECT 1 FROM jobs WHERE status = 'queued' AND id > ? AND pr_key = "
+                               "(SELECT pr_key FROM jobs WHERE id = ?) LIMIT 1", (job_id, job_id)).fetchone()
+            status = 'superseded' if newer else 'done'
+            db.execute("UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = NULL WHERE id = ?",
+                       (status, time.time(), json.dumps(result), job_id))
+            return status
+        return self._transaction(work)
+
+    def _retry_or_finish(self, db: sqlite3.Connection, job_id: int, error: str, available_at: float) -> str:
+        """Re-queue a job that did not finish, unless a newer revision of its PR exists or its attempts are used up."""
+        now = time.time()
+        newer = db.execute("SELECT 1 FROM jobs WHERE id > ? AND pr_key = (SELECT pr_key FROM jobs WHERE id = ?) "
+                           "LIMIT 1", (job_id, job_id)).fetchone()
+        if newer:
+            status = 'superseded'
+        elif db.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()[0] >= self.max_attempts:
+            status = 'failed'
+        else:
+            db.execute("UPDATE jobs SET status = 'queued', available_at = ?, started_at = NULL, error = ? "
+                       "WHERE id = ?", (available_at, error, job_id))
+            return 'queued'
+        db.execute("UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?", (status, now, error, job_id))
+        return status
+
+    def fail(self, job_id: int, error: str, retry_delay: float = 0.0) -> str:
+        """
+        Re-queue the job after retry_delay seconds. Returns 'queued', or 'superseded' when a newer
+        revision of its PR exists, or 'failed' once max_attempts is reached.
+        """
+        return self._transaction(lambda db: self._retry_or_finish(db, job_id, error, time.time() + retry_delay))
+
+    def recover(self) -> Dict[str, int]:
+        """
+        Jobs left 'running' by a process that died, handled like failures: re-queued, superseded, or
+        failed once max_attempts is reached (a job that kills the process is not retried forever).
+        Call once at startup, before workers start. Returns the count per new status.
+        """
+        def work(db: sqlite3.Connection) -> Dict[str, int]:
+            counts = {'queued': 0, 'superseded': 0, 'failed': 0}
+            now = time.time()
+            for row in db.execute("SELECT id FROM jobs WHERE status = 'running' ORDER BY id").fetchall():
+                counts[self._retry_or_finish(db, row['id'], "Interrupted: the service stopped during the review.",
+                                             now)] += 1
+            return counts
+        return self._transaction(work)
+
+    def prune(self, keep: int = DEFAULT_KEEP_FINISHED) -> int:
+        """Delete all but the newest `keep` finished jobs."""
+        return self._transaction(lambda db: db.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed', 'superseded') AND id NOT IN "
+            "(SELECT id FROM jobs WHERE status IN ('done', 'failed', 'superseded') ORDER BY id DESC LIMIT ?)",
+            (keep,)).rowcount)
+
+    # --- Inspection ---
+    @staticmethod
+    def _count(db: sqlite3.Connection, status: str) -> int:
+        return db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def depth(self) -> int:
+        return self._count(self._connection(), 'queued')
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return None if row is None else _job_dict(row)
+
+    def jobs(self, status: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        query = "SELECT id, pr_key, revision, status, attempts, enqueued_at, started_at, finished_at, error FROM jobs"
+        params: tuple = ()
+        if status:
+            query += " WHERE status = ?"
+            params = (status,)
+        return [dict(row) for row in self._connection().execute(query + " ORDER BY id DESC LIMIT ?",
+                                                                 params + (limit,))]
+
+    def stats(self, window: int = 500) -> Dict[str, Any]:
+        """Job counts by status, plus wait/run/total latency (seconds) of the last `window` reviewed jobs."""
+        db = self._connection()
+        counts = {status: 0 for status in JOB_STATUSES}
+        counts.update(db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        rows = db.execute("SELECT enqueued_at, started_at, finished_at FROM jobs WHERE status IN ('done', 'superseded') "
+                          "AND started_at IS NOT NULL ORDER BY id DESC LIMIT ?", (window,)).fetchall()
+        latency = {}
+        for name, values in (('wait', [s - e for e, s, f in rows]), ('run', [f - s for e, s, f in rows]),
+                             ('total', [f - e for e, s, f in rows])):
+            latency[name] = {'p50': round(percentile(values, 0.50), 3), 'p95': round(percentile(values, 0.95), 3),
+                             'max': round(max(values, default=0.0), 3)}
+        return {'jobs': counts, 'latency_seconds': latency, 'latency_window': len(rows)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect the PeerBot review job queue.")
+    parser.add_argument('command', choices=['stats', 'jobs'])
+    parser.add_argument('--path', default=DEFAULT_QUEUE_PATH)
+    parser.add_argument('--status', choices=JOB_STATUSES)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    queue = ReviewQueue(args.path)
+    if args.command == 'stats':
+        print(json.dumps(queue.stats(), indent=2))
+    else:
+        for job in queue.jobs(args.status, args.limit):
+            print(f"#{job['id']} {job['pr_key']} @ {job['revision'][:12]}: {job['status']} "
+                  f"(attempts {job['attempts']}){' - ' + job['error'] if job['error'] else ''}")
@@ -0,0 +1,504 @@
+# ==============================================================================
+# PEERBOT REVIEW SERVICE
+# Local webhook service at integration.webhook_url (/api/peerbot/review_trigger):
+#   - accepts pull-request events (GitHub, GitLab or a flat PeerBot payload that
+#     carries the diff) and answers at once with 202 and a job id
+#   - jobs go into the durable SQLite queue of review_queue.py; a newer push to the
+#     same PR supersedes the waiting job, so only the latest revision is reviewed
+#   - a pool of worker threads drains the queue with execute_peerbot_review
+#   - backpressure: a full queue answers 503 with Retry-After instead of queueing
+#   - crash-safe: jobs that were running when the process died are re-queued on start
+#   - GET /metrics (job counts, queue depth, per-job wait/run latency), GET /jobs/<id>,
+#     GET /metrics/prometheus (the same plus the stage timings of instrumentation.py)
+# Standard library only (http.server). Set PEERBOT_WEBHOOK_SECRET to require a signed
+# request (GitHub X-Hub-Signature-256 or GitLab X-Gitlab-Token).
+#
+# Usage:
+#   python review_service.py serve [--port 8080] [--workers 4] [--config config.json]
+#   python review_service.py e2e [--prs 20] [--pushes 3]   # end-to-end run against mock_llm_server.py
+# ==============================================================================
+import argparse
+import hashlib
+import hmac
+import json
+import math
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Any, Optional, Tuple
+
+from instrumentation import REGISTRY, start_trace
+from peerbot_core import execute_peerbot_review, load_configuration
+from review_queue import DEFAULT_KEEP_FINISHED, DEFAULT_MAX_ATTEMPTS, DEFAULT_MAX_DEPTH, DEFAULT_QUEUE_PATH, ReviewQueue
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+DEFAULT_WORKERS = 4
+DEFAULT_WEBHOOK_PATH = '/api/peerbot/review_trigger'
+DEFAULT_RETRY_DELAY = 30.0       # Seconds before a failed review is tried again
+DEFAULT_MAX_BODY_MB = 5.0
+POLL_INTERVAL = 0.5              # Seconds an idle worker waits before looking at the queue again
+PRUNE_EVERY = 100                # Finished jobs between two queue prunes
+
+# Events that change the code under review; everything else (labels, comments, close) is ignored
+GITHUB_REVIEW_ACTIONS = {'opened', 'synchronize', 'reopened', 'ready_for_review'}
+GITLAB_REVIEW_ACTIONS = {'open', 'update', 'reopen'}
+
+
+class EventError(ValueError):
+    """The webhook body is not a usable pull-request event."""
+
+
+def _section(container: Dict[str, Any], key: str) -> Dict[str, Any]:
+    """container[key] as a dict ({} when missing or null); EventError for any other type."""
+    value = container.get(key)
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise EventError(f"'{key}' must be a JSON object.")
+    return value
+
+
+def parse_review_event(event: Dict[str, Any]) -> Optional[Tuple[str, str, Dict[str, str]]]:
+    """
+    (pr_key, revision, pr_data) of a pull-request event, or None for events that need no review.
+    Webhooks do not carry the diff, so the forwarding integration adds it as event['diff'].
+    """
+    if not isinstance(event, dict):
+        raise EventError("Event must be a JSON object.")
+    if 'pull_request' in event:  # GitHub
+        if event.get('action') not in GITHUB_REVIEW_ACTIONS:
+            return None
+        pr = _section(event, 'pull_request')
+        repository = _section(event, 'repository').get('full_name') or ''
+        number, title, description = pr.get('number'), pr.get('title'), pr.get('body')
+        revision = _section(pr, 'head').get('sha')
+    elif event.get('object_kind') == 'merge_request':  # GitLab
+        attributes = _section(event, 'object_attributes')
+        if attributes.get('action') not in GITLAB_REVIEW_ACTIONS:
+            return None
+        repository = _section(event, 'project').get('path_with_namespace') or ''
+        number, title, description = attributes.get('iid'), attributes.get('title'), attributes.get('description')
+        revision = _section(attributes, 'last_commit').get('id')
+    else:  # Flat PeerBot payload: {repository, number, title, description, diff, revision}
+        repository, number = event.get('repository') or '', event.get('number')
+        title, description, revision = event.get('title'), event.get('description'), event.get('revision')
+
+    diff = event.get('diff')
+    if (not isinstance(number, (int, str)) or isinstance(number, bool) or not isinstance(title, str) or not title
+            or not isinstance(diff, str) or not diff.strip()):
+        raise EventError("Event needs a PR number, a title and a non-empty 'diff'.")
+    if not isinstance(repository, str) or not isinstance(description or '', str):
+        raise EventError("'repository' and 'description' must be strings.")
+    # Without a commit id, the diff itself identifies the revision (redeliveries stay duplicates)
+    revision = str(revision or hashlib.sha256(diff.encode('utf-8')).hexdigest())
+    return f"{repository}#{number}", revision, {'title': title, 'description': description or '', 'diff': diff}
+
+
+def verify_signature(secret: str, body: bytes, headers) -> bool:
+    """GitHub HMAC-SHA256 signature or GitLab token; always true when no secret is configured."""
+    if not secret:
+        return True
+    signature = headers.get('X-Hub-Signature-256', '')
+    if signature:
+        expected = 'sha256=' + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(signature, expected)
+    return hmac.compare_digest(headers.get('X-Gitlab-Token', ''), secret)
+
+
+class ReviewService:
+    """Owns the job queue and the worker threads; the HTTP handler only enqueues and reads metrics."""
+
+    def __init__(self, config: Dict[str, Any]):
+        settings = config.get('service', {})
+        self.config = config
+        self.queue = ReviewQueue(settings.get('queue_path', DEFAULT_QUEUE_PATH),
+                                 settings.get('max_queue_depth', DEFAULT_MAX_DEPTH),
+                                 settings.get('max_attempts', DEFAULT_MAX_ATTEMPTS))
+        self.n_workers = settings.get('workers', DEFAULT_WORKERS)
+        self.retry_delay = settings.get('retry_delay_seconds', DEFAULT_RETRY_DELAY)
+        self.keep_finished = settings.get('keep_finished_jobs', DEFAULT_KEEP_FINISHED)
+        self.max_body_bytes = int(settings.get('max_body_mb', DEFAULT_MAX_BODY_MB) * 2**20)
+        self.webhook_path = config.get('integration', {}).get('webhook_url', DEFAULT_WEBHOOK_PATH)
+        self.secret = os.environ.get('PEERBOT_WEBHOOK_SECRET', '')
+
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._workers: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._mean_run = 0.0  # Moving average of review run time, for Retry-After under backpressure
+        self.started_at = time.time()
+        self.recovered: Dict[str, int] = {}
+        self.counters = {'events_received': 0, 'events_ignored': 0, 'events_invalid': 0, 'jobs_queued': 0,
+                         'jobs_duplicate': 0, 'jobs_rejected': 0, 'jobs_coalesced': 0,
+                         'reviews_done': 0, 'reviews_superseded': 0, 'reviews_retried': 0, 'reviews_failed': 0}
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    # --- Lifecycle ---
+    def start(self):
+        recovered = self.recovered = self.queue.recover()
+        if any(recovered.values()):
+            print(f"Jobs left running by a previous process: {recovered['queued']} re-queued, "
+                  f"{recovered['superseded']} superseded by a newer revision, {recovered['failed']} failed "
+                  f"(max attempts reached).")
+        for i in range(self.n_workers):
+            worker = threading.Thread(target=self._work, name=f"peerbot-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self, timeout: float = 30.0):
+        """Let running reviews finish; whatever is still running after `timeout` is recovered on restart."""
+        self._stopping.set()
+        self._wake.set()
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(max(0.0, deadline - time.monotonic()))
+
+    # --- Producer side ---
+    def submit(self, event: Dict[str, Any]) -> Tuple[int, Dict[str, Any], Dict[str, str]]:
+        """HTTP status, body and extra headers for one webhook event."""
+        self._count('events_received')
+        try:
+            parsed = parse_review_event(event)
+        except EventError as e:
+            self._count('events_invalid')
+            return 400, {'error': str(e)}, {}
+        if parsed is None:
+            self._count('events_ignored')
+            return 200, {'status': 'ignored'}, {}
+
+        pr_key, revision, pr_data = parsed
+        outcome = self.queue.enqueue(pr_key, revision, pr_data)
+        if outcome['status'] == 'rejected':
+            self._count('jobs_rejected')
+            return 503, {'status': 'rejected', 'error': 'Review queue is full.'}, \
+                {'Retry-After': str(self.retry_after())}
+        if outcome['status'] == 'duplicate':
+            self._count('jobs_duplicate')
+            return 200, outcome, {}
+        self._count('jobs_queued')
+        self._count('jobs_coalesced', outcome['superseded'])
+        self._wake.set()
+        return 202, outcome, {}
+
+    def retry_after(self) -> int:
+        """Seconds until the workers have drained the current queue, at the average review time."""
+        with self._lock:
+            mean_run = self._mean_run or 1.0
+        return max(1, min(300, math.ceil(self.queue.depth() * mean_run / max(1, self.n_workers))))
+
+    # --- Worker side ---
+    def _work(self):
+        while not self._stopping.is_set():
+            job = self.queue.claim()
+            if job is None:
+                self._wake.wait(POLL_INTERVAL)
+                self._wake.clear()
+                continue
+            self._run(job)
+            self._wake.set()  # The PR may have a newer revision that can run now
+
+    def _run(self, job: Dict[str, Any]):
+        start = time.monotonic()
+        trace = start_trace(self.config, job_id=job['id'], pr=job['pr_key'], attempt=job['attempts'])
+        trace.observe('queue_wait', job['started_at'] - job['enqueued_at'])
+        try:
+            report = execute_peerbot_review(job['payload'], self.config, trace)
+            error = report.get('error')
+        except Exception as e:  # A review must never take its worker down
+            report, error = None, f"{type(e).__name__}: {e}"
+            trace.finish({'status': 'Error'})
+        elapsed = time.monotonic() - start
+        with self._lock:
+            self._mean_run = elapsed if not self._mean_run else 0.8 * self._mean_run + 0.2 * elapsed
+
+        if error is None:
+            status = self.queue.complete(job['id'], report)
+            self._count('reviews_done' if status == 'done' else 'reviews_superseded')
+            print(f"Job #{job['id']} {job['pr_key']} @ {job['revision'][:12]}: {status} in {elapsed:.2f}s")
+            with self._lock:
+                finished = self.counters['reviews_done'] + self.counters['reviews_superseded']
+            if finished % PRUNE_EVERY == 0:
+                self.queue.prune(self.keep_finished)
+            return
+
+        status = self.queue.fail(job['id'], error, self.retry_delay)
+        self._count({'queued': 'reviews_retried', 'superseded': 'reviews_superseded'}.get(status, 'reviews_failed'))
+        print(f"Job #{job['id']} {job['pr_key']} attempt {job['attempts']} failed ({error}); {status}")
+
+    # --- Metrics ---
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+        return {'uptime_s': round(time.time() - self.started_at, 3), 'workers': self.n_workers,
+                'queue_depth': self.queue.depth(), 'max_queue_depth': self.queue.max_depth,
+                'recovered_on_start': self.recovered, **counters, **self.queue.stats()}
+
+    def prometheus_gauges(self) -> Dict[str, float]:
+        """The numbers of metrics(), flattened into Prometheus gauge names."""
+        gauges = {}
+        for name, value in self.metrics().items():
+            if name == 'jobs':
+                gauges.update({f"queue_jobs_{status}": count for status, count in value.items()})
+            elif name == 'latency_seconds':
+                gauges.update({f"queue_{kind}_seconds_{q}": v for kind, qs in value.items() for q, v in qs.items()})
+            else:
+                gauges[f"service_{name}"] = value
+        return gauges
+
+
+class ReviewRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'PeerBot'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def service(self) -> ReviewService:
+        return self.server.service
+
+    def _send(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None,
+              text: Optional[str] = None):
+        """JSON `body`, or plain `text` (the Prometheus exposition) when given."""
+        data = (json.dumps(body) if text is None else text).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json' if text is None else 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if self.path != self.service.webhook_path:
+            return self._send(404, {'error': 'Not found.'})
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # The end of the body is unknown, so the connection cannot be reused
+            self.close_connection = True
+            return self._send(400, {'error': 'Invalid Content-Length.'})
+        if length > self.service.max_body_bytes:
+            self.close_connection = True
+            return self._send(413, {'error': 'Payload too large.'})
+        body = self.rfile.read(length)
+        if not verify_signature(self.service.secret, body, self.headers):
+            return self._send(401, {'error': 'Invalid webhook signature.'})
+        try:
+            event = json.loads(body)
+        except ValueError:
+            return self._send(400, {'error': 'Body is not valid JSON.'})
+        self._send(*self.service.submit(event))
+
+    def do_GET(self):
+        if self.path == '/healthz':
+            return self._send(200, {'status': 'ok'})
+        if self.path == '/metrics':
+            return self._send(200, self.service.metrics())
+        if self.path == '/metrics/prometheus':
+            return self._send(200, {}, text=REGISTRY.prometheus_text(self.service.prometheus_gauges()))
+        if self.path.startswith('/jobs/') and self.path[6:].isdigit():
+            job = self.service.queue.get(int(self.path[6:]))
+            return self._send(200, job) if job else self._send(404, {'error': 'Unknown job.'})
+        self._send(404, {'error': 'Not found.'})
+
+    def log_message(self, format, *args):
+        pass  # One line per finished job is printed by the workers instead
+
+
+def serve(config: Dict[str, Any], host: str, port: int):
+    service = ReviewService(config)
+    httpd = ThreadingHTTPServer((host, port), ReviewRequestHandler)
+    httpd.daemon_threads = True
+    httpd.service = service
+    # SIGTERM stops like Ctrl+C: no new events, running reviews get time to finish
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    service.start()
+    print(f"PeerBot review service on http://{host}:{port}{service.webhook_path} "
+          f"({service.n_workers} workers, queue {service.queue.path})")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        service.stop()
+
+
+# --- End-to-end check: real service process, mock LLM, a crash in the middle ---
+def _http_json(method: str, url: str, body: Optional[Dict[str, Any]] = None) -> Tuple[int, Dict[str, Any], Dict]:
+    data = None if body is None else json.dumps(body).encode('utf-8')
+    request = urllib.request.Request(url, data=data, method=method, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read()), dict(response.headers)
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b'{}'), dict(e.headers)
+
+
+def _wait_until(predicate, timeout: float, interval: float = 0.1) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if predicate():
+                return True
+        except OSError:
+            pass
+        time.sleep(interval)
+    return False
+
+
+def _sample_event(pr: int, push: int) -> Dict[str, Any]:
+    return {'repository': 'demo/monorepo', 'number': pr, 'revision': f"{pr:04d}{push:04d}" + '0' * 32,
+            'title': f"Feature: service change #{pr}", 'description': "Adds a login handler for the auth service.",
+            'diff': f"// file: services/svc{pr}.js\n+const user_id{pr}_{push} = req.body.user_id;\n"
+                    f"+localStorage.setItem('auth_token', token);\n+const retries = {push};\n"
+                    f"+const session = openSession(userId);\n+export default session;\n"}
+
+
+def run_end_to_end(config: Dict[str, Any], n_prs: int, pushes: int, workers: int, latency_ms: float,
+                   max_depth: int, metrics_log: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Send `pushes` revisions of `n_prs` PRs to a service process, SIGKILL it mid-way, restart it on
+    the same queue, and check that the latest revision of every PR was reviewed exactly once.
+    With metrics_log, the service writes its per-review stage timings there (instrumentation.py).
+    """
+    from mock_llm_server import endpoint_url, fetch_stats, free_port, launch_mock_server
+
+    workdir = tempfile.mkdtemp(prefix='peerbot-e2e-')
+    llm_port, service_port = free_port(), free_port()
+    queue_path = os.path.join(workdir, 'jobs.sqlite3')
+    config = {**config, 'model_settings': {**config.get('model_settings', {}), 'api_endpoint': endpoint_url(llm_port)},
+              'cache': {**config.get('cache', {}), 'path': os.path.join(workdir, 'cache.sqlite3')},
+              'rate_limits': {'enabled': False},
+              'service': {**config.get('service', {}), 'queue_path': queue_path, 'workers': workers,
+                          'max_queue_depth': max_depth, 'retry_delay_seconds': 1},
+              'instrumentation': {'enabled': bool(metrics_log),
+                                  'log_path': os.path.abspath(metrics_log) if metrics_log else None}}
+    config_path = os.path.join(workdir, 'config.json')
+    with open(config_path, 'w') as f:
+        json.dump(config, f)
+
+    base = f"http://{DEFAULT_HOST}:{service_port}"
+    webhook = base + config.get('integration', {}).get('webhook_url', DEFAULT_WEBHOOK_PATH)
+
+    def start_service() -> subprocess.Popen:
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__), 'serve', '--config', config_path,
+                                    '--port', str(service_port)], stdout=subprocess.DEVNULL,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+        if not _wait_until(lambda: _http_json('GET', base + '/healthz')[0] == 200, 15):
+            process.kill()
+            raise RuntimeError("Review service did not start.")
+        return process
+
+    mock_process = launch_mock_server(llm_port, '--latency-ms', str(latency_ms))
+    service_process = start_service()
+    sent, statuses, rejected = 0, {}, 0
+    try:
+        # Pushes arrive faster than reviews finish; a 503 is retried after Retry-After, like a webhook sender
+        start = time.perf_counter()
+        for push in range(pushes):
+            for pr in range(n_prs):
+                event = _sample_event(pr, push)
+                status, _, headers = _http_json('POST', webhook, event)
+                while status == 503:
+                    rejected += 1
+                    time.sleep(min(float(headers.get('Retry-After', 1)), 2.0))
+                    status, _, headers = _http_json('POST', webhook, event)
+                statuses[status] = statuses.get(status, 0) + 1
+                sent += 1
+        # Redelivery of an event that is already queued or reviewed must not create a job
+        duplicate_status = _http_json('POST', webhook, _sample_event(0, pushes - 1))[0]
+
+        # Crash: kill the service without warning while it is reviewing, then restart on the same queue
+        _wait_until(lambda: _http_json('GET', base + '/metrics')[1]['jobs']['running'] >= 1, 30, 0.01)
+        service_process.kill()
+        service_process.wait()
+        service_process = start_service()
+        recovered = _http_json('GET', base + '/metrics')[1]['recovered_on_start']
+        drained = _wait_until(lambda: _http_json('GET', base + '/metrics')[1]['queue_depth'] == 0 and
+                              _http_json('GET', base + '/metrics')[1]['jobs']['running'] == 0, 120, 0.2)
+        elapsed = time.perf_counter() - start
+        metrics = _http_json('GET', base + '/metrics')[1]
+        llm_stats = fetch_stats(llm_port)
+    finally:
+        for process in (service_process, mock_process):
+            process.terminate()
+            process.wait()
+
+    # Older revisions may have finished before the next push arrived; the last one must be 'done' exactly once
+    queue = ReviewQueue(queue_path)
+    all_jobs = queue.jobs(limit=n_prs * pushes + 1)
+    done = {}
+    for job in all_jobs:
+        if job['status'] == 'done':
+            done.setdefault(job['pr_key'], []).append(job['revision'])
+    latest_ok = all(done.get(f"demo/monorepo#{pr}", []).count(_sample_event(pr, pushes - 1)['revision']) == 1
+                    for pr in range(n_prs))
+    # No review may start on a revision after a newer one of its PR was queued (e.g. a re-queued crash)
+    stale_starts = sum(1 for job in all_jobs if job['started_at'] is not None and any(
+        other['pr_key'] == job['pr_key'] and other['id'] > job['id'] and other['enqueued_at'] < job['started_at']
+        for other in all_jobs))
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    jobs, latency = metrics['jobs'], metrics['latency_seconds']
+    print("=" * 74)
+    print(f"PEERBOT REVIEW SERVICE END-TO-END: {n_prs} PRs x {pushes} pushes, {workers} workers")
+    print("=" * 74)
+    print(f"- Events sent: {sent} (HTTP {', '.join(f'{k}: {v}' for k, v in sorted(statuses.items()))}); "
+          f"redelivered event answered {duplicate_status}")
+    print(f"- Backpressure: {rejected} event(s) answered 503 and resent after Retry-After")
+    print(f"- Service killed mid-run and restarted: of the jobs it was running, {recovered['queued']} re-queued, "
+          f"{recovered['superseded']} superseded by a newer revision, {recovered['failed']} failed")
+    print(f"- Queue drained: {drained} in {elapsed:.2f}s")
+    print(f"- Jobs: {jobs['done']} done, {jobs['superseded']} superseded, {jobs['failed']} failed")
+    print(f"- Latest revision reviewed exactly once for all {n_prs} PRs: {latest_ok}")
+    print(f"- Reviews started on a revision that was already outdated: {stale_starts}")
+    print(f"- LLM requests: {llm_stats['requests_total']} for {n_prs * pushes} pushes")
+    print(f"- Latency (s): wait p50 {latency['wait']['p50']} / p95 {latency['wait']['p95']}, "
+          f"run p50 {latency['run']['p50']} / p95 {latency['run']['p95']}, total p95 {latency['total']['p95']}")
+    print("=" * 74)
+    return {'drained': drained, 'latest_ok': latest_ok, 'stale_starts': stale_starts, 'recovered': recovered,
+            'metrics': metrics}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Webhook-driven PeerBot review service with a durable job queue.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve_p = sub.add_parser('serve', help="Run the webhook service and its workers.")
+    serve_p.add_argument('--host', default=None)
+    serve_p.add_argument('--port', type=int, default=None)
+    serve_p.add_argument('--workers', type=int, default=None)
+    serve_p.add_argument('--config', default='config.json')
+
+    e2e_p = sub.add_parser('e2e', help="End-to-end run against mock_llm_server.py, with a crash and restart.")
+    e2e_p.add_argument('--prs', type=int, default=20)
+    e2e_p.add_argument('--pushes', type=int, default=3)
+    e2e_p.add_argument('--workers', type=int, default=4)
+    e2e_p.add_argument('--latency-ms', type=float, default=200.0)
+    e2e_p.add_argument('--max-depth', type=int, default=DEFAULT_MAX_DEPTH)
+    e2e_p.add_argument('--metrics-log', help="Write the service's stage timings to this JSON log.")
+    e2e_p.add_argument('--config', default='config.json')
+    args = parser.parse_args()
+
+    peerbot_config = load_configuration(args.config)
+    if args.command == 'serve':
+        settings = peerbot_config.get('service', {})
+        if args.workers is not None:
+            peerbot_config['service'] = settings = {**settings, 'workers': args.workers}
+        serve(peerbot_config, args.host or settings.get('host', DEFAULT_HOST), args.port or settings.get('port', DEFAULT_PORT))
+    else:
+        run_end_to_end(peerbot_config, args.prs, args.pushes, args.workers, args.latency_ms, args.max_depth,
+                       args.metrics_log)
@@ -0,0 +1,201 @@
+"""
+Columnar (NumPy array-backed) Record Store
+Holds records field-by-field in typed arrays instead of one dict per record, and sorts
+by computing a permutation with a stable NumPy argsort. Rows are exposed as lazy views,
+so nothing is materialized as a dict unless asked for. Converts from/to the
+List[Dict[str, Any]] format used by dict_sort_comparison.py.
+
+Usage:
+    python columnar_records.py --sizes 1000000 2000000
+"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+from collections.abc import Mapping, Sequence
+from typing import List, Dict, Any, Iterator, Optional
+
+import numpy as np
+
+from dict_sort_comparison import sort_by_key_itemgetter
+
+
+class RecordView(Mapping):
+    """Read-only, dict-like view of one row of a ColumnarRecords store."""
+
+    __slots__ = ('_store', '_index')
+
+    def __init__(self, store: 'ColumnarRecords', index: int):
+        self._store = store
+        self._index = index
+
+    def __getitem__(self, field: str) -> Any:
+        return self._store.columns[field][self._index].item()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._store.columns)
+
+    def __len__(self) -> int:
+        return len(self._store.columns)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: self[field] for field in self._store.columns}
+
+    def __repr__(self) -> str:
+        return f"RecordView({self.to_dict()})"
+
+
+class SortedView(Sequence):
+    """Rows of a store in permutation order, without copying any column."""
+
+    def __init__(self, store: 'ColumnarRecords', order: np.ndarray):
+        self._store = store
+        self.order = order
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return SortedView(self._store, self.order[i])
+        return RecordView(self._store, int(self.order[i]))
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return self._store.to_dicts(self.order)
+
+
+class ColumnarRecords:
+    """
+    Record container with one typed NumPy array per field (e.g. name/age/score).
+    Memory: one array element per value instead of a dict (~200+ bytes) per record.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"All columns must have the same length, got {sorted(lengths)}.")
+        self.columns = {field: np.asarray(values) for field, values in columns.items()}
+
+    # ============= CONVERSIONS =============
+    @classmethod
+    def from_dicts(cls, data: List[Dict[str, Any]], fields: Optional[List[str]] = None,
+                   default: Any = 0) -> 'ColumnarRecords':
+        """
+        Build from a list of dicts. Missing keys take `default`, like sort_by_key_safe.
+        Field types are inferred per column (int64, float64, fixed-width unicode, ...).
+        """
+        if fields is None:
+            fields = list(dict.fromkeys(field for record in data for field in record))
+        return cls({field: np.array([record.get(field, default) for record in data]) for field in fields})
+
+    def to_dicts(self, order: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Materialize rows as plain dicts (optionally in `order`)."""
+        selected = {field: (values if order is None else values[order]).tolist()
+                    for field, values in self.columns.items()}
+        fields = list(selected)
+        return [dict(zip(fields, row)) for row in zip(*selected.values())]
+
+    # ============= ACCESS =============
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __getitem__(self, index: int) -> RecordView:
+        if not -len(self) <= index < len(self):
+            raise IndexError("record index out of range")
+        return RecordView(self, index % len(self))
+
+    def __iter__(self) -> Iterator[RecordView]:
+        return (RecordView(self, i) for i in range(len(self)))
+
+    def nbytes(self) -> int:
+        return sum(values.nbytes for values in self.columns.values())
+
+    # ============= SORTING =============
+    def sort_by_key(self, key: str, reverse: bool = False) -> np.ndarray:
+        """
+        Permutation that sorts the store by `key` (stable, like sorted()).
+        With reverse=True, equal keys keep their original order, matching sorted(..., reverse=True).
+        Time Complexity: O(n log n) in C (radix sort for integer types of 16 bits or less)
+        Space Complexity: O(n) - one index array, no record copies
+        """
+        values = self.columns[key]
+        if not reverse:
+            return np.argsort(values, kind='stable')
+        # Stable descending: sort the reversed array ascending, then reverse and re-index
+        n = len(values)
+        return (n - 1) - np.argsort(values[::-1], kind='stable')[::-1]
+
+    def sorted_view(self, key: str, reverse: bool = False) -> SortedView:
+        """Lazy, ordered rows: records are only built when accessed."""
+        return SortedView(self, self.sort_by_key(key, reverse))
+
+    def take(self, order: np.ndarray) -> 'ColumnarRecords':
+        """New store with the rows reordered (or selected) by `order`."""
+        return ColumnarRecords({field: values[order] for field, values in self.columns.items()})
+
+
+# ============= BENCHMARK =============
+def _generate_columns(n: int, seed: int = 42) -> Dict[str, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    return {
+        'name': np.array([f'user{i}' for i in range(n)]),  # Narrowest fixed-width unicode dtype
+        'age': 18 + np.arange(n, dtype=np.int64) % 60,
+        'score': rng.integers(0, n * 10, n, dtype=np.int64),
+    }
+
+
+def _traced_size(build) -> tuple:
+    """(object, bytes still allocated after build()) measured with tracemalloc."""
+    tracemalloc.start()
+    obj = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, current
+
+
+def benchmark_columnar(sizes: List[int], key: str = 'score', repeats: int = 3) -> List[Dict[str, Any]]:
+    """Memory and sort time of ColumnarRecords vs. a list of dicts with sort_by_key_itemgetter."""
+    results = []
+    print("=" * 78)
+    print(f"{'rows':>10} | {'dicts MB':>9} | {'columnar MB':>11} | {'itemgetter s':>12} | "
+          f"{'argsort s':>9} | {'speedup':>7}")
+    print("-" * 78)
+    for n in sizes:
+        columns = _generate_columns(n)
+        names, ages, scores = columns['name'].tolist(), columns['age'].tolist(), columns['score'].tolist()
+
+        records, dict_bytes = _traced_size(
+            lambda: [{'name': a, 'age': b, 'score': c} for a, b, c in zip(names, ages, scores)])
+        # Strings are shared with `names`; count them towards the dict layout as well
+        dict_bytes += sum(sys.getsizeof(name) for name in names)
+        store, columnar_bytes = _traced_size(lambda: ColumnarRecords(
+            {field: values.copy() for field, values in columns.items()}))
+
+        dict_time = min(_timed(lambda: sort_by_key_itemgetter(records, key)) for _ in range(repeats))
+        columnar_time = min(_timed(lambda: store.sort_by_key(key)) for _ in range(repeats))
+        assert [r[key] for r in sort_by_key_itemgetter(records, key)[:100]] == \
+               [row[key] for row in store.sorted_view(key)[:100]]
+
+        print(f"{n:>10,} | {dict_bytes / 2**20:9.1f} | {columnar_bytes / 2**20:11.1f} | "
+              f"{dict_time:12.3f} | {columnar_time:9.3f} | {dict_time / columnar_time:6.1f}x")
+        results.append({'size': n, 'dict_bytes': dict_bytes, 'columnar_bytes': columnar_bytes,
+                        'itemgetter_s': dict_time, 'argsort_s': columnar_time})
+        del records, store
+    print("=" * 78)
+    return results
+
+
+def _timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Columnar record store vs. list of dicts.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000_000, 2_000_000])
+    parser.add_argument('--key', default='score')
+    args = parser.parse_args()
+
+    benchmark_columnar(args.sizes, args.key)
@@ -3,8 +3,10 @@ Comparison of Dictionary Sorting Implementations
 Demonstrates different approaches to sorting lists of dictionaries by a specific key
 """
 
+import heapq
 import time
-from typing import List, Dict, Any
+from operator import methodcaller
+from typing import List, Dict, Any, Tuple
 
 # Sample data for testing
 sample_data = [
@@ -68,6 +70,51 @@ def sort_by_key_inplace(data: List[Dict[str, Any]], key: str, reverse: bool = Fa
     return data
 
 
+# ============= IMPLEMENTATION 5: Safe sort (missing keys) =============
+def sort_by_key_safe(data: List[Dict[str, Any]], key: str,
+                     default=0, reverse: bool = False) -> List[Dict[str, Any]]:
+    """Safe sorting with default value for missing keys"""
+    return sorted(data, key=lambda x: x.get(key, default), reverse=reverse)
+
+
+# ============= IMPLEMENTATION 6: Top-k selection =============
+def top_k_by_key(data: List[Dict[str, Any]], key: str, k: int,
+                 default=0, reverse: bool = False) -> List[Dict[str, Any]]:
+    """
+    First k records of sort_by_key_safe(data, key, default, reverse) without a full sort.
+    Use reverse=True for the k highest (e.g. a leaderboard by 'score').
+    Time Complexity: O(n log k) - heap selection
+    Space Complexity: O(k)
+    """
+    if k <= 0:
+        return []
+    if k >= len(data):
+        return sort_by_key_safe(data, key, default, reverse)
+    # heapq.nsmallest/nlargest are documented as equivalent to sorted(...)[:k], ties included
+    select = heapq.nlargest if reverse else heapq.nsmallest
+    return select(k, data, key=lambda x: x.get(key, default))
+
+
+# ============= IMPLEMENTATION 7: Multi-key sort =============
+def sort_by_keys(data: List[Dict[str, Any]], keys: List[Tuple[str, bool]],
+                 default=0) -> List[Dict[str, Any]]:
+    """
+    Sort by several keys with a per-key direction,
+    e.g. keys=[('score', True), ('age', False)] -> score descending, then age ascending.
+    Missing keys take `default`, like sort_by_key_safe. Stable for full ties.
+    Timsort is stable, so sorting by the least significant key first and the most
+    significant key last gives the multi-key order. Each pass uses a C-level key getter
+    and reverse=, which on CPython beats a single sort on composite tuple keys
+    (no tuple per record, no Python-level comparisons, no negation tricks for strings).
+    Time Complexity: O(k * n log n) for k keys
+    Space Complexity: O(n) - one new list, sorted in place per key
+    """
+    result = list(data)
+    for field, descending in reversed(keys):
+        result.sort(key=methodcaller('get', field, default), reverse=descending)
+    return result
+
+
 # ============= PERFORMANCE TESTING =============
 def benchmark_sorting_methods(data: List[Dict[str, Any]], key: str, iterations: int = 1000):
     """Benchmark different sorting implementations"""
@@ -80,13 +127,15 @@ def benchmark_sorting_methods(data: List[Dict[str, Any]], key: str, iterations:
         ("AI-Optimized (sorted + lambda)", sort_by_key_optimized),
         ("operator.itemgetter", sort_by_key_itemgetter),
         ("Manual Bubble Sort", sort_by_key_manual_bubble),
-        ("In-place sort()", lambda d, k, r=False: sort_by_key_inplace(d.copy(), k, r))
+        ("In-place sort()", sort_by_key_inplace)
     ]
-    
+
     for name, func in methods:
+        # Copies are made before the timer starts so only the sort itself is measured
+        copies = [data.copy() for _ in range(iterations)]
         start = time.perf_counter()
-        for _ in range(iterations):
-            result = func(data.copy(), key)
+        for i in range(iterations):
+            result = func(copies[i], key)
         elapsed = time.perf_counter() - start
         
         print(f"\n{name}:")
@@ -109,7 +158,7 @@ if __name__ == "__main__":
         ("AI-Optimized", sort_by_key_optimized),
         ("itemgetter", sort_by_key_itemgetter),
         ("Bubble Sort", sort_by_key_manual_bubble),
-        ("In-place", lambda d, k, r: sort_by_key_inplace(d.copy(), k, r))
+        ("In-place", lambda d, k, reverse=False: sort_by_key_inplace(d.copy(), k, reverse))
     ]
     
     for name, func in implementations:
@@ -127,13 +176,20 @@ if __name__ == "__main__":
     print("=" * 70)
     
     # Safe version with default value
-    def sort_by_key_safe(data: List[Dict[str, Any]], key: str, 
-                         default=0, reverse: bool = False) -> List[Dict[str, Any]]:
-        """Safe sorting with default value for missing keys"""
-        return sorted(data, key=lambda x: x.get(key, default), reverse=reverse)
-    
     incomplete_data = sample_data + [{'name': 'Frank', 'age': 40}]  # Missing 'score'
     result = sort_by_key_safe(incomplete_data, 'score', default=0, reverse=True)
     print("\nSafe sorting with missing keys:")
     for item in result:
         print(f"  {item}")
+
+    print("\n" + "=" * 70)
+    print("TOP-K AND MULTI-KEY SORTING")
+    print("=" * 70)
+
+    print("\nTop 3 by 'score' (heap selection, no full sort):")
+    for item in top_k_by_key(incomplete_data, 'score', 3, default=0, reverse=True):
+        print(f"  {item}")
+
+    print("\nSorted by 'score' descending, then 'age' ascending (stable sort per key):")
+    for item in sort_by_keys(incomplete_data, [('score', True), ('age', False)]):
+        print(f"  {item}")
@@ -0,0 +1,353 @@
+"""
+External-Memory (Out-of-Core) Merge Sort for JSON Lines Record Files
+Sorts files far larger than RAM with the sort_by_key_safe semantics (key, reverse,
+default for missing keys, stable):
+  1. the input is streamed and cut into bounded runs (record count and memory budget),
+  2. each run is sorted, optionally in a process pool, and spilled to a temp file as
+     marshal-encoded (key, original line) batches,
+  3. a k-way heapq.merge over the runs streams the sorted output.
+With a memory budget, it bounds both phases: the run size, and for the merge the fan-in and the
+size of the batches read back from each run (extra merge passes when there are too many runs).
+Only the original JSON text is carried through, so the output is written without
+re-serializing the records.
+
+Usage:
+    python external_sort.py sort exports.jsonl sorted.jsonl --key score --reverse --memory-mb 512
+    python external_sort.py bench --records 1000000 --run-sizes 10000 100000 500000
+    python external_sort.py memcheck --mb 64 --memory-mb 8
+"""
+
+import argparse
+import heapq
+import json
+import marshal
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+
+DEFAULT_RUN_SIZE = 100_000            # Records per run
+RUN_MEMORY_FACTOR = 6                 # Measured: a run costs ~6x its JSON text in process RSS
+SPILL_BATCH_SIZE = 1_024              # Max (key, line) pairs per marshal record in a run file
+MAX_MERGE_FAN_IN = 128                # Runs merged at once; more runs are merged in passes
+READ_BUFFER_BYTES = 1 << 16
+MIN_MERGE_SHARE_BYTES = 1 << 18       # Smallest share of the budget given to one run in the merge
+MERGE_MEMORY_FACTOR = 3               # A decoded (key, line) batch costs up to ~2.5x its text (100-char lines)
+
+_entry_key = itemgetter(0)
+_decode = json.JSONDecoder().decode   # str input: skips json.loads' per-call encoding detection
+
+
+# ============= RUN GENERATION =============
+def _iter_line_chunks(path: str, max_records: int, max_chars: Optional[int]) -> Iterator[List[str]]:
+    """Non-blank lines of `path` in chunks bounded by record count and total characters."""
+    chunk, size = [], 0
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.isspace():
+                continue
+            if not line.endswith('\n'):
+                line += '\n'
+            chunk.append(line)
+            size += len(line)
+            if len(chunk) >= max_records or (max_chars is not None and size >= max_chars):
+                yield chunk
+                chunk, size = [], 0
+    if chunk:
+        yield chunk
+
+
+def _write_run(entries: Iterable[Tuple[Any, str]], path: str, batch_chars: Optional[int]) -> None:
+    """Spill (key, line) pairs to `path` in marshal batches of at most SPILL_BATCH_SIZE pairs / `batch_chars` of text."""
+    with open(path, 'wb') as f:
+        batch, size = [], 0
+        for entry in entries:
+            batch.append(entry)
+            size += len(entry[1])
+            if len(batch) >= SPILL_BATCH_SIZE or (batch_chars is not None and size >= batch_chars):
+                marshal.dump(batch, f)
+                batch, size = [], 0
+        if batch:
+            marshal.dump(batch, f)
+
+
+def _sort_run(lines: List[str], key: str, reverse: bool, default: Any, path: str,
+              batch_chars: Optional[int] = None) -> Tuple[str, int]:
+    """Sort one run by `key` (stable) and spill it to `path`. Runs in a worker process when pooled."""
+    entries = [(_decode(line).get(key, default), line) for line in lines]
+    entries.sort(key=_entry_key, reverse=reverse)
+    _write_run(entries, path, batch_chars)
+    return path, len(entries)
+
+
+def _read_run(path: str, read_buffer: int = READ_BUFFER_BYTES) -> Iterator[Tuple[Any, str]]:
+    with open(path, 'rb', buffering=read_buffer) as f:
+        while True:
+            try:
+                batch = marshal.load(f)
+            except EOFError:
+                return
+            yield from batch
+
+
+def spill_sorted_runs(path: str, key: str, tmp_dir: str, reverse: bool = False, default: Any = 0,
+                      run_size: int = DEFAULT_RUN_SIZE, memory_budget_mb: Optional[float] = None,
+                      workers: int = 1, batch_chars: Optional[int] = None) -> List[Tuple[str, int]]:
+    """
+    Cut `path` into sorted run files inside `tmp_dir`; returns (run path, record count) in input order.
+    With a memory budget, a run is also closed once its text reaches the share of the budget
+    available to it (one run is read while up to `workers` others are being sorted).
+    `batch_chars` bounds the text of each spilled batch, i.e. what the merge reads back at once.
+    """
+    in_flight = max(1, workers) + (1 if workers > 1 else 0)
+    max_bytes = None
+    if memory_budget_mb is not None:
+        max_bytes = max(1, int(memory_budget_mb * 2**20 / (RUN_MEMORY_FACTOR * in_flight)))
+    chunks = _iter_line_chunks(path, run_size, max_bytes)
+    run_path = lambda i: os.path.join(tmp_dir, f'run_{i:06d}.bin')
+
+    if workers <= 1:
+        return [_sort_run(lines, key, reverse, default, run_path(i), batch_chars) for i, lines in enumerate(chunks)]
+
+    runs, pending = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for i, lines in enumerate(chunks):
+            # Bounded submission: never more than `workers` unsorted runs alive at once
+            if len(pending) >= workers:
+                runs.append(pending.pop(0).result())
+            pending.append(pool.submit(_sort_run, lines, key, reverse, default, run_path(i), batch_chars))
+        runs.extend(future.result() for future in pending)
+    return runs
+
+
+# ============= K-WAY MERGE =============
+def merge_plan(memory_budget_mb: Optional[float]) -> Tuple[int, Optional[int], int]:
+    """
+    (fan-in, spill batch characters, read buffer bytes) that keep the merge within the budget.
+    Each run being merged holds one decoded batch plus its read buffer, and an intermediate
+    pass also holds the batch it is writing, so the budget is shared by fan-in + 1 runs.
+    """
+    if memory_budget_mb is None:
+        return MAX_MERGE_FAN_IN, None, READ_BUFFER_BYTES
+    budget = int(memory_budget_mb * 2**20)
+    fan_in = max(2, min(MAX_MERGE_FAN_IN, budget // MIN_MERGE_SHARE_BYTES - 1))
+    share = budget // (fan_in + 1)
+    read_buffer = max(1, min(READ_BUFFER_BYTES, share // 4))
+    return fan_in, max(1, (share - read_buffer) // MERGE_MEMORY_FACTOR), read_buffer
+
+
+def _merge_entries(paths: List[str], reverse: bool, read_buffer: int) -> Iterator[Tuple[Any, str]]:
+    # heapq.merge breaks ties by input order, and runs are in input order -> stable overall
+    return heapq.merge(*(_read_run(p, read_buffer) for p in paths), key=_entry_key, reverse=reverse)
+
+
+def merge_runs(paths: List[str], tmp_dir: str, reverse: bool = False, fan_in: int = MAX_MERGE_FAN_IN,
+               batch_chars: Optional[int] = None, read_buffer: int = READ_BUFFER_BYTES) -> Iterator[Tuple[Any, str]]:
+    """Stream (key, line) pairs from sorted runs, merging in passes when there are more than `fan_in` runs."""
+    level = 0
+    while len(paths) > fan_in:
+        merged = []
+        for start in range(0, len(paths), fan_in):
+            group = paths[start:start + fan_in]
+            out_path = os.path.join(tmp_dir, f'merge_{level}_{start // fan_in:06d}.bin')
+            _write_run(_merge_entries(group, reverse, read_buffer), out_path, batch_chars)
+            for p in group:
+                os.remove(p)
+            merged.append(out_path)
+        paths, level = merged, level + 1
+    return _merge_entries(paths, reverse, read_buffer)
+
+
+# ============= PUBLIC API =============
+def _sorted_lines(path: str, key: str, reverse: bool, default: Any, run_size: int,
+                  memory_budget_mb: Optional[float], workers: int, tmp_dir: Optional[str],
+                  stats: Optional[Dict[str, Any]]) -> Iterator[str]:
+    fan_in, batch_chars, read_buffer = merge_plan(memory_budget_mb)
+    with tempfile.TemporaryDirectory(prefix='extsort_', dir=tmp_dir) as work_dir:
+        runs = spill_sorted_runs(path, key, work_dir, reverse, default, run_size, memory_budget_mb, workers,
+                                 batch_chars)
+        if stats is not None:
+            stats.update(runs=len(runs), records=sum(count for _, count in runs), merge_fan_in=fan_in,
+                         spill_bytes=sum(os.path.getsize(p) for p, _ in runs))
+        for _, line in merge_runs([p for p, _ in runs], work_dir, reverse, fan_in, batch_chars, read_buffer):
+            yield line
+
+
+def external_sort_by_key(path: str, key: str, reverse: bool = False, default: Any = 0,
+                         run_size: int = DEFAULT_RUN_SIZE, memory_budget_mb: Optional[float] = None,
+                         workers: int = 1, tmp_dir: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Out-of-core sort_by_key_safe: yields the records of a JSON lines file sorted by `key`.
+    Same result as sort_by_key_safe(records, key, default, reverse), but memory is bounded by
+    the run size / memory budget instead of the file size; the budget also bounds the merge
+    (see merge_plan). Temp files are removed when the
+    generator is exhausted or closed.
+    Time Complexity: O(n log n) - O(n log r) for the runs + O(n log k) for the k-way merge
+    Space Complexity: O(r) records in memory per run, O(n) on disk; with a budget, O(budget) in memory
+    """
+    for line in _sorted_lines(path, key, reverse, default, run_size, memory_budget_mb, workers, tmp_dir, None):
+        yield _decode(line)
+
+
+def sort_jsonl_file(input_path: str, output_path: str, key: str, reverse: bool = False, default: Any = 0,
+                    run_size: int = DEFAULT_RUN_SIZE, memory_budget_mb: Optional[float] = None,
+                    workers: int = 1, tmp_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Sort a JSON lines file into `output_path` (original lines, unchanged); returns run statistics."""
+    stats: Dict[str, Any] = {}
+    start = time.perf_counter()
+    with open(output_path, 'w', encoding='utf-8', buffering=1 << 20) as out:
+        out.writelines(_sorted_lines(input_path, key, reverse, default, run_size,
+                                     memory_budget_mb, workers, tmp_dir, stats))
+    stats['seconds'] = time.perf_counter() - start
+    stats['records_per_s'] = stats['records'] / stats['seconds'] if stats['seconds'] else 0.0
+    return stats
+
+
+# ============= BENCHMARK =============
+def write_sample_jsonl(path: str, n: int, distribution: str = 'random', chunk: int = 100_000,
+                       pad_chars: int = 0) -> int:
+    """
+    Write `n` benchmark records (see sort_benchmark.generate_records) as JSON lines; returns bytes.
+    `pad_chars` adds a 'note' field of that many characters to every record.
+    """
+    from sort_benchmark import generate_records
+
+    with open(path, 'w') as f:
+        for start in range(0, n, chunk):
+            records = generate_records(min(chunk, n - start), distribution, seed=start)
+            if pad_chars:
+                for r in records:
+                    r['note'] = 'x' * pad_chars
+            f.writelines(json.dumps(r) + '\n' for r in records)
+    return os.path.getsize(path)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process in MB (VmHWM on Linux, ru_maxrss elsewhere on Unix)."""
+    if os.path.exists('/proc/self/status'):
+        # ru_maxrss also counts the parent memory a child was spawned from; VmHWM starts at exec
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 2**10
+    import resource  # Unix only
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10  # bytes on macOS, KB elsewhere
+
+
+def check_memory_budget(size_mb: float, memory_budget_mb: float, record_chars: int = 2_000,
+                        slack: float = 1.5) -> Dict[str, Any]:
+    """
+    Sort a generated `size_mb` file of ~`record_chars` records in a child process with `memory_budget_mb`,
+    and check that its peak RSS stays within `slack` x the budget above the same sort of an empty file.
+    The file needs more runs than the merge fan-in, so the merge goes through an extra pass.
+    """
+    def sort_peak_mb(input_path: str, output_path: str) -> Tuple[float, str]:
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), 'sort', input_path, output_path,
+                                 '--key', 'score', '--memory-mb', str(memory_budget_mb), '--report-peak-rss'],
+                                capture_output=True, text=True, check=True)
+        summary, peak = result.stdout.strip().rsplit('\n', 1)
+        return float(peak.split()[-2]), summary
+
+    with tempfile.TemporaryDirectory(prefix='extsort_memcheck_') as data_dir:
+        input_path = os.path.join(data_dir, 'records.jsonl')
+        output_path = os.path.join(data_dir, 'sorted.jsonl')
+        n = int(size_mb * 2**20 / (record_chars + 60))
+        write_sample_jsonl(input_path, n, pad_chars=record_chars)
+        open(os.path.join(data_dir, 'empty.jsonl'), 'w').close()
+        baseline_mb, _ = sort_peak_mb(os.path.join(data_dir, 'empty.jsonl'), os.path.join(data_dir, 'empty.out'))
+        peak_mb, summary = sort_peak_mb(input_path, output_path)
+        with open(output_path, encoding='utf-8') as f:
+            scores = [_decode(line)['score'] for line in f]
+        sorted_ok = len(scores) == n and all(a <= b for a, b in zip(scores, scores[1:]))
+
+    used_mb = peak_mb - baseline_mb
+    within_budget = used_mb <= memory_budget_mb * slack
+    print("=" * 74)
+    print(f"EXTERNAL SORT MEMORY CHECK: {size_mb:.0f} MB of ~{record_chars:,}-char records, "
+          f"budget {memory_budget_mb:g} MB")
+    print("=" * 74)
+    print(f"- {summary}")
+    print(f"- Merge plan: fan-in {merge_plan(memory_budget_mb)[0]}")
+    print(f"- Peak RSS: {peak_mb:.1f} MB, {baseline_mb:.1f} MB sorting an empty file -> {used_mb:.1f} MB used")
+    print(f"- Output sorted: {sorted_ok}")
+    print(f"- Within {slack:g}x the budget: {within_budget}")
+    print("=" * 74)
+    return {'peak_rss_mb': peak_mb, 'baseline_rss_mb': baseline_mb, 'used_mb': used_mb,
+            'sorted_ok': sorted_ok, 'within_budget': within_budget}
+
+
+def benchmark_run_sizes(path: str, key: str, run_sizes: List[int], workers: int = 1,
+                        reverse: bool = False) -> List[Dict[str, Any]]:
+    """Throughput of sort_jsonl_file on `path` for several run sizes."""
+    size_mb = os.path.getsize(path) / 2**20
+    print("=" * 74)
+    print(f"EXTERNAL SORT of {path} ({size_mb:.1f} MB) by '{key}', workers={workers}")
+    print("=" * 74)
+    print(f"{'run size':>10} | {'runs':>6} | {'seconds':>8} | {'records/s':>11} | {'MB/s':>7} | {'spill MB':>8}")
+    print("-" * 74)
+    results = []
+    with tempfile.TemporaryDirectory(prefix='extsort_bench_') as out_dir:
+        out_path = os.path.join(out_dir, 'sorted.jsonl')
+        for run_size in run_sizes:
+            stats = sort_jsonl_file(path, out_path, key, reverse, run_size=run_size, workers=workers)
+            print(f"{run_size:>10,} | {stats['runs']:>6} | {stats['seconds']:8.2f} | "
+                  f"{stats['records_per_s']:11,.0f} | {size_mb / stats['seconds']:7.1f} | "
+                  f"{stats['spill_bytes'] / 2**20:8.1f}")
+            results.append(dict(stats, run_size=run_size, workers=workers))
+    print("=" * 74)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Out-of-core sort of JSON lines record files.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    sort_p = sub.add_parser('sort', help="Sort a JSON lines file by one key.")
+    sort_p.add_argument('input')
+    sort_p.add_argument('output')
+    sort_p.add_argument('--key', required=True)
+    sort_p.add_argument('--reverse', action='store_true')
+    sort_p.add_argument('--default', type=json.loads, default=0,
+                        help="JSON value used for records missing the key (default 0).")
+    sort_p.add_argument('--run-size', type=int, default=DEFAULT_RUN_SIZE, help="Max records per run.")
+    sort_p.add_argument('--memory-mb', type=float, help="Memory budget for the runs in MB.")
+    sort_p.add_argument('--workers', type=int, default=1, help="Processes sorting runs in parallel.")
+    sort_p.add_argument('--tmp-dir', help="Directory for run files (default: system temp).")
+    sort_p.add_argument('--report-peak-rss', action='store_true', help="Print the peak RSS after sorting.")
+
+    bench_p = sub.add_parser('bench', help="Throughput at several run sizes on generated records.")
+    bench_p.add_argument('--input', help="Existing JSON lines file (default: generate one).")
+    bench_p.add_argument('--records', type=int, default=1_000_000)
+    bench_p.add_argument('--key', default='score')
+    bench_p.add_argument('--run-sizes', type=int, nargs='+', default=[10_000, 100_000, 500_000])
+    bench_p.add_argument('--workers', type=int, default=1)
+
+    memcheck_p = sub.add_parser('memcheck', help="Check that a budgeted sort's peak memory stays near the budget.")
+    memcheck_p.add_argument('--mb', type=float, default=64, help="Size of the generated input file.")
+    memcheck_p.add_argument('--memory-mb', type=float, default=8)
+    memcheck_p.add_argument('--record-chars', type=int, default=2_000)
+    args = parser.parse_args()
+
+    if args.command == 'sort':
+        result = sort_jsonl_file(args.input, args.output, args.key, args.reverse, args.default,
+                                 args.run_size, args.memory_mb, args.workers, args.tmp_dir)
+        print(f"Sorted {result['records']:,} records in {result['runs']} runs: "
+              f"{result['seconds']:.2f}s ({result['records_per_s']:,.0f} records/s)")
+        if args.report_peak_rss:
+            print(f"Peak RSS: {peak_rss_mb():.1f} MB")
+    elif args.command == 'memcheck':
+        check = check_memory_budget(args.mb, args.memory_mb, args.record_chars)
+        sys.exit(0 if check['sorted_ok'] and check['within_budget'] else 1)
+    else:
+        with tempfile.TemporaryDirectory(prefix='extsort_data_') as data_dir:
+            input_path = args.input
+            if input_path is None:
+                input_path = os.path.join(data_dir, 'records.jsonl')
+                write_sample_jsonl(input_path, args.records)
+            benchmark_run_sizes(input_path, args.key, args.run_sizes, args.workers)
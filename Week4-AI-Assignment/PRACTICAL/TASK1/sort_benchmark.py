@@ -0,0 +1,231 @@
+"""
+Scalable Benchmark Harness for the Dictionary Sorting Implementations
+Sweeps data sizes (10 to 10^7 records) and key distributions, keeps copy cost out of
+the timed region, and reports medians, IQR and peak memory as text and JSON.
+
+Usage:
+    python sort_benchmark.py --sizes 10 1000 100000 --distributions random nearly_sorted
+    python sort_benchmark.py --json results.json
+    python sort_benchmark.py --json new.json --compare results.json   # flag regressions
+    python sort_benchmark.py --suite topk --sizes 100000 1000000 --k 100
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import string
+import sys
+import time
+import tracemalloc
+from typing import List, Dict, Any, Callable, Optional
+
+from dict_sort_comparison import (
+    sort_by_key_optimized,
+    sort_by_key_itemgetter,
+    sort_by_key_manual_bubble,
+    sort_by_key_inplace,
+    sort_by_key_safe,
+    top_k_by_key,
+    sort_by_keys,
+)
+
+DEFAULT_SIZES = [10, 100, 1_000, 10_000, 100_000, 1_000_000]
+DISTRIBUTIONS = ['random', 'nearly_sorted', 'many_duplicates', 'string_keys']
+BUBBLE_SORT_MAX_SIZE = 2_000          # O(n²): skipped automatically above this size
+MIN_SAMPLE_SECONDS = 0.005            # Inner loop is calibrated so one sample lasts at least this long
+REGRESSION_THRESHOLD = 1.10           # Median slower by more than 10% -> regression
+
+# (name, function, mutates_input)
+METHODS = [
+    ("sorted + lambda", sort_by_key_optimized, False),
+    ("operator.itemgetter", sort_by_key_itemgetter, False),
+    ("Manual Bubble Sort", sort_by_key_manual_bubble, False),
+    ("In-place sort()", sort_by_key_inplace, True),
+]
+
+
+# ============= DATA GENERATION =============
+def generate_records(n: int, distribution: str = 'random', seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    Generate `n` records shaped like `sample_data`. The sort key is always 'score':
+    - random:          uniformly random integers
+    - nearly_sorted:   ascending scores with ~1% of positions swapped
+    - many_duplicates: only 10 distinct scores
+    - string_keys:     random 8-letter strings
+    """
+    rng = random.Random(seed)
+    if distribution == 'random':
+        scores = [rng.randrange(n * 10) for _ in range(n)]
+    elif distribution == 'nearly_sorted':
+        scores = list(range(n))
+        for _ in range(max(1, n // 100)):
+            i, j = rng.randrange(n), rng.randrange(n)
+            scores[i], scores[j] = scores[j], scores[i]
+    elif distribution == 'many_duplicates':
+        scores = [rng.randrange(10) for _ in range(n)]
+    elif distribution == 'string_keys':
+        letters = string.ascii_lowercase
+        scores = [''.join(rng.choices(letters, k=8)) for _ in range(n)]
+    else:
+        raise ValueError(f"Unknown distribution '{distribution}'. Choose from {DISTRIBUTIONS}.")
+
+    return [{'name': f'user{i}', 'age': 18 + i % 60, 'score': score} for i, score in enumerate(scores)]
+
+
+# ============= MEASUREMENT =============
+def time_callable(func: Callable, data: List[Dict[str, Any]], mutates: bool,
+                  repeats: int = 7, number: Optional[int] = None) -> Dict[str, float]:
+    """
+    Time `func(data)` and return per-call statistics in seconds.
+    Functions that mutate their input get a fresh copy per call, prepared before the timer starts.
+    """
+    if number is None:
+        # Calibrate the inner loop so a sample is long enough to be measured reliably
+        number = 1
+        while True:
+            copies = [data.copy() for _ in range(number)] if mutates else None
+            start = time.perf_counter()
+            for i in range(number):
+                func(copies[i] if mutates else data)
+            if time.perf_counter() - start >= MIN_SAMPLE_SECONDS or number >= 1_000_000:
+                break
+            number *= 10
+
+    samples = []
+    for _ in range(repeats):
+        copies = [data.copy() for _ in range(number)] if mutates else None
+        start = time.perf_counter()
+        for i in range(number):
+            func(copies[i] if mutates else data)
+        samples.append((time.perf_counter() - start) / number)
+        del copies
+
+    quartiles = statistics.quantiles(samples, n=4) if len(samples) > 1 else [samples[0]] * 3
+    return {
+        'median_s': statistics.median(samples),
+        'iqr_s': quartiles[2] - quartiles[0],
+        'min_s': min(samples),
+        'repeats': repeats,
+        'number': number,
+    }
+
+
+def peak_memory(func: Callable, data: List[Dict[str, Any]], mutates: bool) -> int:
+    """Peak bytes allocated by one call (copy for mutating functions made before tracing)."""
+    arg = data.copy() if mutates else data
+    tracemalloc.start()
+    func(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def run_suite(sizes: List[int], distributions: List[str], repeats: int = 7,
+              bubble_max: int = BUBBLE_SORT_MAX_SIZE, key: str = 'score') -> Dict[str, Any]:
+    results = []
+    for distribution in distributions:
+        for n in sizes:
+            data = generate_records(n, distribution)
+            print(f"\n--- {distribution}, n={n:,} ---")
+            for name, func, mutates in METHODS:
+                if func is sort_by_key_manual_bubble and n > bubble_max:
+                    print(f"  {name:<22} skipped (n > {bubble_max:,})")
+                    continue
+
+                sort_call = lambda d, f=func: f(d, key)
+                # Large inputs are slow enough that fewer samples are still stable
+                timing = time_callable(sort_call, data, mutates, repeats=repeats if n < 1_000_000 else 3)
+                peak = peak_memory(sort_call, data, mutates)
+                print(f"  {name:<22} median {timing['median_s'] * 1000:10.4f}ms "
+                      f"| IQR {timing['iqr_s'] * 1000:8.4f}ms | peak {peak / 1024:10.1f} KiB")
+                results.append(dict(timing, method=name, size=n, distribution=distribution, peak_bytes=peak))
+
+    return {
+        'machine': {'python': sys.version.split()[0], 'implementation': platform.python_implementation(),
+                    'platform': platform.platform(), 'processor': platform.processor()},
+        'config': {'sizes': sizes, 'distributions': distributions, 'repeats': repeats,
+                   'bubble_max': bubble_max, 'key': key},
+        'results': results,
+    }
+
+
+def run_topk_suite(sizes: List[int], distributions: List[str], k: int = 100,
+                   repeats: int = 7) -> Dict[str, Any]:
+    """Top-k selection against full sort + slice, and sort_by_keys against one-pass tuple keys."""
+    cases = [
+        ("full sort + slice (safe)", lambda d: sort_by_key_safe(d, 'score', reverse=True)[:k]),
+        ("full sort + slice (optimized)", lambda d: sort_by_key_optimized(d, 'score', reverse=True)[:k]),
+        (f"top_k_by_key (k={k})", lambda d: top_k_by_key(d, 'score', k, reverse=True)),
+        # Same directions on both sides; the tuple-key form cannot negate string keys
+        ("tuple key, one pass (score, age)", lambda d: sorted(d, key=lambda x: (x['score'], x['age']))),
+        ("sort_by_keys (score, age)", lambda d: sort_by_keys(d, [('score', False), ('age', False)])),
+        ("tuple key, one pass (score, age, name)", lambda d: sorted(
+            d, key=lambda x: (x['score'], x['age'], x['name']))),
+        ("sort_by_keys (score, age, name)", lambda d: sort_by_keys(
+            d, [('score', False), ('age', False), ('name', False)])),
+        ("sort_by_keys (score desc, age asc)", lambda d: sort_by_keys(d, [('score', True), ('age', False)])),
+    ]
+    results = []
+    for distribution in distributions:
+        for n in sizes:
+            data = generate_records(n, distribution)
+            print(f"\n--- {distribution}, n={n:,} ---")
+            for name, func in cases:
+                timing = time_callable(func, data, mutates=False, repeats=repeats if n < 1_000_000 else 3)
+                peak = peak_memory(func, data, mutates=False)
+                print(f"  {name:<38} median {timing['median_s'] * 1000:10.4f}ms "
+                      f"| IQR {timing['iqr_s'] * 1000:8.4f}ms | peak {peak / 1024:10.1f} KiB")
+                results.append(dict(timing, method=name, size=n, distribution=distribution, peak_bytes=peak))
+    return {'config': {'suite': 'topk', 'sizes': sizes, 'distributions': distributions, 'k': k},
+            'results': results}
+
+
+def compare_runs(current: Dict[str, Any], baseline: Dict[str, Any],
+                 threshold: float = REGRESSION_THRESHOLD) -> List[Dict[str, Any]]:
+    """Median ratios (current / baseline) for every (method, size, distribution) in both runs."""
+    base = {(r['method'], r['size'], r['distribution']): r for r in baseline['results']}
+    rows = []
+    print("\n" + "=" * 70)
+    print(f"COMPARISON AGAINST BASELINE (regression if slower than {threshold:.2f}x)")
+    print("=" * 70)
+    for r in current['results']:
+        ref = base.get((r['method'], r['size'], r['distribution']))
+        if ref is None:
+            continue
+        ratio = r['median_s'] / ref['median_s']
+        regression = ratio > threshold
+        rows.append({'method': r['method'], 'size': r['size'], 'distribution': r['distribution'],
+                     'ratio': ratio, 'regression': regression})
+        flag = "  <-- REGRESSION" if regression else ""
+        print(f"  {r['method']:<22} {r['distribution']:<16} n={r['size']:<10,} {ratio:6.2f}x{flag}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the dictionary sorting implementations.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="Record counts (10 to 10^7; default up to 10^6).")
+    parser.add_argument('--distributions', nargs='+', choices=DISTRIBUTIONS, default=DISTRIBUTIONS)
+    parser.add_argument('--repeats', type=int, default=7, help="Timed samples per measurement.")
+    parser.add_argument('--bubble-max', type=int, default=BUBBLE_SORT_MAX_SIZE,
+                        help="Skip bubble sort above this many records.")
+    parser.add_argument('--suite', choices=['sort', 'topk'], default='sort',
+                        help="'sort': the four sort_by_key_* implementations; 'topk': top-k and multi-key.")
+    parser.add_argument('--k', type=int, default=100, help="k for the top-k suite.")
+    parser.add_argument('--json', help="Write machine-readable results to this file.")
+    parser.add_argument('--compare', help="Baseline JSON from a previous run to compare against.")
+    args = parser.parse_args()
+
+    if args.suite == 'topk':
+        report = run_topk_suite(args.sizes, args.distributions, args.k, args.repeats)
+    else:
+        report = run_suite(args.sizes, args.distributions, args.repeats, args.bubble_max)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.json}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare_runs(report, json.load(f))
@@ -0,0 +1,299 @@
+"""
+Maintained Sorted Indexes over a Record Collection
+Instead of re-sorting the whole list of dicts on every request (what
+benchmark_sorting_methods measures), IndexedRecords keeps one sorted index per key
+and updates it incrementally when records are inserted, updated or deleted.
+Each index is a blocked sorted list (a list of bisect-sorted blocks), so ordered
+iteration and range queries walk the stored records without copying or sorting.
+Ordering matches sort_by_key_safe: missing keys take `default`, ties keep insertion order.
+
+Usage:
+    python sorted_index.py --records 100000 --ops 200 --write-ratios 0.01 0.1 0.5 0.9
+"""
+
+import argparse
+import random
+import time
+from bisect import bisect_left, insort
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Iterator, Tuple
+
+DEFAULT_LOAD = 1_000          # Target block size; blocks split above 2x and merge below 0.5x
+_AFTER_ALL = float('inf')     # Sorts after every record id in an (key, record id) entry
+
+
+# ============= BLOCKED SORTED LIST =============
+class SortedKeyList:
+    """
+    Sorted list of (key, record id) entries split into blocks of about `load` entries.
+    A bisect over the block maxima finds the block, a bisect inside the block finds the slot.
+    Time Complexity: add/remove O(log n) search + O(load) block shift
+    Space Complexity: O(n)
+    """
+
+    def __init__(self, entries: Iterable[Tuple[Any, int]] = (), load: int = DEFAULT_LOAD):
+        entries = sorted(entries)
+        self._load = load
+        self._blocks = [entries[i:i + load] for i in range(0, len(entries), load)]
+        self._maxes = [block[-1] for block in self._blocks]
+        self._len = len(entries)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def add(self, entry: Tuple[Any, int]) -> None:
+        if not self._blocks:
+            self._blocks.append([entry])
+            self._maxes.append(entry)
+        else:
+            i = bisect_left(self._maxes, entry)
+            if i == len(self._maxes):
+                i -= 1
+                self._blocks[i].append(entry)
+                self._maxes[i] = entry
+            else:
+                insort(self._blocks[i], entry)
+            self._split(i)
+        self._len += 1
+
+    def remove(self, entry: Tuple[Any, int]) -> None:
+        i = bisect_left(self._maxes, entry)
+        block = self._blocks[i] if i < len(self._blocks) else []
+        j = bisect_left(block, entry)
+        if j == len(block) or block[j] != entry:
+            raise KeyError(entry)
+        del block[j]
+        self._len -= 1
+        if not block:
+            del self._blocks[i], self._maxes[i]
+            return
+        self._maxes[i] = block[-1]
+        if len(block) < self._load // 2 and len(self._blocks) > 1:
+            # Merge with a neighbour so the number of blocks stays ~n / load
+            i = i - 1 if i > 0 else i
+            self._blocks[i].extend(self._blocks[i + 1])
+            self._maxes[i] = self._blocks[i][-1]
+            del self._blocks[i + 1], self._maxes[i + 1]
+            self._split(i)
+
+    def _split(self, i: int) -> None:
+        block = self._blocks[i]
+        if len(block) > 2 * self._load:
+            self._blocks.insert(i + 1, block[self._load:])
+            del block[self._load:]
+            self._maxes.insert(i, block[-1])
+
+    def _locate(self, bound: tuple) -> Tuple[int, int]:
+        """(block, offset) of the first entry >= bound."""
+        i = bisect_left(self._maxes, bound)
+        if i == len(self._blocks):
+            return i, 0
+        return i, bisect_left(self._blocks[i], bound)
+
+    def __iter__(self) -> Iterator[Tuple[Any, int]]:
+        for block in self._blocks:
+            yield from block
+
+    def __reversed__(self) -> Iterator[Tuple[Any, int]]:
+        for block in reversed(self._blocks):
+            yield from reversed(block)
+
+    def irange(self, low: Any = None, high: Any = None, inclusive: Tuple[bool, bool] = (True, True),
+               reverse: bool = False) -> Iterator[Tuple[Any, int]]:
+        """Entries with low <= key <= high (None = unbounded), in order or reverse order."""
+        # (key,) sorts before every (key, id) entry and (key, inf) after all of them
+        start = (0, 0) if low is None else self._locate((low,) if inclusive[0] else (low, _AFTER_ALL))
+        stop = (len(self._blocks), 0) if high is None else \
+            self._locate((high, _AFTER_ALL) if inclusive[1] else (high,))
+        if start >= stop:
+            return
+        (bi, off), (bj, end) = start, stop
+        if not reverse:
+            for b in range(bi, bj + 1):
+                block = self._blocks[b] if b < len(self._blocks) else []
+                yield from islice(block, off if b == bi else 0, end if b == bj else len(block))
+        else:
+            for b in range(min(bj, len(self._blocks) - 1), bi - 1, -1):
+                block = self._blocks[b]
+                lo, hi = (off if b == bi else 0), (end if b == bj else len(block))
+                for k in range(hi - 1, lo - 1, -1):
+                    yield block[k]
+
+
+def _stable_reversed(entries: Iterator[Tuple[Any, int]]) -> Iterator[Tuple[Any, int]]:
+    """Descending key order with equal keys kept in ascending id order, like sorted(reverse=True)."""
+    group: List[Tuple[Any, int]] = []
+    for entry in entries:
+        if group and entry[0] != group[0][0]:
+            yield from reversed(group)
+            group = []
+        group.append(entry)
+    yield from reversed(group)
+
+
+# ============= INDEXED COLLECTION =============
+class IndexedRecords:
+    """
+    Records (dicts) addressed by an integer id, with one maintained sorted index per key.
+    Change indexed fields through update(); mutating a stored dict directly bypasses the indexes.
+    """
+
+    def __init__(self, records: Iterable[Dict[str, Any]] = (), keys: Iterable[str] = ('score',),
+                 default: Any = 0, load: int = DEFAULT_LOAD):
+        self.default = default
+        self._load = load
+        self._records: Dict[int, Dict[str, Any]] = {}
+        self._next_id = 0
+        for record in records:
+            self._records[self._next_id] = record
+            self._next_id += 1
+        self._indexes: Dict[str, SortedKeyList] = {}
+        for key in keys:
+            self.add_index(key)
+
+    def add_index(self, key: str) -> None:
+        """Build a sorted index over `key` from the current records (one O(n log n) sort)."""
+        self._indexes[key] = SortedKeyList(
+            ((record.get(key, self.default), rid) for rid, record in self._records.items()), self._load)
+
+    # --- Access ---
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __getitem__(self, record_id: int) -> Dict[str, Any]:
+        return self._records[record_id]
+
+    def __contains__(self, record_id: int) -> bool:
+        return record_id in self._records
+
+    # --- Writes: O(log n) per index ---
+    def insert(self, record: Dict[str, Any]) -> int:
+        record_id = self._next_id
+        self._next_id += 1
+        self._records[record_id] = record
+        for key, index in self._indexes.items():
+            index.add((record.get(key, self.default), record_id))
+        return record_id
+
+    def update(self, record_id: int, changes: Dict[str, Any]) -> None:
+        """Apply `changes` to a record and move it within every index whose key changed."""
+        record = self._records[record_id]
+        old = {key: record.get(key, self.default) for key in self._indexes if key in changes}
+        record.update(changes)
+        for key, old_value in old.items():
+            new_value = record.get(key, self.default)
+            if new_value != old_value:
+                self._indexes[key].remove((old_value, record_id))
+                self._indexes[key].add((new_value, record_id))
+
+    def delete(self, record_id: int) -> Dict[str, Any]:
+        record = self._records.pop(record_id)
+        for key, index in self._indexes.items():
+            index.remove((record.get(key, self.default), record_id))
+        return record
+
+    # --- Ordered reads: no sorting, no copies of the records ---
+    def iter_sorted(self, key: str, reverse: bool = False) -> Iterator[Dict[str, Any]]:
+        """Records in sort_by_key_safe(records, key, default, reverse) order."""
+        index = self._indexes[key]
+        entries = _stable_reversed(reversed(index)) if reverse else iter(index)
+        return (self._records[rid] for _, rid in entries)
+
+    def range(self, key: str, low: Any = None, high: Any = None,
+              inclusive: Tuple[bool, bool] = (True, True), reverse: bool = False) -> Iterator[Dict[str, Any]]:
+        """Records with low <= record[key] <= high (None = unbounded), ordered by `key`."""
+        entries = self._indexes[key].irange(low, high, inclusive, reverse)
+        if reverse:
+            entries = _stable_reversed(entries)
+        return (self._records[rid] for _, rid in entries)
+
+    def top_k(self, key: str, k: int, reverse: bool = True) -> List[Dict[str, Any]]:
+        """First k records in `key` order (highest first by default), e.g. a leaderboard page."""
+        return list(islice(self.iter_sorted(key, reverse), max(k, 0)))
+
+
+# ============= BENCHMARK =============
+def _workload(n: int, ops: int, write_ratio: float, seed: int = 7) -> List[Tuple[str, float, int]]:
+    """(operation, position fraction, new score) triples; writes are 80% updates, 10% inserts, 10% deletes."""
+    rng = random.Random(seed)
+    workload = []
+    for _ in range(ops):
+        if rng.random() >= write_ratio:
+            workload.append(('read', 0.0, 0))
+            continue
+        roll = rng.random()
+        op = 'update' if roll < 0.8 else 'insert' if roll < 0.9 else 'delete'
+        workload.append((op, rng.random(), rng.randrange(n * 10)))
+    return workload
+
+
+def _run_resort(data: List[Dict[str, Any]], workload, page: int) -> Tuple[float, List]:
+    from dict_sort_comparison import sort_by_key_safe
+
+    records = [dict(r) for r in data]
+    last_page = []
+    start = time.perf_counter()
+    for op, position, score in workload:
+        if op == 'read':
+            last_page = sort_by_key_safe(records, 'score', reverse=True)[:page]
+        elif op == 'update':
+            records[int(position * len(records))]['score'] = score
+        elif op == 'insert':
+            records.append({'name': 'new', 'age': 30, 'score': score})
+        else:
+            records.pop(int(position * len(records)))
+    return time.perf_counter() - start, last_page
+
+
+def _run_indexed(data: List[Dict[str, Any]], workload, page: int) -> Tuple[float, List, float]:
+    build_start = time.perf_counter()
+    index = IndexedRecords((dict(r) for r in data), keys=('score',))
+    ids = list(range(len(data)))  # Live record ids in list order, to mirror the positions used above
+    build = time.perf_counter() - build_start
+    last_page = []
+    start = time.perf_counter()
+    for op, position, score in workload:
+        if op == 'read':
+            last_page = index.top_k('score', page)
+        elif op == 'update':
+            index.update(ids[int(position * len(ids))], {'score': score})
+        elif op == 'insert':
+            ids.append(index.insert({'name': 'new', 'age': 30, 'score': score}))
+        else:
+            index.delete(ids.pop(int(position * len(ids))))
+    return time.perf_counter() - start, last_page, build
+
+
+def benchmark_workloads(n: int, ops: int, write_ratios: List[float], page: int = 100) -> List[Dict[str, Any]]:
+    """Re-sorting on every read vs. the maintained index, for several read/write mixes."""
+    from sort_benchmark import generate_records
+
+    data = generate_records(n, 'random')
+    print("=" * 78)
+    print(f"MIXED WORKLOADS: {n:,} records, {ops} operations, reads return the top {page} by 'score'")
+    print("=" * 78)
+    print(f"{'write ratio':>11} | {'re-sort s':>10} | {'indexed s':>10} | {'build s':>8} | {'speedup':>8} | match")
+    print("-" * 78)
+    results = []
+    for ratio in write_ratios:
+        workload = _workload(n, ops, ratio)
+        resort_time, resort_page = _run_resort(data, workload, page)
+        indexed_time, indexed_page, build = _run_indexed(data, workload, page)
+        match = resort_page == indexed_page
+        print(f"{ratio:>11.2f} | {resort_time:10.3f} | {indexed_time:10.4f} | {build:8.3f} | "
+              f"{resort_time / indexed_time:7.0f}x | {match}")
+        results.append({'write_ratio': ratio, 'resort_s': resort_time, 'indexed_s': indexed_time,
+                        'index_build_s': build, 'match': match})
+    print("=" * 78)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintained sorted index vs. re-sorting per request.")
+    parser.add_argument('--records', type=int, default=100_000)
+    parser.add_argument('--ops', type=int, default=200, help="Operations per workload.")
+    parser.add_argument('--write-ratios', type=float, nargs='+', default=[0.01, 0.1, 0.5, 0.9])
+    parser.add_argument('--page', type=int, default=100, help="Records returned per read.")
+    args = parser.parse_args()
+
+    benchmark_workloads(args.records, args.ops, args.write_ratios, args.page)
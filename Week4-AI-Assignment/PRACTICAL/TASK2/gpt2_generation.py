@@ -0,0 +1,701 @@
+# ==============================================================================
+# TASK 2: BATCHED, STREAMING GPT-2 TEXT GENERATION (CPU)
+# TASK2.ipynb calls pipeline("text-generation", model="gpt2") once per prompt inside
+# an input() loop: one user at a time, and nothing is shown until all
+# max_new_tokens are generated. BatchedGenerator loads the model once and serves
+# many prompts concurrently:
+#   - dynamic batching: waiting prompts are grouped into cohorts of up to max_batch_size,
+#     the oldest prompt plus the ones closest to its token length, so little compute
+#     goes to padding (max_padding bounds the padded share of a cohort)
+#   - prompts that arrive while others decode also get max_wait to gather; each new cohort is
+#     prefilled on its own, then merged into a running cohort when the rows fit (left-padding
+#     the shorter KV cache, within max_merge_padding), so users who arrive one at a time still
+#     decode in one batch instead of one forward pass each
+#   - each cohort decodes one token per step with its KV cache; cohorts that could not merge
+#     take turns, so a long answer never blocks new users; finished rows are dropped from the
+#     cache right away, along with cache positions that became padding for every row
+#   - streaming: text is handed out as soon as each token is sampled
+#     (stream() generator, astream() async iterator, generate() for the full text)
+#   - StopPolicy: max_new_tokens, stop sequences (cut from the output), end-of-text,
+#     and the model context (1024 positions for GPT-2)
+# CPU only (torch + transformers). --model takes a hub name or a local checkpoint directory.
+#
+# Usage:
+#   python gpt2_generation.py chat [--model gpt2] [--max-new-tokens 1000] [--temperature 0.7]
+#   python gpt2_generation.py download --out ./gpt2
+#   python gpt2_generation.py bench --model ./gpt2 --local-files-only [--batch-sizes 1 2 4 8 16] [--baseline]
+#                                   [--arrival-ms 20]
+# ==============================================================================
+import argparse
+import asyncio
+import queue
+import threading
+import time
+from typing import Dict, List, Any, AsyncIterator, Iterator, Optional, Tuple
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+DEFAULT_MODEL = 'gpt2'
+DEFAULT_MAX_NEW_TOKENS = 1000    # As in the notebook
+DEFAULT_TEMPERATURE = 0.7
+DEFAULT_TOP_K = 50               # transformers' sampling default, which the notebook's pipeline used
+DEFAULT_MAX_BATCH_SIZE = 8       # Prompts per cohort
+DEFAULT_MAX_ROWS = 32            # Prompts decoding at once, over all cohorts
+DEFAULT_MAX_WAIT_MS = 5.0        # How long an idle generator waits for more prompts to batch
+DEFAULT_MAX_PADDING = 0.25       # Largest share of padding tokens in a cohort
+DEFAULT_MAX_MERGE_PADDING = 0.5  # Largest share of padding in a merged KV cache (decode only attends over it)
+DEFAULT_BENCH_ARRIVAL_MS = 20.0  # Gap between prompts in the staggered benchmark
+EXIT_COMMANDS = {"exit", "quit"}
+
+BENCH_PROMPTS = [
+    "Write a Python function that sorts a list of dictionaries by a key.",
+    "Explain how AI tools help software engineers",
+    "The best way to test a login page is",
+    "Once upon a time, a developer deployed to production on a Friday and",
+    "Code review checklist:",
+    "In software engineering, technical debt refers to the cost of choosing an easy solution now instead of a better "
+    "approach that would take longer. Teams can reduce it by",
+    "def fibonacci(n):",
+    "Continuous integration pipelines should",
+]
+
+
+def padding_fraction(lengths: List[int]) -> float:
+    """Share of padding tokens when prompts of these lengths are padded to the longest one."""
+    if not lengths:
+        return 0.0
+    return 1.0 - sum(lengths) / (max(lengths) * len(lengths))
+
+
+def decode_increment(tokenizer, ids: List[int], prefix_offset: int, read_offset: int) -> Tuple[str, int, int]:
+    """
+    Text added by the newest token(s) and the new (prefix_offset, read_offset).
+    A few earlier tokens are decoded along with them, so leading spaces come out right, and
+    nothing is returned while a multi-byte character is still split across tokens.
+    """
+    prefix_text = tokenizer.decode(ids[prefix_offset:read_offset])
+    new_text = tokenizer.decode(ids[prefix_offset:])
+    if len(new_text) > len(prefix_text) and not new_text.endswith('\ufffd'):
+        return new_text[len(prefix_text):], read_offset, len(ids)
+    return '', prefix_offset, read_offset
+
+
+class StopPolicy:
+    """When a generation ends: token budget, stop sequences, end-of-text token (the context limit always applies)."""
+
+    def __init__(self, max_new_tokens: int = DEFAULT_MAX_NEW_TOKENS, stop_sequences: Optional[List[str]] = None,
+                 stop_on_eos: bool = True):
+        self.max_new_tokens = max(1, max_new_tokens)
+        self.stop_sequences = [s for s in (stop_sequences or []) if s]
+        self.stop_on_eos = stop_on_eos
+        # Streamed text stays this many characters behind, so a stop sequence is never half shown
+        self.holdback = max((len(s) for s in self.stop_sequences), default=1) - 1
+
+    def find_stop(self, text: str, new_from: int) -> int:
+        """Start of the first stop sequence in `text` that overlaps text[new_from:], or -1."""
+        found = -1
+        for stop in self.stop_sequences:
+            i = text.find(stop, max(0, new_from - len(stop) + 1))
+            if i != -1 and (found == -1 or i < found):
+                found = i
+        return found
+
+
+class GenerationRequest:
+    """One prompt in flight: its tokens, the text streamed so far, timings and the stream of text pieces."""
+
+    def __init__(self, prompt: str, prompt_ids: List[int], policy: StopPolicy, temperature: float, top_k: int,
+                 loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.prompt = prompt
+        self.prompt_ids = prompt_ids
+        self.policy = policy
+        self.temperature = temperature
+        self.top_k = top_k
+        self.output_ids: List[int] = []
+        self.text = ''           # Decoded output so far (a stop sequence is cut off)
+        self.emitted = 0         # Characters of self.text already streamed
+        self.prefix_offset = 0   # decode_increment state
+        self.read_offset = 0
+        self.finish_reason: Optional[str] = None  # 'length', 'eos', 'stop_sequence', 'context', 'cancelled', 'error'
+        self.cancelled = False
+
+        self.submitted_at = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+        # Pieces of text, then None (or an exception); an asyncio.Queue fed from the generator thread for astream
+        self._loop = loop
+        self._chunks = asyncio.Queue() if loop is not None else queue.Queue()
+
+    def deliver(self, item):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._chunks.put_nowait, item)
+        else:
+            self._chunks.put(item)
+
+    def cancel(self):
+        """Stop generating (e.g. the client went away); takes effect at the next decode step."""
+        self.cancelled = True
+
+    @property
+    def done(self) -> bool:
+        return self.finish_reason is not None
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        return None if self.first_token_at is None else self.first_token_at - self.submitted_at
+
+
+class _Cohort:
+    """Requests decoded together: one left-padded batch with a shared KV cache."""
+
+    def __init__(self, requests: List[GenerationRequest]):
+        self.requests = requests
+        self.past = None
+        self.attention_mask: Optional[torch.Tensor] = None
+        self.logits: Optional[torch.Tensor] = None  # Next-token logits, one row per request
+
+
+def _select_rows(past, rows: torch.Tensor):
+    """Keep only `rows` of a KV cache (transformers Cache object or legacy tuple of per-layer tensors)."""
+    if hasattr(past, 'batch_select_indices'):
+        past.batch_select_indices(rows)
+        return past
+    return tuple(tuple(tensor.index_select(0, rows) for tensor in layer) for layer in past)
+
+
+def _cache_layers(past) -> List[Tuple[torch.Tensor, ...]]:
+    """Per-layer (keys, values) tensors of a KV cache, each shaped (batch, heads, positions, head_dim)."""
+    if hasattr(past, 'layers'):      # transformers Cache with cache layers
+        return [(layer.keys, layer.values) for layer in past.layers]
+    if hasattr(past, 'key_cache'):   # Older DynamicCache
+        return list(zip(past.key_cache, past.value_cache))
+    return [tuple(layer) for layer in past]
+
+
+def _rebuild_cache(past, layers: List[Tuple[torch.Tensor, ...]]):
+    """A KV cache of the same kind as `past` holding `layers`."""
+    if hasattr(past, 'layers'):
+        return type(past)(layers)
+    if hasattr(past, 'key_cache'):
+        return type(past).from_legacy_cache(tuple(layers))
+    return tuple(layers)
+
+
+def _concat_caches(first, second, first_pad: int, second_pad: int):
+    """Two KV caches as one batch, each left-padded by its pad positions (masked out by the attention mask)."""
+    pad = torch.nn.functional.pad
+    return _rebuild_cache(first, [
+        tuple(torch.cat([pad(a, (0, 0, first_pad, 0)), pad(b, (0, 0, second_pad, 0))]) for a, b in zip(la, lb))
+        for la, lb in zip(_cache_layers(first), _cache_layers(second))])
+
+
+def _trim_cache(past, lead: int):
+    """Drop the first `lead` positions of a KV cache."""
+    return _rebuild_cache(past, [tuple(t[:, :, lead:] for t in layer) for layer in _cache_layers(past)])
+
+
+class BatchedGenerator:
+    """
+    Loads a causal LM once and generates for many prompts at a time on one scheduler thread.
+    submit() queues a prompt; stream()/astream()/generate() consume its output.
+    """
+
+    def __init__(self, model: str = DEFAULT_MODEL, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_rows: int = DEFAULT_MAX_ROWS, max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+                 max_padding: float = DEFAULT_MAX_PADDING, max_merge_padding: float = DEFAULT_MAX_MERGE_PADDING,
+                 num_threads: Optional[int] = None, local_files_only: bool = False, seed: Optional[int] = None):
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.tokenizer = AutoTokenizer.from_pretrained(model, local_files_only=local_files_only)
+        self.model = AutoModelForCausalLM.from_pretrained(model, local_files_only=local_files_only)
+        self.model.eval()
+        self.eos_id = self.tokenizer.eos_token_id
+        config = self.model.config
+        self.context_size = getattr(config, 'n_positions', None) or config.max_position_embeddings
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_rows = max(self.max_batch_size, max_rows)
+        self.max_wait = max_wait_ms / 1000
+        self.max_padding = max_padding
+        self.max_merge_padding = max_merge_padding
+        self._sampler = torch.Generator().manual_seed(seed) if seed is not None else None
+
+        self._waiting: List[GenerationRequest] = []
+        self._cohorts: List[_Cohort] = []  # Only touched by the scheduler thread
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # --- Stats ---
+        self.requests_total = 0
+        self.tokens_total = 0
+        self.cohorts_total = 0
+        self.cohort_rows_total = 0
+        self.merges_total = 0
+        self.decode_steps = 0
+        self.decode_rows_total = 0
+        self.prompt_tokens_total = 0
+        self.padded_tokens_total = 0
+
+        self._thread = threading.Thread(target=self._run, name='gpt2-generation', daemon=True)
+        self._thread.start()
+
+    # --- Client side ---
+    def submit(self, prompt: str, max_new_tokens: int = DEFAULT_MAX_NEW_TOKENS, temperature: float = DEFAULT_TEMPERATURE,
+               top_k: int = DEFAULT_TOP_K, stop: Optional[List[str]] = None, policy: Optional[StopPolicy] = None,
+               loop: Optional[asyncio.AbstractEventLoop] = None) -> GenerationRequest:
+        """Queue a prompt; temperature 0 means greedy decoding, top_k 0 samples from the whole vocabulary."""
+        policy = policy or StopPolicy(max_new_tokens, stop)
+        # An empty prompt starts from <|endoftext|>; a long one keeps its end and room for one new token
+        prompt_ids = (self.tokenizer.encode(prompt) or [self.eos_id])[-(self.context_size - 1):]
+        request = GenerationRequest(prompt, prompt_ids, policy, temperature, top_k, loop)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Generator is closed.")
+            self._waiting.append(request)
+            self.requests_total += 1
+            self._cond.notify()
+        return request
+
+    def stream(self, prompt: str, **options: Any) -> Iterator[str]:
+        """Yield the generated text piece by piece; closing the generator early cancels the request."""
+        request = self.submit(prompt, **options)
+        try:
+            while True:
+                item = request._chunks.get()
+                if item is None:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            request.cancel()  # No-op once finished
+
+    async def astream(self, prompt: str, **options: Any) -> AsyncIterator[str]:
+        """Async iterator over the generated text; the event loop is never blocked by the model."""
+        request = self.submit(prompt, loop=asyncio.get_running_loop(), **options)
+        try:
+            while True:
+                item = await request._chunks.get()
+                if item is None:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            request.cancel()
+
+    def generate(self, prompt: str, **options: Any) -> str:
+        return ''.join(self.stream(prompt, **options))
+
+    def close(self):
+        """Stop the scheduler; prompts still waiting or decoding end with finish_reason 'cancelled'."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def __enter__(self) -> 'BatchedGenerator':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            waiting = len(self._waiting)
+        return {
+            'requests_total': self.requests_total,
+            'tokens_total': self.tokens_total,
+            'cohorts_total': self.cohorts_total,
+            'avg_cohort_size': round(self.cohort_rows_total / self.cohorts_total, 2) if self.cohorts_total else 0.0,
+            'cohort_merges': self.merges_total,
+            'decode_steps': self.decode_steps,
+            'avg_decode_rows': round(self.decode_rows_total / self.decode_steps, 2) if self.decode_steps else 0.0,
+            'padding_fraction': round(1 - self.prompt_tokens_total / self.padded_tokens_total, 4)
+            if self.padded_tokens_total else 0.0,
+            'waiting': waiting,
+        }
+
+    # --- Scheduler thread ---
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._waiting and not self._cohorts and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    break
+                if self._waiting and not self._cohorts:
+                    # Idle: give concurrent prompts max_wait to arrive, so they share the first cohort
+                    deadline = time.monotonic() + self.max_wait
+                    while len(self._waiting) < self.max_batch_size and not self._closed:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                new_requests = self._take_cohort() if self._batch_ready() else []
+
+            if new_requests:
+                cohort = _Cohort(new_requests)
+                try:
+                    self._prefill(cohort)
+                    self._admit(cohort)
+                except Exception as e:
+                    self._fail(cohort, e)
+            # One decode step per cohort, in turn
+            for cohort in list(self._cohorts):
+                try:
+                    self._step(cohort)
+                except Exception as e:
+                    self._fail(cohort, e)
+                if not cohort.requests:
+                    self._cohorts.remove(cohort)
+
+        with self._cond:
+            leftover, self._waiting = self._waiting, []
+        for request in leftover + [r for cohort in self._cohorts for r in cohort.requests]:
+            self._finish(request, 'cancelled')
+        self._cohorts = []
+
+    def _batch_ready(self) -> bool:
+        """While cohorts decode, waiting prompts gather for max_wait (or until a full batch) before a prefill."""
+        if not self._cohorts or len(self._waiting) >= self.max_batch_size:
+            return True
+        return bool(self._waiting) and time.perf_counter() - self._waiting[0].submitted_at >= self.max_wait
+
+    def _take_cohort(self) -> List[GenerationRequest]:
+        """The oldest waiting prompt plus the waiting prompts closest to its length, within max_padding."""
+        for request in [r for r in self._waiting if r.cancelled]:
+            self._finish(request, 'cancelled')
+        self._waiting = [r for r in self._waiting if not r.cancelled]
+        room = min(self.max_batch_size, self.max_rows - sum(len(c.requests) for c in self._cohorts))
+        if room <= 0 or not self._waiting:
+            return []
+        anchor = self._waiting[0]
+        chosen, lengths = [anchor], [len(anchor.prompt_ids)]
+        for request in sorted(self._waiting[1:], key=lambda r: abs(len(r.prompt_ids) - len(anchor.prompt_ids))):
+            if len(chosen) >= room:
+                break
+            if padding_fraction(lengths + [len(request.prompt_ids)]) <= self.max_padding:
+                chosen.append(request)
+                lengths.append(len(request.prompt_ids))
+        taken = set(map(id, chosen))
+        self._waiting = [r for r in self._waiting if id(r) not in taken]
+        return chosen
+
+    def _forward(self, cohort: _Cohort, input_ids: torch.Tensor, attention_mask: torch.Tensor):
+        # Positions count real tokens only, so left padding does not shift them
+        position_ids = (attention_mask.cumsum(-1) - 1).clamp(min=0)[:, -input_ids.shape[1]:]
+        with torch.no_grad():
+            output = self.model(input_ids=input_ids, attention_mask=attention_mask, position_ids=position_ids,
+                                past_key_values=cohort.past, use_cache=True)
+        cohort.past = output.past_key_values
+        cohort.attention_mask = attention_mask
+        cohort.logits = output.logits[:, -1, :]
+
+    def _prefill(self, cohort: _Cohort):
+        lengths = [len(r.prompt_ids) for r in cohort.requests]
+        width = max(lengths)
+        # GPT-2 has no pad token; padded positions are masked out, so any id works
+        input_ids = torch.full((len(lengths), width), self.eos_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(lengths), width), dtype=torch.long)
+        for i, request in enumerate(cohort.requests):
+            input_ids[i, width - lengths[i]:] = torch.tensor(request.prompt_ids, dtype=torch.long)
+            attention_mask[i, width - lengths[i]:] = 1
+        self.cohorts_total += 1
+        self.cohort_rows_total += len(lengths)
+        self.prompt_tokens_total += sum(lengths)
+        self.padded_tokens_total += width * len(lengths)
+        self._forward(cohort, input_ids, attention_mask)
+
+    def _admit(self, cohort: _Cohort):
+        """Merge a prefilled cohort into the running cohort it fits best, or run it on its own."""
+        best, best_padding = None, self.max_merge_padding
+        for running in self._cohorts:
+            rows = len(running.requests) + len(cohort.requests)
+            if rows > self.max_batch_size:
+                continue
+            width = max(running.attention_mask.shape[1], cohort.attention_mask.shape[1])
+            padding = 1 - int(running.attention_mask.sum() + cohort.attention_mask.sum()) / (rows * width)
+            if padding <= best_padding:
+                best, best_padding = running, padding
+        if best is None:
+            self._cohorts.append(cohort)
+            return
+        width = max(best.attention_mask.shape[1], cohort.attention_mask.shape[1])
+        pad_best, pad_new = width - best.attention_mask.shape[1], width - cohort.attention_mask.shape[1]
+        pad = torch.nn.functional.pad
+        best.past = _concat_caches(best.past, cohort.past, pad_best, pad_new)
+        best.attention_mask = torch.cat([pad(best.attention_mask, (pad_best, 0)),
+                                         pad(cohort.attention_mask, (pad_new, 0))])
+        best.logits = torch.cat([best.logits, cohort.logits])
+        best.requests = best.requests + cohort.requests
+        self.merges_total += 1
+
+    def _sample(self, cohort: _Cohort) -> torch.Tensor:
+        """Next token per row: greedy for temperature 0, else top-k sampling at the row's temperature."""
+        logits = cohort.logits.float()
+        greedy = logits.argmax(-1)
+        temperatures = torch.tensor([r.temperature for r in cohort.requests], dtype=torch.float32)
+        if not bool((temperatures > 0).any()):
+            return greedy
+        vocab = logits.shape[-1]
+        row_k = torch.tensor([min(r.top_k, vocab) if r.top_k > 0 else vocab for r in cohort.requests])
+        values, indices = logits.topk(int(row_k.max()), dim=-1)
+        values = values / temperatures.clamp(min=1e-5).unsqueeze(1)
+        values = values.masked_fill(torch.arange(values.shape[1]).unsqueeze(0) >= row_k.unsqueeze(1), float('-inf'))
+        choice = torch.multinomial(torch.softmax(values, dim=-1), 1, generator=self._sampler)
+        sampled = indices.gather(1, choice).squeeze(1)
+        return torch.where(temperatures > 0, sampled, greedy)
+
+    def _step(self, cohort: _Cohort):
+        next_ids = self._sample(cohort)
+        self.decode_steps += 1
+        self.decode_rows_total += len(cohort.requests)
+        keep = [i for i, (request, token_id) in enumerate(zip(cohort.requests, next_ids.tolist()))
+                if not self._append_token(request, token_id)]
+        if not keep:
+            cohort.requests = []
+            return
+        if len(keep) < len(cohort.requests):
+            # Finished rows leave the batch (and the KV cache) at once instead of decoding padding
+            rows = torch.tensor(keep, dtype=torch.long)
+            cohort.requests = [cohort.requests[i] for i in keep]
+            cohort.past = _select_rows(cohort.past, rows)
+            cohort.attention_mask = cohort.attention_mask.index_select(0, rows)
+            next_ids = next_ids.index_select(0, rows)
+            # Positions that are padding for every remaining row (left over from merges) are dropped too
+            lead = int(cohort.attention_mask.any(0).long().argmax())
+            if lead:
+                cohort.past = _trim_cache(cohort.past, lead)
+                cohort.attention_mask = cohort.attention_mask[:, lead:]
+        attention_mask = torch.cat([cohort.attention_mask, cohort.attention_mask.new_ones((len(keep), 1))], dim=1)
+        self._forward(cohort, next_ids.unsqueeze(1), attention_mask)
+
+    def _append_token(self, request: GenerationRequest, token_id: int) -> bool:
+        """Record one sampled token and stream its text; True once the request is finished."""
+        if request.cancelled:
+            return self._finish(request, 'cancelled')
+        if request.first_token_at is None:
+            request.first_token_at = time.perf_counter()
+        policy = request.policy
+        if policy.stop_on_eos and token_id == self.eos_id:
+            return self._finish(request, 'eos')
+        request.output_ids.append(token_id)
+        self.tokens_total += 1
+
+        piece, request.prefix_offset, request.read_offset = decode_increment(
+            self.tokenizer, request.output_ids, request.prefix_offset, request.read_offset)
+        if piece:
+            new_from = len(request.text)
+            request.text += piece
+            cut = policy.find_stop(request.text, new_from)
+            if cut != -1:
+                request.text = request.text[:cut]
+                return self._finish(request, 'stop_sequence')
+        if len(request.output_ids) >= policy.max_new_tokens:
+            return self._finish(request, 'length')
+        if len(request.prompt_ids) + len(request.output_ids) >= self.context_size:
+            return self._finish(request, 'context')
+        safe = len(request.text) - policy.holdback
+        if safe > request.emitted:
+            request.deliver(request.text[request.emitted:safe])
+            request.emitted = safe
+        return False
+
+    def _finish(self, request: GenerationRequest, reason: str) -> bool:
+        if reason in ('length', 'context', 'eos'):
+            # Bytes of a character still split across tokens are decoded now (as U+FFFD if incomplete)
+            full_text = self.tokenizer.decode(request.output_ids)
+            if full_text.startswith(request.text):
+                request.text = full_text
+        if request.emitted < len(request.text):
+            request.deliver(request.text[request.emitted:])
+            request.emitted = len(request.text)
+        request.finish_reason = reason
+        request.finished_at = time.perf_counter()
+        request.deliver(None)
+        return True
+
+    def _fail(self, cohort: _Cohort, error: Exception):
+        for request in cohort.requests:
+            request.finish_reason = 'error'
+            request.finished_at = time.perf_counter()
+            request.deliver(error)
+        cohort.requests = []
+
+
+# --- Chat loop (the notebook's, with streamed answers) ---
+def chat(generator: BatchedGenerator, max_new_tokens: int, temperature: float):
+    print("This is GPT2 Models powered by JsMummie Herself")
+    while True:
+        try:
+            prompt = input("You: ").strip()
+        except EOFError:
+            prompt = "exit"
+        if prompt.lower() in EXIT_COMMANDS:
+            print("GoodBye!, Remember to code on daily basis")
+            break
+
+        # Like the pipeline's generated_text, the answer starts with the prompt
+        print("\nAI: ", prompt, end='', flush=True)
+        for piece in generator.stream(prompt, max_new_tokens=max_new_tokens, temperature=temperature):
+            print(piece, end='', flush=True)
+        print("\n")
+
+
+# --- Benchmark: tokens/sec and time to first token per batch size ---
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def _drain(request: GenerationRequest):
+    """Wait until `request` has finished streaming; a failed request raises its error."""
+    while True:
+        item = request._chunks.get()
+        if item is None:
+            return
+        if isinstance(item, BaseException):
+            raise item
+
+
+def _bench_batched(generator: BatchedGenerator, mode: str, batch_size: int, max_new_tokens: int,
+                   temperature: float, arrival_s: float = 0.0) -> Dict[str, float]:
+    """b prompts, `arrival_s` apart, each generating exactly max_new_tokens; rows per decode step show the real batch."""
+    policy = StopPolicy(max_new_tokens, stop_on_eos=False)
+    prefills_before, steps_before = generator.cohorts_total, generator.decode_steps
+    rows_before = generator.decode_rows_total
+    start = time.perf_counter()
+    requests = []
+    for i in range(batch_size):
+        if i and arrival_s:
+            time.sleep(arrival_s)
+        requests.append(generator.submit(BENCH_PROMPTS[i % len(BENCH_PROMPTS)], temperature=temperature,
+                                         policy=policy))
+    for request in requests:
+        _drain(request)
+    elapsed = time.perf_counter() - start
+    ttft = [r.time_to_first_token for r in requests]
+    steps = generator.decode_steps - steps_before
+    return {'mode': mode, 'batch_size': batch_size, 'prefills': generator.cohorts_total - prefills_before,
+            'avg_decode_rows': (generator.decode_rows_total - rows_before) / steps if steps else 0.0,
+            'tokens_per_s': sum(len(r.output_ids) for r in requests) / elapsed,
+            'ttft_p50_ms': _percentile(ttft, 0.50) * 1000, 'ttft_p95_ms': _percentile(ttft, 0.95) * 1000,
+            'stream_tokens_per_s': sum(len(r.output_ids) / (r.finished_at - r.first_token_at)
+                                       for r in requests) / batch_size}
+
+
+def benchmark_batching(model: str, batch_sizes: List[int], max_new_tokens: int, temperature: float,
+                       num_threads: Optional[int] = None, local_files_only: bool = False,
+                       baseline: bool = False, arrival_ms: float = DEFAULT_BENCH_ARRIVAL_MS) -> List[Dict[str, float]]:
+    """
+    For each batch size b, b prompts each generate exactly max_new_tokens (end-of-text is ignored,
+    so every run does the same work):
+    - together: all b arrive at once; max_padding is lifted, so they are prefilled as one cohort
+    - staggered: one arrives every `arrival_ms` while the earlier ones decode, as in a chat server
+    Every row shows the prefills it took and the average rows per decode step, i.e. the batch
+    that actually ran. With `baseline`, the same prompts also go one after another through
+    pipeline("text-generation"), as in the notebook.
+    """
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    results = []
+    print("=" * 110)
+    print(f"GPT-2 GENERATION: {model}, {max_new_tokens} new tokens per prompt, {torch.get_num_threads()} CPU threads")
+    print("=" * 110)
+    print(f"{'mode':<24} | {'batch':>5} | {'prefills':>8} | {'avg rows':>8} | {'tokens/s':>9} | {'TTFT p50 ms':>11} | "
+          f"{'TTFT p95 ms':>11} | {'per-stream tok/s':>16}")
+    print("-" * 110)
+
+    if baseline:
+        from transformers import pipeline
+        from transformers.utils import logging as transformers_logging
+        transformers_logging.set_verbosity_error()  # One max_length warning per call otherwise
+        # Tokenizer and model are loaded here, so local_files_only applies to both
+        generator_pipeline = pipeline(
+            "text-generation", device=-1,
+            model=AutoModelForCausalLM.from_pretrained(model, local_files_only=local_files_only),
+            tokenizer=AutoTokenizer.from_pretrained(model, local_files_only=local_files_only))
+        generator_pipeline(BENCH_PROMPTS[0], max_new_tokens=4)  # Warm-up
+        for batch_size in batch_sizes:
+            prompts = [BENCH_PROMPTS[i % len(BENCH_PROMPTS)] for i in range(batch_size)]
+            start = time.perf_counter()
+            done_at = []
+            for prompt in prompts:
+                generator_pipeline(prompt, max_new_tokens=max_new_tokens, min_new_tokens=max_new_tokens,
+                                   do_sample=True, temperature=temperature)
+                done_at.append(time.perf_counter() - start)  # The whole answer appears at once
+            elapsed = done_at[-1]
+            row = {'mode': 'pipeline, sequential', 'batch_size': batch_size, 'prefills': batch_size,
+                   'avg_decode_rows': 1.0, 'tokens_per_s': batch_size * max_new_tokens / elapsed,
+                   'ttft_p50_ms': _percentile(done_at, 0.50) * 1000, 'ttft_p95_ms': _percentile(done_at, 0.95) * 1000,
+                   'stream_tokens_per_s': max_new_tokens / (elapsed / batch_size)}
+            results.append(row)
+            _print_bench_row(row)
+
+    with BatchedGenerator(model, max_batch_size=max(batch_sizes), max_rows=max(batch_sizes), max_padding=1.0,
+                          num_threads=num_threads, local_files_only=local_files_only, seed=0) as generator:
+        generator.generate(BENCH_PROMPTS[0], max_new_tokens=4)  # Warm-up
+        for batch_size in batch_sizes:
+            generator.max_batch_size = generator.max_rows = batch_size
+            row = _bench_batched(generator, 'batched, together', batch_size, max_new_tokens, temperature)
+            results.append(row)
+            _print_bench_row(row)
+        if arrival_ms > 0:
+            for batch_size in batch_sizes:
+                generator.max_batch_size = generator.max_rows = batch_size
+                row = _bench_batched(generator, f'batched, {arrival_ms:g} ms apart', batch_size, max_new_tokens,
+                                     temperature, arrival_ms / 1000)
+                results.append(row)
+                _print_bench_row(row)
+        stats = generator.stats()
+        print("-" * 110)
+        print(f"Padding share of prefill tokens: {stats['padding_fraction']:.1%}; "
+              f"cohorts merged into running ones: {stats['cohort_merges']}")
+    print("=" * 110)
+    return results
+
+
+def _print_bench_row(row: Dict[str, float]):
+    print(f"{row['mode']:<24} | {row['batch_size']:>5} | {row['prefills']:>8} | {row['avg_decode_rows']:>8.1f} | "
+          f"{row['tokens_per_s']:>9.1f} | {row['ttft_p50_ms']:>11.1f} | {row['ttft_p95_ms']:>11.1f} | "
+          f"{row['stream_tokens_per_s']:>16.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Batched, streaming GPT-2 text generation on CPU.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    chat_p = sub.add_parser('chat', help="The TASK2 chat loop, with the answer streamed as it is generated.")
+    chat_p.add_argument('--max-new-tokens', type=int, default=DEFAULT_MAX_NEW_TOKENS)
+    chat_p.add_argument('--temperature', type=float, default=DEFAULT_TEMPERATURE)
+
+    download_p = sub.add_parser('download', help="Save the model and tokenizer to a local checkpoint directory.")
+    download_p.add_argument('--out', default='./gpt2')
+
+    bench_p = sub.add_parser('bench', help="Tokens/sec and time to first token for several batch sizes.")
+    bench_p.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    bench_p.add_argument('--max-new-tokens', type=int, default=64)
+    bench_p.add_argument('--temperature', type=float, default=DEFAULT_TEMPERATURE)
+    bench_p.add_argument('--baseline', action='store_true', help="Also time the notebook's sequential pipeline.")
+    bench_p.add_argument('--arrival-ms', type=float, default=DEFAULT_BENCH_ARRIVAL_MS,
+                         help="Gap between prompts in the staggered runs (0 skips them).")
+
+    for command_p in (chat_p, download_p, bench_p):
+        command_p.add_argument('--model', default=DEFAULT_MODEL, help="Hub name or local checkpoint directory.")
+    for command_p in (chat_p, bench_p):
+        command_p.add_argument('--local-files-only', action='store_true', help="Never download (offline).")
+        command_p.add_argument('--threads', type=int, help="torch CPU threads (default: torch's choice).")
+    args = parser.parse_args()
+
+    if args.command == 'download':
+        AutoTokenizer.from_pretrained(args.model).save_pretrained(args.out)
+        AutoModelForCausalLM.from_pretrained(args.model).save_pretrained(args.out)
+        print(f"Saved {args.model} to {args.out}.")
+    elif args.command == 'chat':
+        with BatchedGenerator(args.model, num_threads=args.threads, local_files_only=args.local_files_only) as gpt2:
+            chat(gpt2, args.max_new_tokens, args.temperature)
+    else:
+        benchmark_batching(args.model, args.batch_sizes, args.max_new_tokens, args.temperature, args.threads,
+                           args.local_files_only, args.baseline, args.arrival_ms)
@@ -6,6 +6,8 @@
 # ==============================================================================
 
 # --- 1. Import Libraries ---
+from typing import List, Optional
+
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
@@ -14,118 +16,231 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score, f1_score, classification_report
 import matplotlib.pyplot as plt # Added for optional visualization
 
-print("Libraries imported successfully.")
+from permutation_importance import compute_permutation_importance, save_permutation_importance
+
+# --- Dataset Constants ---
+DATA_PATH = 'wdbc_data.csv'
+MDI_PLOT_PATH = 'feature_importances_mdi.png'
+PERMUTATION_JSON_PATH = 'permutation_importance.json'
+PERMUTATION_PLOT_PATH = 'permutation_importance.png'
+DROP_COLUMNS = ['id', 'Unnamed: 32']             # Identifier and the redundant trailing column
+TARGET_COLUMNS = ['diagnosis', 'priority', 'priority_encoded']
+
+# Priority levels in LabelEncoder order (alphabetical), so a level's index is its encoded value.
+PRIORITY_CLASSES = np.array(['High', 'Low', 'Medium'], dtype=object)
+HIGH_CODE, LOW_CODE, MEDIUM_CODE = 0, 1, 2
+
+
+# ==============================================================================
+# PREPROCESSING COMPONENTS (importable)
+# ==============================================================================
+
+def clean_wdbc(df: pd.DataFrame) -> pd.DataFrame:
+    """Standard cleaning for WDBC: drop the ID and the redundant last column ('Unnamed: 32')."""
+    return df.drop(DROP_COLUMNS, axis=1, errors='ignore')
+
+
+def compute_benign_median_radius(df: pd.DataFrame) -> float:
+    """Median 'radius_mean' of the Benign ('B') rows, used to split Medium from Low priority."""
+    radius = df['radius_mean'].to_numpy()
+    benign_radius = radius[df['diagnosis'].to_numpy() == 'B']
+    if benign_radius.size == 0:
+        raise ValueError("Could not calculate median radius, as no Benign samples were found.")
+    return float(np.nanmedian(benign_radius))
+
+
+def priority_codes(diagnosis, radius_mean, benign_median_radius: float) -> np.ndarray:
+    """
+    Vectorized label engineering: returns the encoded priority for every row at once.
+    Malignant ('M') -> High; Benign at or above the median radius -> Medium; otherwise Low.
+    """
+    is_malignant = np.asarray(diagnosis) == 'M'
+    is_large = np.asarray(radius_mean) >= benign_median_radius
+    codes = np.full(is_malignant.shape, LOW_CODE, dtype=np.int8)
+    codes[is_large] = MEDIUM_CODE
+    codes[is_malignant] = HIGH_CODE
+    return codes
+
+
+def assign_priority_labels(diagnosis, radius_mean, benign_median_radius: float) -> np.ndarray:
+    """Same rule as `priority_codes`, returned as the 'High'/'Medium'/'Low' strings."""
+    return PRIORITY_CLASSES[priority_codes(diagnosis, radius_mean, benign_median_radius)]
+
+
+class PriorityPreprocessor:
+    """
+    Fit/transform wrapper around the Task 3 preprocessing steps:
+    cleaning (drop), label engineering (priority), target encoding and feature scaling.
+
+    Pass `benign_median_radius` to reuse a threshold computed elsewhere (e.g. on the full
+    dataset before splitting); otherwise it is computed from the data given to `fit`.
+    """
+
+    def __init__(self, benign_median_radius: Optional[float] = None):
+        self.benign_median_radius = benign_median_radius
+        self.benign_median_radius_: Optional[float] = None
+        self.label_encoder_ = LabelEncoder()
+        self.scaler_ = StandardScaler()
+        self.feature_names_: List[str] = []
+
+    def fit(self, df: pd.DataFrame) -> 'PriorityPreprocessor':
+        df = clean_wdbc(df)
+        if self.benign_median_radius is None:
+            self.benign_median_radius_ = compute_benign_median_radius(df)
+        else:
+            self.benign_median_radius_ = float(self.benign_median_radius)
 
-# --- 2. Data Loading and Cleaning ---
-try:
-    # NOTE: Ensure your dataset file is named 'wdbc_data.csv' and is in the same directory.
-    df = pd.read_csv('wdbc_data.csv') 
-    print(f"Dataset loaded. Initial shape: {df.shape}")
-except FileNotFoundError:
-    print("FATAL ERROR: 'wdbc_data.csv' not found. Please check the file path and name.")
-    exit() 
+        self.label_encoder_.fit(PRIORITY_CLASSES)
+        self.feature_names_ = [col for col in df.columns if col not in TARGET_COLUMNS]
+        self.scaler_.fit(df[self.feature_names_].to_numpy(dtype=np.float64))
+        return self
 
-# Standard cleaning for WDBC: Drop ID and the redundant last column ('Unnamed: 32')
-df = df.drop(['id', 'Unnamed: 32'], axis=1, errors='ignore')
+    def label(self, df: pd.DataFrame) -> np.ndarray:
+        """Priority strings ('High'/'Medium'/'Low') for each row of `df`."""
+        self._check_fitted()
+        return assign_priority_labels(df['diagnosis'], df['radius_mean'], self.benign_median_radius_)
 
+    def transform(self, df: pd.DataFrame) -> np.ndarray:
+        """Scaled feature matrix in the order seen during `fit`."""
+        self._check_fitted()
+        return self.scaler_.transform(df[self.feature_names_].to_numpy(dtype=np.float64))
 
-# --- 3. Goal 1: Data Preprocessing (Label Engineering & Splitting) ---
+    def transform_target(self, df: pd.DataFrame) -> np.ndarray:
+        """Encoded priority target (matches `label_encoder_.classes_`)."""
+        self._check_fitted()
+        return priority_codes(df['diagnosis'], df['radius_mean'], self.benign_median_radius_).astype(np.int64)
 
-### 3a. Feature Engineering: Creating Multi-Class Target ('priority')
-# Convert binary diagnosis (M/B) into three resource allocation levels (High/Medium/Low).
-# Logic: Malignant ('M') is always 'High'. Benign ('B') is split based on 'radius_mean' size.
-benign_data = df[df['diagnosis'] == 'B']
+    def fit_transform(self, df: pd.DataFrame) -> np.ndarray:
+        return self.fit(df).transform(df)
 
-if not benign_data.empty:
-    # Determine the split point for Benign cases using the median radius
-    benign_median_radius = benign_data['radius_mean'].median()
+    @property
+    def classes_(self) -> np.ndarray:
+        return self.label_encoder_.classes_
+
+    def _check_fitted(self):
+        if self.benign_median_radius_ is None:
+            raise RuntimeError("PriorityPreprocessor is not fitted yet. Call 'fit' first.")
+
+
+# ==============================================================================
+# MAIN ANALYSIS SCRIPT
+# ==============================================================================
+
+def main():
+    print("Libraries imported successfully.")
+
+    # --- 2. Data Loading and Cleaning ---
+    try:
+        # NOTE: Ensure your dataset file is named 'wdbc_data.csv' and is in the same directory.
+        df = pd.read_csv(DATA_PATH)
+        print(f"Dataset loaded. Initial shape: {df.shape}")
+    except FileNotFoundError:
+        print("FATAL ERROR: 'wdbc_data.csv' not found. Please check the file path and name.")
+        exit()
+
+    # Standard cleaning for WDBC: Drop ID and the redundant last column ('Unnamed: 32')
+    df = clean_wdbc(df)
+
+
+    # --- 3. Goal 1: Data Preprocessing (Label Engineering & Splitting) ---
+
+    ### 3a. Feature Engineering: Creating Multi-Class Target ('priority')
+    # Convert binary diagnosis (M/B) into three resource allocation levels (High/Medium/Low).
+    # Logic: Malignant ('M') is always 'High'. Benign ('B') is split based on 'radius_mean' size.
+    try:
+        # Determine the split point for Benign cases using the median radius
+        benign_median_radius = compute_benign_median_radius(df)
+    except ValueError as e:
+        print(f"FATAL ERROR: {e}")
+        exit()
     print(f"Calculated Benign Split Threshold (radius_mean): {benign_median_radius:.4f}")
 
-    def assign_priority(row):
-        if row['diagnosis'] == 'M':
-            return 'High'  # Highest resource need
-        elif row['radius_mean'] >= benign_median_radius:
-            return 'Medium' # Moderate resource need
-        else:
-            return 'Low'     # Lowest resource need
-    
-    df['priority'] = df.apply(assign_priority, axis=1)
+    # Columnar masks over the whole frame instead of a per-row apply()
+    df['priority'] = assign_priority_labels(df['diagnosis'], df['radius_mean'], benign_median_radius)
     print("\nNew Priority Distribution:")
     print(df['priority'].value_counts())
-else:
-    print("FATAL ERROR: Could not calculate median radius, as no Benign samples were found.")
-    exit()
-
-### 3b. Final Target Encoding and Data Split
-le = LabelEncoder()
-df['priority_encoded'] = le.fit_transform(df['priority'])
-target_names = le.classes_ # Store class names for final reporting (e.g., ['High', 'Low', 'Medium'])
-print("Priority Encoding Map:", dict(zip(le.classes_, le.transform(le.classes_))))
-
-# Define Features (X) and Target (y)
-X = df.drop(['diagnosis', 'priority', 'priority_encoded'], axis=1)
-y = df['priority_encoded']
-
-# Split data: 70% Train, 30% Test. Stratify ensures class balance in both sets.
-X_train_raw, X_test_raw, y_train, y_test = train_test_split(
-    X, y,
-    test_size=0.3,
-    random_state=42,
-    stratify=y 
-)
-
-# Feature Scaling: Use StandardScaler to normalize feature ranges
-scaler = StandardScaler()
-X_train = scaler.fit_transform(X_train_raw)
-X_test = scaler.transform(X_test_raw)
-print(f"Data Split: Training set {X_train.shape}, Test set {X_test.shape}")
-
-
-# --- 4. Goal 2: Model Training ---
-print("\n--- Training Random Forest Model ---")
-
-# Initialize and train the classifier. 'balanced' helps manage potential class imbalance.
-rf_model = RandomForestClassifier(n_estimators=100, random_state=42, class_weight='balanced') 
-rf_model.fit(X_train, y_train)
-print("Random Forest model training complete.")
-
-# Make predictions on the held-out test data
-y_pred = rf_model.predict(X_test)
-
-
-# --- 5. Goal 3: Model Evaluation (Metrics) ---
-print("\n--- Model Performance Evaluation ---")
-
-# Calculate required metrics
-accuracy = accuracy_score(y_test, y_pred)
-f1_weighted = f1_score(y_test, y_pred, average='weighted')
-
-print("--- REQUIRED PERFORMANCE METRICS ---")
-print(f"1. Accuracy Score: {accuracy:.4f}")
-print(f"2. F1-Score (Weighted): {f1_weighted:.4f}")
-
-# Detailed breakdown is crucial for multi-class problems
-print("\nDetailed Classification Report:")
-print(classification_report(y_test, y_pred, target_names=target_names))
-
-
-# --- 6. BONUS: Feature Importance Analysis (For better resource justification) ---
-print("\n--- Feature Importance for Model Interpretation ---")
-
-# Extract importances and map them back to the original feature names
-importances = rf_model.feature_importances_
-feature_importances = pd.Series(importances, index=X_train_raw.columns).sort_values(ascending=False)
-
-print("Top 10 Features Driving Priority Prediction:")
-print("-" * 40)
-print(feature_importances.head(10))
-
-# Optional: Visualize the top 10 features
-plt.figure(figsize=(10, 6))
-feature_importances.head(10).plot(kind='barh', color='skyblue')
-plt.title('Top 10 Feature Importances for Resource Allocation Priority')
-plt.xlabel('Importance Score (Gini/Mean Decrease Impurity)')
-plt.ylabel('Feature Name')
-plt.gca().invert_yaxis() # Highest importance at the top
-plt.tight_layout()
-plt.show()
\ No newline at end of file
+
+    ### 3b. Final Target Encoding and Data Split
+    # Split data: 70% Train, 30% Test. Stratify ensures class balance in both sets.
+    train_df, test_df = train_test_split(
+        df,
+        test_size=0.3,
+        random_state=42,
+        stratify=df['priority']
+    )
+
+    # Encoding and feature scaling are fit on the training rows only
+    preprocessor = PriorityPreprocessor(benign_median_radius=benign_median_radius).fit(train_df)
+    target_names = preprocessor.classes_ # Store class names for final reporting (e.g., ['High', 'Low', 'Medium'])
+    le = preprocessor.label_encoder_
+    print("Priority Encoding Map:", dict(zip(le.classes_, le.transform(le.classes_))))
+
+    X_train, y_train = preprocessor.transform(train_df), preprocessor.transform_target(train_df)
+    X_test, y_test = preprocessor.transform(test_df), preprocessor.transform_target(test_df)
+    print(f"Data Split: Training set {X_train.shape}, Test set {X_test.shape}")
+
+
+    # --- 4. Goal 2: Model Training ---
+    print("\n--- Training Random Forest Model ---")
+
+    # Initialize and train the classifier. 'balanced' helps manage potential class imbalance.
+    rf_model = RandomForestClassifier(n_estimators=100, random_state=42, class_weight='balanced')
+    rf_model.fit(X_train, y_train)
+    print("Random Forest model training complete.")
+
+    # Make predictions on the held-out test data
+    y_pred = rf_model.predict(X_test)
+
+
+    # --- 5. Goal 3: Model Evaluation (Metrics) ---
+    print("\n--- Model Performance Evaluation ---")
+
+    # Calculate required metrics
+    accuracy = accuracy_score(y_test, y_pred)
+    f1_weighted = f1_score(y_test, y_pred, average='weighted')
+
+    print("--- REQUIRED PERFORMANCE METRICS ---")
+    print(f"1. Accuracy Score: {accuracy:.4f}")
+    print(f"2. F1-Score (Weighted): {f1_weighted:.4f}")
+
+    # Detailed breakdown is crucial for multi-class problems
+    print("\nDetailed Classification Report:")
+    print(classification_report(y_test, y_pred, target_names=target_names))
+
+
+    # --- 6. BONUS: Feature Importance Analysis (For better resource justification) ---
+    print("\n--- Feature Importance for Model Interpretation ---")
+
+    # Extract importances and map them back to the original feature names
+    importances = rf_model.feature_importances_
+    feature_importances = pd.Series(importances, index=preprocessor.feature_names_).sort_values(ascending=False)
+
+    print("Top 10 Features Driving Priority Prediction:")
+    print("-" * 40)
+    print(feature_importances.head(10))
+
+    # Optional: Visualize the top 10 features (saved to file, so headless runs never block)
+    plt.figure(figsize=(10, 6))
+    feature_importances.head(10).plot(kind='barh', color='skyblue')
+    plt.title('Top 10 Feature Importances for Resource Allocation Priority')
+    plt.xlabel('Importance Score (Gini/Mean Decrease Impurity)')
+    plt.ylabel('Feature Name')
+    plt.gca().invert_yaxis() # Highest importance at the top
+    plt.tight_layout()
+    plt.savefig(MDI_PLOT_PATH)
+    plt.close()
+    print(f"MDI chart saved to '{MDI_PLOT_PATH}'.")
+
+    ### 6b. Permutation Importance (unbiased, per-feature justification with confidence intervals)
+    print("\n--- Permutation Importance on the Test Set (95% CI) ---")
+    permutation_results = compute_permutation_importance(rf_model, X_test, y_test, preprocessor.feature_names_)
+    for result in permutation_results[:10]:
+        print(f"{result['feature']:<24} {result['importance_mean']:.4f} "
+              f"[{result['ci_low']:.4f}, {result['ci_high']:.4f}]")
+    save_permutation_importance(permutation_results, PERMUTATION_JSON_PATH, PERMUTATION_PLOT_PATH,
+                                metadata={'scoring': 'accuracy', 'n_test_rows': int(X_test.shape[0])})
+    print(f"Permutation importances saved to '{PERMUTATION_JSON_PATH}' and '{PERMUTATION_PLOT_PATH}'.")
+
+
+if __name__ == '__main__':
+    main()
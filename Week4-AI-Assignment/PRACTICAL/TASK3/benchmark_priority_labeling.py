@@ -0,0 +1,94 @@
+# ==============================================================================
+# BENCHMARK: Row-wise apply() vs. vectorized priority labeling
+# Compares the original `df.apply(assign_priority, axis=1)` label engineering with
+# the columnar masks used by Task3_Resource_Allocation_Prediction.py, on synthetic
+# WDBC-shaped frames from 10^4 up to 10^7 rows.
+#
+# Usage: python benchmark_priority_labeling.py [--sizes 10000 100000 ...] [--max-apply-rows N]
+# ==============================================================================
+import argparse
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from Task3_Resource_Allocation_Prediction import assign_priority_labels, compute_benign_median_radius
+
+DEFAULT_SIZES = [10**4, 10**5, 10**6, 10**7]
+
+
+def make_synthetic_wdbc(n_rows: int, seed: int = 42) -> pd.DataFrame:
+    """Only the two columns the labeling step reads, with WDBC-like proportions (~37% malignant)."""
+    rng = np.random.default_rng(seed)
+    diagnosis = np.where(rng.random(n_rows) < 0.37, 'M', 'B')
+    radius_mean = rng.normal(14.1, 3.5, n_rows).clip(6.0, 28.0)
+    return pd.DataFrame({'diagnosis': diagnosis, 'radius_mean': radius_mean})
+
+
+def label_rowwise(df: pd.DataFrame, benign_median_radius: float) -> pd.Series:
+    """The original implementation, kept verbatim for comparison."""
+    def assign_priority(row):
+        if row['diagnosis'] == 'M':
+            return 'High'  # Highest resource need
+        elif row['radius_mean'] >= benign_median_radius:
+            return 'Medium' # Moderate resource need
+        else:
+            return 'Low'     # Lowest resource need
+
+    return df.apply(assign_priority, axis=1)
+
+
+def label_vectorized(df: pd.DataFrame, benign_median_radius: float) -> np.ndarray:
+    return assign_priority_labels(df['diagnosis'], df['radius_mean'], benign_median_radius)
+
+
+def _best_of(func, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run_benchmark(sizes: List[int], max_apply_rows: Optional[int] = None, repeats: int = 3) -> List[Dict]:
+    results = []
+    print("=" * 70)
+    print(f"{'rows':>10} | {'apply() (s)':>12} | {'vectorized (s)':>14} | {'speedup':>8}")
+    print("-" * 70)
+
+    for n_rows in sizes:
+        df = make_synthetic_wdbc(n_rows)
+        threshold = compute_benign_median_radius(df)
+
+        vectorized_time = _best_of(lambda: label_vectorized(df, threshold), repeats)
+
+        rowwise_time = None
+        if max_apply_rows is None or n_rows <= max_apply_rows:
+            # apply() is slow enough that a single run is representative at large sizes
+            rowwise_time = _best_of(lambda: label_rowwise(df, threshold), 1 if n_rows >= 10**6 else repeats)
+            if n_rows <= 10**5:
+                expected = label_rowwise(df, threshold).to_numpy()
+                assert np.array_equal(expected, label_vectorized(df, threshold)), "Label mismatch!"
+
+        speedup = f"{rowwise_time / vectorized_time:7.1f}x" if rowwise_time else "   n/a"
+        rowwise_str = f"{rowwise_time:12.4f}" if rowwise_time else f"{'skipped':>12}"
+        print(f"{n_rows:>10} | {rowwise_str} | {vectorized_time:14.4f} | {speedup:>8}")
+
+        results.append({"rows": n_rows, "apply_s": rowwise_time, "vectorized_s": vectorized_time})
+
+    print("=" * 70)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark priority label engineering.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="Row counts to benchmark (default: 10^4 .. 10^7).")
+    parser.add_argument('--max-apply-rows', type=int, default=None,
+                        help="Skip the row-wise apply() baseline above this many rows.")
+    parser.add_argument('--repeats', type=int, default=3, help="Best-of-N repeats per measurement.")
+    args = parser.parse_args()
+
+    run_benchmark(args.sizes, args.max_apply_rows, args.repeats)
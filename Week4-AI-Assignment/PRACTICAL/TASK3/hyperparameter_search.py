@@ -0,0 +1,243 @@
+# ==============================================================================
+# TASK 3: PARALLEL, CACHED HYPERPARAMETER SEARCH FOR THE PRIORITY MODEL
+# Stratified k-fold cross-validation of RandomForestClassifier over n_estimators,
+# max_depth, max_features and class_weight, spread across a process pool.
+#   - Folds are scaled once in the parent and shared with workers through
+#     multiprocessing.shared_memory (no pickled copies of the data per task).
+#   - Every finished (params, fold) score is appended to an on-disk JSONL cache,
+#     so an interrupted search resumes where it stopped.
+#
+# Usage:
+#   python hyperparameter_search.py wdbc_data.csv [--folds 5] [--workers N] [--cache search_cache.jsonl]
+#   python hyperparameter_search.py wdbc_data.csv --scaling      # wall-clock at 1, 2, 4 and N workers
+# ==============================================================================
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import StratifiedKFold
+
+from Task3_Resource_Allocation_Prediction import DATA_PATH, PriorityPreprocessor, clean_wdbc
+
+PARAM_GRID = {
+    'n_estimators': [100, 200, 400],
+    'max_depth': [None, 8, 16],
+    'max_features': ['sqrt', 'log2', 0.5],
+    'class_weight': ['balanced', None],
+}
+DEFAULT_CACHE_PATH = 'search_cache.jsonl'
+RANDOM_STATE = 42
+
+
+# ==============================================================================
+# SHARED FOLD DATA
+# ==============================================================================
+
+class SharedFolds:
+    """
+    Per-fold scaled feature matrices, the target and the fold assignment, laid out in
+    one shared-memory block: X (k, n, f) float64 | y (n,) int64 | test_fold (n,) int64.
+    Each fold's slice of X is the whole dataset scaled with that fold's training statistics.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, n_folds: int, n_rows: int, n_features: int):
+        self.shm = shm
+        self.shape = (n_folds, n_rows, n_features)
+        x_bytes = n_folds * n_rows * n_features * 8
+        self.X = np.ndarray(self.shape, dtype=np.float64, buffer=shm.buf)
+        self.y = np.ndarray((n_rows,), dtype=np.int64, buffer=shm.buf, offset=x_bytes)
+        self.test_fold = np.ndarray((n_rows,), dtype=np.int64, buffer=shm.buf, offset=x_bytes + n_rows * 8)
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, n_folds: int) -> 'SharedFolds':
+        df = clean_wdbc(df)
+        # Labels use the full-data threshold, exactly like the main script
+        labeler = PriorityPreprocessor().fit(df)
+        y = labeler.transform_target(df)
+        n_rows, n_features = len(df), len(labeler.feature_names_)
+
+        shm = shared_memory.SharedMemory(create=True, size=(n_folds * n_rows * n_features + 2 * n_rows) * 8)
+        folds = cls(shm, n_folds, n_rows, n_features)
+        folds.y[:] = y
+
+        splitter = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=RANDOM_STATE)
+        for fold, (train_idx, test_idx) in enumerate(splitter.split(np.zeros(n_rows), y)):
+            folds.test_fold[test_idx] = fold
+            fold_prep = PriorityPreprocessor(benign_median_radius=labeler.benign_median_radius_)
+            fold_prep.fit(df.iloc[train_idx])
+            folds.X[fold] = fold_prep.transform(df)
+        return folds
+
+    @classmethod
+    def attach(cls, name: str, shape: Tuple[int, int, int]) -> 'SharedFolds':
+        # Pool workers share the parent's resource tracker, which unlinks the block once
+        return cls(shared_memory.SharedMemory(name=name), *shape)
+
+    def fingerprint(self) -> str:
+        """Identifies the data and fold layout, so cached scores are never reused for other data."""
+        digest = hashlib.sha256()
+        for array in (self.X, self.y, self.test_fold):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()[:16]
+
+    def release(self, unlink: bool = False):
+        del self.X, self.y, self.test_fold
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+# ==============================================================================
+# WORKER SIDE
+# ==============================================================================
+
+_worker_folds: Optional[SharedFolds] = None
+
+
+def _init_worker(name: str, shape: Tuple[int, int, int]):
+    global _worker_folds
+    _worker_folds = SharedFolds.attach(name, shape)
+
+
+def _evaluate(params: Dict, fold: int) -> Dict:
+    folds = _worker_folds
+    test_mask = folds.test_fold == fold
+    X, y = folds.X[fold], folds.y
+
+    start = time.perf_counter()
+    # One core per task: the pool provides the parallelism
+    model = RandomForestClassifier(random_state=RANDOM_STATE, n_jobs=1, **params)
+    model.fit(X[~test_mask], y[~test_mask])
+    y_pred = model.predict(X[test_mask])
+    return {
+        'params': params,
+        'fold': fold,
+        'accuracy': accuracy_score(y[test_mask], y_pred),
+        'f1_weighted': f1_score(y[test_mask], y_pred, average='weighted'),
+        'fit_seconds': time.perf_counter() - start,
+    }
+
+
+# ==============================================================================
+# SEARCH DRIVER
+# ==============================================================================
+
+def expand_grid(grid: Dict[str, List]) -> List[Dict]:
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def _task_key(fingerprint: str, params: Dict, fold: int) -> str:
+    return json.dumps({'data': fingerprint, 'params': params, 'fold': fold}, sort_keys=True)
+
+
+def load_cache(path: Optional[str]) -> Dict[str, Dict]:
+    cache = {}
+    if path and os.path.exists(path):
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # A torn last line from an interrupted run
+                cache[entry['key']] = entry['result']
+    return cache
+
+
+def run_tasks(folds: SharedFolds, tasks: List[Tuple[Dict, int]], workers: int,
+              cache_path: Optional[str] = None, verbose: bool = True) -> List[Dict]:
+    """Evaluate (params, fold) tasks in a process pool, skipping and extending the cache."""
+    fingerprint = folds.fingerprint()
+    cache = load_cache(cache_path)
+    results = [cache[_task_key(fingerprint, p, f)] for p, f in tasks if _task_key(fingerprint, p, f) in cache]
+    pending = [(p, f) for p, f in tasks if _task_key(fingerprint, p, f) not in cache]
+    if results and verbose:
+        print(f"Resuming: {len(results)} cached results, {len(pending)} tasks left.")
+
+    cache_file = open(cache_path, 'a') if cache_path else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(folds.shm.name, folds.shape)) as pool:
+            futures = [pool.submit(_evaluate, params, fold) for params, fold in pending]
+            for done, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                results.append(result)
+                if cache_file:
+                    key = _task_key(fingerprint, result['params'], result['fold'])
+                    cache_file.write(json.dumps({'key': key, 'result': result}) + '\n')
+                    cache_file.flush()
+                if verbose and (done % 25 == 0 or done == len(futures)):
+                    print(f"  {done}/{len(futures)} tasks complete")
+    finally:
+        if cache_file:
+            cache_file.close()
+    return results
+
+
+def summarize(results: List[Dict]) -> pd.DataFrame:
+    # Parameters as strings: groupby would drop None values and pandas would turn ints into floats
+    rows = [dict({name: str(value) for name, value in r['params'].items()},
+                 fold=r['fold'], accuracy=r['accuracy'], f1_weighted=r['f1_weighted'])
+            for r in results]
+    frame = pd.DataFrame(rows)
+    param_cols = list(PARAM_GRID)
+    summary = frame.groupby(param_cols).agg(
+        f1_mean=('f1_weighted', 'mean'), f1_std=('f1_weighted', 'std'),
+        accuracy_mean=('accuracy', 'mean'), folds=('fold', 'count'))
+    return summary.sort_values('f1_mean', ascending=False).reset_index()
+
+
+def scaling_report(folds: SharedFolds, tasks: List[Tuple[Dict, int]]) -> List[Dict]:
+    """Wall-clock of the same uncached task list at 1, 2, 4 and N workers."""
+    worker_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+    report = []
+    print("=" * 70)
+    print(f"{'workers':>8} | {'wall-clock (s)':>14} | {'speedup':>8} | {'efficiency':>10}")
+    print("-" * 70)
+    for workers in worker_counts:
+        start = time.perf_counter()
+        run_tasks(folds, tasks, workers, cache_path=None, verbose=False)
+        elapsed = time.perf_counter() - start
+        baseline = report[0]['seconds'] if report else elapsed
+        speedup = baseline / elapsed
+        print(f"{workers:>8} | {elapsed:14.2f} | {speedup:7.2f}x | {speedup / workers:10.0%}")
+        report.append({'workers': workers, 'seconds': elapsed, 'speedup': speedup})
+    print("=" * 70)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Cross-validated hyperparameter search for the priority model.")
+    parser.add_argument('path', nargs='?', default=DATA_PATH, help="WDBC CSV (default: wdbc_data.csv).")
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH, help="JSONL cache of finished (params, fold) tasks.")
+    parser.add_argument('--scaling', action='store_true',
+                        help="Report wall-clock scaling on a subset of the grid instead of searching.")
+    args = parser.parse_args()
+
+    shared = SharedFolds.build(pd.read_csv(args.path), args.folds)
+    try:
+        all_tasks = [(params, fold) for params in expand_grid(PARAM_GRID) for fold in range(args.folds)]
+        if args.scaling:
+            scaling_report(shared, all_tasks[:8 * args.folds])
+        else:
+            print(f"Searching {len(all_tasks) // args.folds} parameter sets x {args.folds} folds "
+                  f"on {args.workers} workers...")
+            start_time = time.perf_counter()
+            summary = summarize(run_tasks(shared, all_tasks, args.workers, args.cache))
+            print(f"Search finished in {time.perf_counter() - start_time:.1f}s.\n")
+            print("Top 5 parameter sets (by mean weighted F1):")
+            print(summary.head(5).to_string(index=False))
+    finally:
+        shared.release(unlink=True)
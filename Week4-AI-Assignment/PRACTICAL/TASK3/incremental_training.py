@@ -0,0 +1,210 @@
+# ==============================================================================
+# TASK 3: INCREMENTAL (WARM-START) RETRAINING OF THE PRIORITY MODEL
+# Updates the model as new labeled records arrive instead of rerunning the full
+# script on the whole history. Each update costs time proportional to the batch:
+#   - the benign radius threshold is re-read from a maintained QuantileSketch
+#   - StandardScaler statistics are updated with partial_fit
+#   - new trees are grown on the new batch only (RandomForestClassifier warm_start)
+# Existing trees have their split thresholds re-expressed in the updated scaler units,
+# so their decisions on raw features are unchanged up to float rounding (trees compare
+# features as float32, so a sample sitting right at a split can flip). Threshold drift is tracked and
+# a full retrain is recommended when it exceeds a tolerance.
+#
+# Usage:
+#   python incremental_training.py init wdbc_data.csv --state priority_trainer.joblib
+#   python incremental_training.py update new_batch.csv --state priority_trainer.joblib [--trees 10]
+#   python incremental_training.py export --state priority_trainer.joblib --artifact priority_model
+# ==============================================================================
+import argparse
+import time
+from typing import Dict, List
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+from Task3_Resource_Allocation_Prediction import PRIORITY_CLASSES, PriorityPreprocessor, clean_wdbc
+from streaming_ingest import QuantileSketch
+
+DEFAULT_STATE_PATH = 'priority_trainer.joblib'
+DEFAULT_INITIAL_TREES = 100
+DEFAULT_TREES_PER_UPDATE = 10
+DEFAULT_DRIFT_TOLERANCE = 0.02  # Relative change of the benign threshold that warrants a full retrain
+
+
+class IncrementalPriorityTrainer:
+    """Keeps the preprocessing, the quantile sketch and a warm-start forest in step across updates."""
+
+    def __init__(self, n_estimators: int = DEFAULT_INITIAL_TREES,
+                 trees_per_update: int = DEFAULT_TREES_PER_UPDATE,
+                 drift_tolerance: float = DEFAULT_DRIFT_TOLERANCE, random_state: int = 42):
+        self.trees_per_update = trees_per_update
+        self.drift_tolerance = drift_tolerance
+        self.preprocessor = PriorityPreprocessor()
+        self.radius_sketch = QuantileSketch()
+        # class_weight is set before every fit from the cumulative class counts: the 'balanced'
+        # preset would only see the current batch
+        self.rf_model = RandomForestClassifier(n_estimators=n_estimators, random_state=random_state,
+                                               warm_start=True, n_jobs=-1)
+        self.class_counts = np.zeros(len(PRIORITY_CLASSES), dtype=np.int64)
+        self.initial_threshold: float = float('nan')
+        self.history: List[Dict] = []
+
+    # --- Helpers ---
+    @staticmethod
+    def _benign_radius(df: pd.DataFrame) -> np.ndarray:
+        return df['radius_mean'].to_numpy()[df['diagnosis'].to_numpy() == 'B']
+
+    def _training_arrays(self, df: pd.DataFrame):
+        """
+        Scaled features, encoded target and sample weights for a batch. Priority classes
+        missing from the batch get one zero-weight placeholder row, so every warm-start
+        fit sees the same class set as the existing trees.
+        """
+        X = self.preprocessor.transform(df)
+        y = self.preprocessor.transform_target(df)
+        self.class_counts += np.bincount(y, minlength=len(PRIORITY_CLASSES))
+        weights = np.ones(len(y))
+        missing = np.setdiff1d(np.arange(len(PRIORITY_CLASSES)), y)
+        if missing.size:
+            X = np.vstack([X, np.zeros((missing.size, X.shape[1]))])
+            y = np.concatenate([y, missing])
+            weights = np.concatenate([weights, np.zeros(missing.size)])
+        return X, y, weights
+
+    def _balanced_class_weight(self) -> Dict[int, float]:
+        """'balanced' weights (n_samples / (n_classes * count)) over the whole history seen so far."""
+        total, n_classes = self.class_counts.sum(), len(self.class_counts)
+        return {code: float(total / (n_classes * count)) if count else 1.0
+                for code, count in enumerate(self.class_counts)}
+
+    def _rebase_tree_thresholds(self, old_mean: np.ndarray, old_scale: np.ndarray):
+        """Re-express every existing split threshold in the current scaler units (exact up to float rounding)."""
+        new_mean, new_scale = self.preprocessor.scaler_.mean_, self.preprocessor.scaler_.scale_
+        for estimator in self.rf_model.estimators_:
+            tree = estimator.tree_
+            split = tree.children_left != -1
+            feature = tree.feature[split]
+            raw_threshold = tree.threshold[split] * old_scale[feature] + old_mean[feature]
+            tree.threshold[split] = (raw_threshold - new_mean[feature]) / new_scale[feature]
+
+    # --- Training ---
+    def fit(self, df: pd.DataFrame) -> 'IncrementalPriorityTrainer':
+        """Initial full fit on the historical data."""
+        df = clean_wdbc(df)
+        self.radius_sketch.update(self._benign_radius(df))
+        self.preprocessor = PriorityPreprocessor(benign_median_radius=self.radius_sketch.median())
+        self.preprocessor.fit(df)
+        self.initial_threshold = self.preprocessor.benign_median_radius_
+
+        X, y, weights = self._training_arrays(df)
+        self.rf_model.class_weight = self._balanced_class_weight()
+        self.rf_model.fit(X, y, sample_weight=weights)
+        self.history.append({'event': 'fit', 'rows': len(df), 'threshold': self.initial_threshold,
+                             'n_trees': len(self.rf_model.estimators_)})
+        return self
+
+    def partial_fit(self, new_df: pd.DataFrame) -> Dict:
+        """Fold a batch of newly labeled records into the model; returns an update summary."""
+        if not self.history:
+            raise RuntimeError("Call 'fit' on the historical data before 'partial_fit'.")
+        start = time.perf_counter()
+        new_df = clean_wdbc(new_df)
+
+        # 1. Threshold from the maintained sketch (O(batch) update, fixed-size state)
+        old_threshold = self.preprocessor.benign_median_radius_
+        self.radius_sketch.update(self._benign_radius(new_df))
+        new_threshold = self.radius_sketch.median()
+        self.preprocessor.benign_median_radius = self.preprocessor.benign_median_radius_ = new_threshold
+
+        # 2. Online scaler update; keep existing trees consistent with the new units
+        old_mean = self.preprocessor.scaler_.mean_.copy()
+        old_scale = self.preprocessor.scaler_.scale_.copy()
+        self.preprocessor.scaler_.partial_fit(new_df[self.preprocessor.feature_names_].to_numpy(dtype=np.float64))
+        self._rebase_tree_thresholds(old_mean, old_scale)
+
+        # 3. Grow additional trees on the new batch only
+        X, y, weights = self._training_arrays(new_df)
+        self.rf_model.class_weight = self._balanced_class_weight()
+        self.rf_model.n_estimators += self.trees_per_update
+        self.rf_model.fit(X, y, sample_weight=weights)
+
+        drift = {
+            'since_last': new_threshold - old_threshold,
+            'since_fit': new_threshold - self.initial_threshold,
+            'relative_since_fit': (new_threshold - self.initial_threshold) / self.initial_threshold,
+        }
+        summary = {
+            'event': 'partial_fit',
+            'rows': len(new_df),
+            'threshold': new_threshold,
+            'drift': drift,
+            'retrain_recommended': abs(drift['relative_since_fit']) > self.drift_tolerance,
+            'n_trees': len(self.rf_model.estimators_),
+            'seconds': time.perf_counter() - start,
+        }
+        self.history.append(summary)
+        return summary
+
+    def predict(self, df: pd.DataFrame) -> np.ndarray:
+        """Priority names for raw WDBC rows."""
+        encoded = self.rf_model.predict(self.preprocessor.transform(clean_wdbc(df)))
+        return self.preprocessor.label_encoder_.inverse_transform(encoded)
+
+    # --- Persistence ---
+    def save(self, path: str = DEFAULT_STATE_PATH) -> str:
+        joblib.dump(self, path)
+        return path
+
+    @staticmethod
+    def load(path: str = DEFAULT_STATE_PATH) -> 'IncrementalPriorityTrainer':
+        return joblib.load(path)
+
+    def to_artifact(self):
+        """Snapshot as a PriorityModelArtifact for the scoring engine and the inference server."""
+        from model_artifact import PriorityModelArtifact
+        return PriorityModelArtifact.from_fitted(self.preprocessor, self.rf_model)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Incremental retraining of the Task 3 priority model.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    init_p = sub.add_parser('init', help="Initial fit on the historical CSV.")
+    init_p.add_argument('csv')
+    init_p.add_argument('--trees', type=int, default=DEFAULT_INITIAL_TREES)
+
+    update_p = sub.add_parser('update', help="Fold a CSV of new labeled records into the model.")
+    update_p.add_argument('csv')
+    update_p.add_argument('--trees', type=int, default=DEFAULT_TREES_PER_UPDATE, help="Trees to add.")
+
+    export_p = sub.add_parser('export', help="Write the current model as a scoring artifact.")
+    export_p.add_argument('--artifact', default='priority_model')
+
+    for sub_parser in (init_p, update_p, export_p):
+        sub_parser.add_argument('--state', default=DEFAULT_STATE_PATH, help="Trainer state file.")
+    args = parser.parse_args()
+
+    if args.command == 'init':
+        start_time = time.perf_counter()
+        trainer = IncrementalPriorityTrainer(n_estimators=args.trees).fit(pd.read_csv(args.csv))
+        trainer.save(args.state)
+        print(f"Initial fit: {trainer.history[-1]['rows']} rows, {trainer.history[-1]['n_trees']} trees, "
+              f"threshold {trainer.initial_threshold:.4f} ({time.perf_counter() - start_time:.2f}s).")
+    elif args.command == 'update':
+        trainer = IncrementalPriorityTrainer.load(args.state)
+        trainer.trees_per_update = args.trees
+        result = trainer.partial_fit(pd.read_csv(args.csv))
+        trainer.save(args.state)
+        print(f"Update: {result['rows']} rows in {result['seconds']:.2f}s -> {result['n_trees']} trees.")
+        print(f"Benign threshold: {result['threshold']:.4f} "
+              f"(drift since last {result['drift']['since_last']:+.4f}, "
+              f"since initial fit {result['drift']['relative_since_fit']:+.2%})")
+        if result['retrain_recommended']:
+            print(f"WARNING: threshold drift exceeds {trainer.drift_tolerance:.0%}; "
+                  "labels of older trees no longer match. A full retrain is recommended.")
+    else:
+        trainer = IncrementalPriorityTrainer.load(args.state)
+        trainer.to_artifact().save(args.artifact)
+        print(f"Exported {len(trainer.rf_model.estimators_)} trees to '{args.artifact}'.")
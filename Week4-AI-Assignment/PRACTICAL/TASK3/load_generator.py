@@ -0,0 +1,139 @@
+# ==============================================================================
+# TASK 3: LOAD GENERATOR FOR THE PRIORITY INFERENCE SERVER
+# Fires concurrent single-record /predict requests over keep-alive connections and
+# reports requests/sec and latency percentiles. `--compare` starts the server twice
+# (per-request prediction vs. micro-batching) and prints the gain from batching.
+#
+# Usage:
+#   python load_generator.py --port 8080 --concurrency 64 --requests 5000
+#   python load_generator.py --compare priority_model --concurrency 64 --requests 5000
+# ==============================================================================
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from model_artifact import PriorityModelArtifact
+from priority_server import DEFAULT_HOST, DEFAULT_MAX_WAIT_MS, DEFAULT_PORT
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'priority_server.py')
+
+
+async def _http_request(reader, writer, method: str, path: str, body: bytes = b'') -> Dict:
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                 f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status_line = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    payload = json.loads(await reader.readexactly(length))
+    if b' 200 ' not in status_line:
+        raise RuntimeError(f"{status_line.decode().strip()}: {payload}")
+    return payload
+
+
+async def _client(host: str, port: int, bodies: List[bytes], latencies: List[float]):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for body in bodies:
+            start = time.perf_counter()
+            await _http_request(reader, writer, 'POST', '/predict', body)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def run_load(host: str, port: int, records: np.ndarray, n_requests: int, concurrency: int) -> Dict:
+    bodies = [json.dumps({'features': records[i % len(records)].tolist()}).encode() for i in range(n_requests)]
+    per_client = [bodies[i::concurrency] for i in range(concurrency)]
+    latencies: List[float] = []
+
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, chunk, latencies) for chunk in per_client if chunk))
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    server_metrics = await _http_request(reader, writer, 'GET', '/metrics')
+    writer.close()
+
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    return {'requests': n_requests, 'elapsed_s': elapsed, 'rps': n_requests / elapsed,
+            'p50_ms': p50, 'p99_ms': p99, 'avg_batch_size': server_metrics['avg_batch_size'],
+            'max_queue_depth': server_metrics['max_queue_depth']}
+
+
+async def _wait_until_ready(host: str, port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            await _http_request(reader, writer, 'GET', '/health')
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+def _print_result(label: str, result: Dict):
+    print(f"{label:<22} | {result['rps']:10,.0f} | {result['p50_ms']:8.2f} | {result['p99_ms']:8.2f} | "
+          f"{result['avg_batch_size']:9.1f}")
+
+
+def compare(artifact_path: str, host: str, port: int, n_requests: int, concurrency: int,
+            max_batch_size: int, max_wait_ms: float):
+    """Run the same load against a non-batching and a batching server."""
+    records = np.asarray(PriorityModelArtifact.load(artifact_path).arrays['scaler_mean'])[None, :]
+    records = records * np.random.default_rng(0).uniform(0.7, 1.3, (256, records.shape[1]))
+
+    print("=" * 70)
+    print(f"{'mode':<22} | {'req/s':>10} | {'p50 ms':>8} | {'p99 ms':>8} | {'avg batch':>9}")
+    print("-" * 70)
+    results = {}
+    for label, batch_size in [('per-request (batch=1)', 1), (f'micro-batch (<= {max_batch_size})', max_batch_size)]:
+        server = subprocess.Popen([sys.executable, SERVER_SCRIPT, artifact_path, '--host', host,
+                                   '--port', str(port), '--max-batch-size', str(batch_size),
+                                   '--max-wait-ms', str(max_wait_ms)], stdout=subprocess.DEVNULL)
+        try:
+            asyncio.run(_wait_until_ready(host, port))
+            results[batch_size] = asyncio.run(run_load(host, port, records, n_requests, concurrency))
+            _print_result(label, results[batch_size])
+        finally:
+            server.terminate()
+            server.wait()
+    print("=" * 70)
+    print(f"Throughput gain from batching: {results[max_batch_size]['rps'] / results[1]['rps']:.2f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load-test the priority inference server.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--compare', metavar='ARTIFACT',
+                        help="Start the server from ARTIFACT with and without batching and compare.")
+    parser.add_argument('--max-batch-size', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.compare, args.host, args.port, args.requests, args.concurrency,
+                args.max_batch_size, args.max_wait_ms)
+    else:
+        random_records = np.random.default_rng(0).normal(size=(256, 30))
+        _print_result('running server', asyncio.run(run_load(args.host, args.port, random_records,
+                                                              args.requests, args.concurrency)))
@@ -0,0 +1,247 @@
+# ==============================================================================
+# TASK 3: PERSISTED PRIORITY MODEL ARTIFACT + BATCH SCORING ENGINE
+# Saves the fitted StandardScaler statistics, LabelEncoder classes, feature order
+# and RandomForestClassifier as a directory of plain .npy arrays plus metadata.json.
+# Loading memory-maps the arrays (no unpickling of trees), so cold start is fast, and
+# scoring walks every tree of the forest at once with vectorized NumPy indexing.
+#
+# Usage:
+#   python model_artifact.py train wdbc_data.csv --out priority_model
+#   python model_artifact.py score priority_model new_records.csv --batch-size 1024
+#   python model_artifact.py bench priority_model wdbc_data.csv
+# ==============================================================================
+import argparse
+import json
+import os
+import time
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+from Task3_Resource_Allocation_Prediction import PriorityPreprocessor, clean_wdbc
+
+ARTIFACT_FORMAT_VERSION = 1
+METADATA_FILE = 'metadata.json'
+ARRAY_NAMES = ['scaler_mean', 'scaler_scale', 'roots', 'children_left', 'children_right',
+               'feature', 'threshold', 'value']
+DEFAULT_BATCH_SIZE = 1024
+DEFAULT_BENCH_BATCH_SIZES = [1, 8, 64, 512, 4096]
+
+
+def _flatten_forest(rf_model: RandomForestClassifier) -> Dict[str, np.ndarray]:
+    """
+    Concatenate the node arrays of every tree into global arrays.
+    Child indices are made global, and leaves point to themselves so that a fixed
+    number of traversal steps (the forest depth) lands every sample on its leaf.
+    """
+    roots, lefts, rights, features, thresholds, values = [], [], [], [], [], []
+    offset = 0
+    for estimator in rf_model.estimators_:
+        tree = estimator.tree_
+        node_ids = np.arange(tree.node_count, dtype=np.int64) + offset
+        is_leaf = tree.children_left == -1
+
+        roots.append(offset)
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+        rights.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+        features.append(np.where(is_leaf, 0, tree.feature).astype(np.int64))
+        thresholds.append(tree.threshold.astype(np.float64))
+
+        # Per-node class distribution, normalized like DecisionTreeClassifier.predict_proba
+        node_values = tree.value[:, 0, :].astype(np.float64)
+        values.append(node_values / node_values.sum(axis=1, keepdims=True))
+        offset += tree.node_count
+
+    return {
+        'roots': np.asarray(roots, dtype=np.int64),
+        'children_left': np.concatenate(lefts),
+        'children_right': np.concatenate(rights),
+        'feature': np.concatenate(features),
+        'threshold': np.concatenate(thresholds),
+        'value': np.concatenate(values),
+    }
+
+
+class PriorityModelArtifact:
+    """
+    Self-contained, loadable priority model: scaling + forest + class names.
+    Build one with `from_fitted`, persist it with `save`, reopen it with `load`.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], metadata: Dict):
+        self.arrays = arrays
+        self.metadata = metadata
+        self.feature_names: List[str] = metadata['feature_names']
+        self.classes = np.asarray(metadata['classes'], dtype=object)
+        self.max_depth: int = metadata['max_depth']
+
+    # --- Construction & persistence ---
+    @classmethod
+    def from_fitted(cls, preprocessor: PriorityPreprocessor,
+                    rf_model: RandomForestClassifier) -> 'PriorityModelArtifact':
+        arrays = _flatten_forest(rf_model)
+        arrays['scaler_mean'] = np.asarray(preprocessor.scaler_.mean_, dtype=np.float64)
+        arrays['scaler_scale'] = np.asarray(preprocessor.scaler_.scale_, dtype=np.float64)
+
+        # Forest classes are encoded priorities; map them back to their names
+        class_names = preprocessor.label_encoder_.inverse_transform(rf_model.classes_.astype(int))
+        metadata = {
+            'format_version': ARTIFACT_FORMAT_VERSION,
+            'feature_names': list(preprocessor.feature_names_),
+            'classes': [str(name) for name in class_names],
+            'benign_median_radius': preprocessor.benign_median_radius_,
+            'n_estimators': len(rf_model.estimators_),
+            'max_depth': int(max(est.tree_.max_depth for est in rf_model.estimators_)),
+            'n_nodes': int(arrays['children_left'].shape[0]),
+        }
+        return cls(arrays, metadata)
+
+    def save(self, path: str) -> str:
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(path, f'{name}.npy'), np.ascontiguousarray(self.arrays[name]))
+        with open(os.path.join(path, METADATA_FILE), 'w') as f:
+            json.dump(self.metadata, f, indent=2)
+        return path
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'PriorityModelArtifact':
+        with open(os.path.join(path, METADATA_FILE), 'r') as f:
+            metadata = json.load(f)
+        if metadata.get('format_version') != ARTIFACT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported artifact format version: {metadata.get('format_version')}")
+
+        mmap_mode = 'r' if mmap else None
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+                  for name in ARRAY_NAMES}
+        return cls(arrays, metadata)
+
+    # --- Inference ---
+    def _as_feature_matrix(self, data: Union[np.ndarray, pd.DataFrame]) -> np.ndarray:
+        if isinstance(data, pd.DataFrame):
+            data = data[self.feature_names].to_numpy()
+        X = np.asarray(data, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != len(self.feature_names):
+            raise ValueError(f"Expected {len(self.feature_names)} features, got {X.shape[1]}.")
+        return X
+
+    def predict_proba(self, data: Union[np.ndarray, pd.DataFrame]) -> np.ndarray:
+        """Class probabilities for raw (unscaled) feature rows, columns ordered like `classes`."""
+        X = self._as_feature_matrix(data)
+        # Same scaling as StandardScaler.transform, then float32 like sklearn's tree input
+        X = ((X - self.arrays['scaler_mean']) / self.arrays['scaler_scale']).astype(np.float32)
+
+        a = self.arrays
+        rows = np.arange(X.shape[0])
+        nodes = np.repeat(np.asarray(a['roots'])[:, None], X.shape[0], axis=1)  # (n_trees, n_samples)
+        for _ in range(self.max_depth):
+            go_left = X[rows, a['feature'][nodes]] <= a['threshold'][nodes]
+            nodes = np.where(go_left, a['children_left'][nodes], a['children_right'][nodes])
+
+        return a['value'][nodes].mean(axis=0)
+
+    def predict(self, data: Union[np.ndarray, pd.DataFrame]) -> np.ndarray:
+        """Priority names ('High'/'Medium'/'Low') for raw feature rows."""
+        return self.classes[np.argmax(self.predict_proba(data), axis=1)]
+
+    def score_batch(self, data: Union[str, np.ndarray, pd.DataFrame], batch_size: int = DEFAULT_BATCH_SIZE,
+                    latencies: Optional[List[float]] = None) -> np.ndarray:
+        """
+        Score a NumPy array, DataFrame or WDBC-format CSV path in micro-batches of `batch_size`.
+        Per-batch scoring latencies (seconds) are appended to `latencies` when given.
+        """
+        if isinstance(data, str):
+            # Imported lazily: only CSV scoring needs the streaming reader
+            from streaming_ingest import iter_wdbc_chunks
+            batches = (chunk[self.feature_names] for chunk in iter_wdbc_chunks(data, chunksize=batch_size))
+        else:
+            X = self._as_feature_matrix(data)
+            batches = (X[start:start + batch_size] for start in range(0, X.shape[0], batch_size))
+
+        results = []
+        for batch in batches:
+            start = time.perf_counter()
+            results.append(self.predict(batch))
+            if latencies is not None:
+                latencies.append(time.perf_counter() - start)
+        return np.concatenate(results) if results else np.empty(0, dtype=object)
+
+
+def train_priority_artifact(df: pd.DataFrame, n_estimators: int = 100,
+                            random_state: int = 42) -> PriorityModelArtifact:
+    """Fit the preprocessing and forest on all rows of a WDBC frame and bundle them."""
+    df = clean_wdbc(df)
+    preprocessor = PriorityPreprocessor().fit(df)
+    rf_model = RandomForestClassifier(n_estimators=n_estimators, random_state=random_state,
+                                      class_weight='balanced', n_jobs=-1)
+    rf_model.fit(preprocessor.transform(df), preprocessor.transform_target(df))
+    return PriorityModelArtifact.from_fitted(preprocessor, rf_model)
+
+
+def latency_report(artifact: PriorityModelArtifact, X: np.ndarray,
+                   batch_sizes: List[int] = DEFAULT_BENCH_BATCH_SIZES, min_batches: int = 200) -> List[Dict]:
+    """p50/p99 scoring latency per micro-batch size (rows are tiled up to `min_batches` batches)."""
+    X = artifact._as_feature_matrix(X)
+    report = []
+    print("=" * 70)
+    print(f"{'batch':>6} | {'p50 (ms)':>9} | {'p99 (ms)':>9} | {'rows/s':>12}")
+    print("-" * 70)
+    for batch_size in batch_sizes:
+        n_rows = batch_size * min_batches
+        tiled = np.resize(X, (n_rows, X.shape[1]))
+        latencies: List[float] = []
+        artifact.score_batch(tiled, batch_size=batch_size, latencies=latencies)
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        rows_per_s = n_rows / sum(latencies)
+        print(f"{batch_size:>6} | {p50:9.3f} | {p99:9.3f} | {rows_per_s:12,.0f}")
+        report.append({'batch_size': batch_size, 'p50_ms': p50, 'p99_ms': p99, 'rows_per_s': rows_per_s})
+    print("=" * 70)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Train, persist and score the Task 3 priority model.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    train_p = sub.add_parser('train', help="Train on a WDBC CSV and save the artifact.")
+    train_p.add_argument('csv')
+    train_p.add_argument('--out', default='priority_model')
+    train_p.add_argument('--n-estimators', type=int, default=100)
+
+    score_p = sub.add_parser('score', help="Score a CSV with a saved artifact.")
+    score_p.add_argument('artifact')
+    score_p.add_argument('csv')
+    score_p.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    bench_p = sub.add_parser('bench', help="Report p50/p99 latency per batch size.")
+    bench_p.add_argument('artifact')
+    bench_p.add_argument('csv')
+    bench_p.add_argument('--batch-sizes', type=int, nargs='+', default=DEFAULT_BENCH_BATCH_SIZES)
+
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        artifact = train_priority_artifact(pd.read_csv(args.csv), n_estimators=args.n_estimators)
+        artifact.save(args.out)
+        print(f"Saved artifact ({artifact.metadata['n_estimators']} trees, "
+              f"{artifact.metadata['n_nodes']} nodes) to '{args.out}'.")
+    else:
+        start = time.perf_counter()
+        artifact = PriorityModelArtifact.load(args.artifact)
+        print(f"Artifact loaded in {(time.perf_counter() - start) * 1000:.2f}ms.")
+
+        if args.command == 'score':
+            batch_latencies: List[float] = []
+            priorities = artifact.score_batch(args.csv, batch_size=args.batch_size, latencies=batch_latencies)
+            print(f"Scored {len(priorities)} records in {len(batch_latencies)} batches.")
+            print(pd.Series(priorities).value_counts())
+            if batch_latencies:
+                p50, p99 = np.percentile(batch_latencies, [50, 99]) * 1000
+                print(f"Batch latency: p50 {p50:.3f}ms | p99 {p99:.3f}ms")
+        else:
+            features = clean_wdbc(pd.read_csv(args.csv))[artifact.feature_names].to_numpy()
+            latency_report(artifact, features, args.batch_sizes)
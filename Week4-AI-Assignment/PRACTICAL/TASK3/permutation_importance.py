@@ -0,0 +1,127 @@
+# ==============================================================================
+# TASK 3: PARALLEL PERMUTATION IMPORTANCE FOR THE PRIORITY MODEL
+# Model-agnostic alternative to the forest's Gini/MDI importances, which are biased
+# toward high-cardinality features. For every feature the held-out score drop is
+# measured over several random permutations of that column.
+#   - Each worker holds ONE preallocated copy of X and permutes a column in place,
+#     restoring it afterwards (no copy of X per repeat).
+#   - Features are spread across worker processes.
+#   - Results (mean, std, 95% CI) are written to JSON and a PNG without any
+#     interactive matplotlib backend.
+# ==============================================================================
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+from scipy import stats
+from sklearn.metrics import accuracy_score, f1_score
+
+SCORERS = {
+    'accuracy': accuracy_score,
+    'f1_weighted': lambda y_true, y_pred: f1_score(y_true, y_pred, average='weighted'),
+}
+DEFAULT_REPEATS = 10
+CONFIDENCE = 0.95
+
+# --- Per-worker state, set once by _init_worker ---
+_model = None
+_X_buffer: Optional[np.ndarray] = None
+_y: Optional[np.ndarray] = None
+_scorer = None
+
+
+def _init_worker(model, X: np.ndarray, y: np.ndarray, scoring: str, in_pool: bool = False):
+    global _model, _X_buffer, _y, _scorer
+    _model = model
+    if in_pool and hasattr(_model, 'n_jobs'):
+        _model.n_jobs = 1  # Parallelism comes from the pool, not from the forest (worker-local copy)
+    _X_buffer = np.array(X, dtype=np.float64, order='F')  # Column-contiguous: cheap column swaps
+    _y = np.asarray(y)
+    _scorer = SCORERS[scoring]
+
+
+def _feature_score_drops(feature: int, n_repeats: int, baseline: float, random_state: int) -> np.ndarray:
+    """Score drop for each of `n_repeats` permutations of one column, permuted in place."""
+    # Seeded per feature, so results do not depend on which worker runs it
+    rng = np.random.default_rng([random_state, feature])
+    column = _X_buffer[:, feature].copy()
+    drops = np.empty(n_repeats)
+    try:
+        for repeat in range(n_repeats):
+            _X_buffer[:, feature] = column[rng.permutation(column.shape[0])]
+            drops[repeat] = baseline - _scorer(_y, _model.predict(_X_buffer))
+    finally:
+        _X_buffer[:, feature] = column
+    return drops
+
+
+def _score_drops_for(features: List[int], n_repeats: int, baseline: float, random_state: int) -> List[np.ndarray]:
+    return [_feature_score_drops(j, n_repeats, baseline, random_state) for j in features]
+
+
+def compute_permutation_importance(model, X: np.ndarray, y: np.ndarray, feature_names: List[str],
+                                   n_repeats: int = DEFAULT_REPEATS, workers: Optional[int] = None,
+                                   scoring: str = 'accuracy', random_state: int = 42) -> List[Dict]:
+    """
+    Permutation importance of every feature on (X, y), sorted by mean score drop.
+    `workers=1` runs in-process; otherwise features are split across a process pool.
+    """
+    workers = workers or os.cpu_count() or 1
+    _init_worker(model, X, y, scoring)
+    baseline = _scorer(_y, _model.predict(_X_buffer))
+
+    n_features = len(feature_names)
+    if workers == 1:
+        drops = _score_drops_for(list(range(n_features)), n_repeats, baseline, random_state)
+    else:
+        # Interleaved groups keep the per-worker load similar
+        groups = [list(range(n_features))[w::workers] for w in range(workers)]
+        drops = [None] * n_features
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model, X, y, scoring, True)) as pool:
+            futures = {pool.submit(_score_drops_for, group, n_repeats, baseline, random_state): group
+                       for group in groups if group}
+            for future, group in futures.items():
+                for feature, feature_drops in zip(group, future.result()):
+                    drops[feature] = feature_drops
+
+    t_crit = stats.t.ppf((1 + CONFIDENCE) / 2, df=max(n_repeats - 1, 1))
+    results = []
+    for name, feature_drops in zip(feature_names, drops):
+        mean = float(np.mean(feature_drops))
+        std = float(np.std(feature_drops, ddof=1)) if n_repeats > 1 else 0.0
+        half_width = t_crit * std / np.sqrt(n_repeats)
+        results.append({'feature': name, 'importance_mean': mean, 'importance_std': std,
+                        'ci_low': mean - half_width, 'ci_high': mean + half_width})
+    results.sort(key=lambda r: r['importance_mean'], reverse=True)
+
+    # The main process keeps no reference to the working buffer
+    _init_worker(None, np.empty((0, 0)), np.empty(0), scoring)
+    return results
+
+
+def save_permutation_importance(results: List[Dict], json_path: str, png_path: Optional[str] = None,
+                                top_n: int = 10, metadata: Optional[Dict] = None):
+    """Write the importances as JSON and, optionally, a bar chart with CI error bars as PNG."""
+    with open(json_path, 'w') as f:
+        json.dump({'metadata': metadata or {}, 'confidence': CONFIDENCE, 'importances': results}, f, indent=2)
+
+    if png_path:
+        # Object-oriented API: renders straight to a file, no pyplot/interactive backend involved
+        from matplotlib.figure import Figure
+
+        top = results[:top_n]
+        means = [r['importance_mean'] for r in top]
+        errors = [[r['importance_mean'] - r['ci_low'] for r in top], [r['ci_high'] - r['importance_mean'] for r in top]]
+
+        fig = Figure(figsize=(10, 6))
+        ax = fig.add_subplot()
+        ax.barh([r['feature'] for r in top], means, xerr=errors, color='skyblue', capsize=3)
+        ax.set_title(f'Top {len(top)} Permutation Importances ({int(CONFIDENCE * 100)}% CI)')
+        ax.set_xlabel('Mean Score Drop When Permuted')
+        ax.set_ylabel('Feature Name')
+        ax.invert_yaxis()  # Highest importance at the top
+        fig.tight_layout()
+        fig.savefig(png_path)
@@ -0,0 +1,237 @@
+# ==============================================================================
+# TASK 3: LOCAL HTTP INFERENCE SERVER FOR RESOURCE-ALLOCATION PRIORITY
+# A small asyncio service (standard library only) that loads the persisted model
+# artifact once and merges concurrent single-record requests into micro-batches
+# before calling predict_proba.
+#
+# Endpoints:
+#   POST /predict   {"features": [30 floats]} or {"record": {"radius_mean": ..., ...}}
+#   GET  /metrics   throughput, queue depth and batch-size statistics (JSON)
+#   GET  /health
+#
+# Usage: python priority_server.py priority_model [--port 8080] [--max-batch-size 64] [--max-wait-ms 2]
+# ==============================================================================
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from model_artifact import PriorityModelArtifact
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT_MS = 2.0
+MAX_BODY_BYTES = 1 << 20
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large',
+                500: 'Internal Server Error'}
+
+
+class MicroBatcher:
+    """
+    Collects single-record requests from a queue and scores them together.
+    A batch is flushed when it reaches `max_batch_size` or when `max_wait_ms` has
+    passed since its first record arrived, whichever comes first.
+    """
+
+    def __init__(self, artifact: PriorityModelArtifact, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms: float = DEFAULT_MAX_WAIT_MS):
+        self.artifact = artifact
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        # --- Metrics ---
+        self.started_at = time.monotonic()
+        self.requests_total = 0
+        self.batches_total = 0
+        self.max_queue_depth = 0
+        self.predict_seconds_total = 0.0
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, features: np.ndarray) -> Tuple[str, Dict[str, float]]:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((features, future))
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return await future
+
+    async def _collect_batch(self) -> List[Tuple[np.ndarray, asyncio.Future]]:
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Drain whatever is already queued without waiting
+            while len(batch) < self.max_batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            remaining = deadline - time.monotonic()
+            if len(batch) >= self.max_batch_size or remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            X = np.vstack([features for features, _ in batch])
+            start = time.perf_counter()
+            try:
+                # Scoring runs off the event loop so the next batch keeps filling meanwhile
+                proba = await loop.run_in_executor(None, self.artifact.predict_proba, X)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.predict_seconds_total += time.perf_counter() - start
+            self.batches_total += 1
+            self.requests_total += len(batch)
+
+            classes = self.artifact.classes
+            for row, (_, future) in zip(proba, batch):
+                if not future.done():
+                    future.set_result((classes[int(np.argmax(row))],
+                                       {str(name): float(p) for name, p in zip(classes, row)}))
+
+    def metrics(self) -> Dict[str, float]:
+        uptime = time.monotonic() - self.started_at
+        return {
+            'uptime_s': round(uptime, 3),
+            'requests_total': self.requests_total,
+            'batches_total': self.batches_total,
+            'throughput_rps': round(self.requests_total / uptime, 2) if uptime else 0.0,
+            'avg_batch_size': round(self.requests_total / self.batches_total, 2) if self.batches_total else 0.0,
+            'queue_depth': self.queue.qsize() if self.queue is not None else 0,
+            'max_queue_depth': self.max_queue_depth,
+            'predict_seconds_total': round(self.predict_seconds_total, 4),
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+        }
+
+
+class PriorityServer:
+    """Minimal HTTP/1.1 (keep-alive) front end for the MicroBatcher."""
+
+    def __init__(self, artifact: PriorityModelArtifact, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms: float = DEFAULT_MAX_WAIT_MS):
+        self.artifact = artifact
+        self.batcher = MicroBatcher(artifact, max_batch_size, max_wait_ms)
+        self._feature_index = {name: i for i, name in enumerate(artifact.feature_names)}
+
+    def _parse_features(self, payload: Dict) -> np.ndarray:
+        if 'features' in payload:
+            features = np.asarray(payload['features'], dtype=np.float64)
+        elif 'record' in payload:
+            record = payload['record']
+            missing = [name for name in self.artifact.feature_names if name not in record]
+            if missing:
+                raise ValueError(f"Record is missing features: {', '.join(missing[:5])}")
+            features = np.array([record[name] for name in self.artifact.feature_names], dtype=np.float64)
+        else:
+            raise ValueError("Body must contain 'features' (list) or 'record' (object).")
+        if features.shape != (len(self.artifact.feature_names),):
+            raise ValueError(f"Expected {len(self.artifact.feature_names)} features, got {features.size}.")
+        return features.reshape(1, -1)
+
+    async def _route(self, method: str, path: str, body: bytes) -> Tuple[int, Dict]:
+        if method == 'GET' and path == '/health':
+            return 200, {'status': 'ok'}
+        if method == 'GET' and path == '/metrics':
+            return 200, self.batcher.metrics()
+        if method == 'POST' and path == '/predict':
+            try:
+                features = self._parse_features(json.loads(body or b'{}'))
+            except (ValueError, TypeError) as e:
+                return 400, {'error': str(e)}
+            priority, probabilities = await self.batcher.submit(features)
+            return 200, {'priority': priority, 'probabilities': probabilities}
+        return 404, {'error': f'No route for {method} {path}'}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY_BYTES:
+                    status, response = 413, {'error': 'Request body too large.'}
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    try:
+                        status, response = await self._route(method, path.split('?', 1)[0], body)
+                    except Exception as e:
+                        status, response = 500, {'error': str(e)}
+
+                keep_alive = headers.get('connection', '').lower() != 'close' and status != 413
+                payload = json.dumps(response).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        self.batcher.start()
+        server = await asyncio.start_server(self.handle_connection, host, port, backlog=1024)
+        print(f"Priority server listening on http://{host}:{port} "
+              f"(max_batch_size={self.batcher.max_batch_size}, max_wait_ms={self.batcher.max_wait * 1000:g})")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.batcher.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve Task 3 priority predictions over local HTTP.")
+    parser.add_argument('artifact', help="Directory written by 'model_artifact.py train'.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE,
+                        help="Largest micro-batch (1 disables batching).")
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT_MS,
+                        help="How long the first request of a batch may wait for company.")
+    args = parser.parse_args()
+
+    model = PriorityModelArtifact.load(args.artifact)
+    try:
+        asyncio.run(PriorityServer(model, args.max_batch_size, args.max_wait_ms).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
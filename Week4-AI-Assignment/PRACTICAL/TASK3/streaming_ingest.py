@@ -0,0 +1,211 @@
+# ==============================================================================
+# TASK 3: STREAMING INGESTION FOR LARGE WDBC-FORMAT EXPORTS
+# Reads the CSV in chunks with compact dtypes (float32 features, categorical
+# diagnosis) and fits the PriorityPreprocessor in a single streaming pass:
+#   - StandardScaler statistics via partial_fit on every chunk
+#   - Benign median radius via a bounded-memory quantile sketch
+#     (optionally refined to the exact value with a second pass)
+# Peak memory is bounded by the chunk size, not by the file size.
+#
+# Usage: python streaming_ingest.py wdbc_data.csv [--chunksize 100000] [--two-pass]
+# ==============================================================================
+import argparse
+import resource
+import time
+from typing import Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from Task3_Resource_Allocation_Prediction import (
+    DATA_PATH, DROP_COLUMNS, PRIORITY_CLASSES, PriorityPreprocessor, clean_wdbc,
+)
+
+DEFAULT_CHUNKSIZE = 100_000
+DIAGNOSIS_DTYPE = pd.CategoricalDtype(categories=['B', 'M'])
+
+# Bucket the float32 bit pattern by its top 16 bits (sign, exponent, 7 mantissa bits):
+# 65,536 int64 counters (512 KB) regardless of how many values are streamed through.
+_BUCKET_BITS = 16
+_LOW_BITS = 32 - _BUCKET_BITS
+_N_BUCKETS = 1 << _BUCKET_BITS
+
+
+def _to_sortable_keys(values: np.ndarray) -> np.ndarray:
+    """Map float32 values to uint32 keys whose unsigned order matches the float order."""
+    bits = np.ascontiguousarray(values, dtype=np.float32).view(np.uint32)
+    flip = np.where(bits >> 31, np.uint32(0xFFFFFFFF), np.uint32(0x80000000))
+    return bits ^ flip
+
+
+def _from_sortable_key(key: int) -> float:
+    key = np.uint32(key)
+    bits = key ^ np.uint32(0x80000000) if key >> 31 else ~key
+    return float(np.array([bits], dtype=np.uint32).view(np.float32)[0])
+
+
+class QuantileSketch:
+    """
+    Mergeable, fixed-size quantile sketch for float32 streams.
+
+    Values are counted in buckets keyed by the top bits of their float32 representation,
+    so every bucket spans a single exponent and estimates are accurate to ~0.4% of the
+    value. `exact_quantile` refines the estimate with one more pass over the same data.
+    """
+
+    def __init__(self):
+        self.counts = np.zeros(_N_BUCKETS, dtype=np.int64)
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum())
+
+    def update(self, values) -> 'QuantileSketch':
+        values = np.asarray(values, dtype=np.float32)
+        values = values[~np.isnan(values)]
+        if values.size:
+            buckets = _to_sortable_keys(values) >> _LOW_BITS
+            self.counts += np.bincount(buckets, minlength=_N_BUCKETS)
+        return self
+
+    def merge(self, other: 'QuantileSketch') -> 'QuantileSketch':
+        self.counts += other.counts
+        return self
+
+    def _target_ranks(self, q: float):
+        n = self.count
+        if n == 0:
+            raise ValueError("Cannot compute a quantile of an empty sketch.")
+        position = q * (n - 1)  # same rank convention as np.quantile / np.median
+        lo = int(np.floor(position))
+        return lo, min(lo + 1, n - 1), position - lo
+
+    def _locate(self, rank: int):
+        cumulative = np.cumsum(self.counts)
+        bucket = int(np.searchsorted(cumulative, rank, side='right'))
+        rank_in_bucket = rank - (int(cumulative[bucket - 1]) if bucket else 0)
+        return bucket, rank_in_bucket
+
+    def quantile(self, q: float) -> float:
+        """Approximate quantile, interpolating within the bucket that holds the target rank."""
+        lo, hi, frac = self._target_ranks(q)
+        estimates = []
+        for rank in (lo, hi):
+            bucket, rank_in_bucket = self._locate(rank)
+            within = (rank_in_bucket + 0.5) / self.counts[bucket]
+            estimates.append(_from_sortable_key((bucket << _LOW_BITS) + int(within * ((1 << _LOW_BITS) - 1))))
+        return estimates[0] + (estimates[1] - estimates[0]) * frac
+
+    def exact_quantile(self, q: float, values_iter) -> float:
+        """
+        Exact quantile of the float32 values, given a second pass over the same data
+        (an iterable of value arrays). Only the buckets holding the target ranks are expanded.
+        """
+        lo, hi, frac = self._target_ranks(q)
+        targets = [self._locate(rank) for rank in (lo, hi)]
+        buckets = sorted({bucket for bucket, _ in targets})
+        sub_counts = {bucket: np.zeros(1 << _LOW_BITS, dtype=np.int64) for bucket in buckets}
+
+        for values in values_iter:
+            values = np.asarray(values, dtype=np.float32)
+            keys = _to_sortable_keys(values[~np.isnan(values)])
+            for bucket in buckets:
+                in_bucket = keys[(keys >> _LOW_BITS) == bucket]
+                sub_counts[bucket] += np.bincount(in_bucket & ((1 << _LOW_BITS) - 1), minlength=1 << _LOW_BITS)
+
+        exact = []
+        for bucket, rank_in_bucket in targets:
+            low = int(np.searchsorted(np.cumsum(sub_counts[bucket]), rank_in_bucket, side='right'))
+            exact.append(_from_sortable_key((bucket << _LOW_BITS) + low))
+        return exact[0] + (exact[1] - exact[0]) * frac
+
+    def median(self) -> float:
+        return self.quantile(0.5)
+
+
+def wdbc_feature_columns(path: str) -> List[str]:
+    """Feature columns of a WDBC-format CSV, read from its header only."""
+    header = pd.read_csv(path, nrows=0).columns
+    return [col for col in header if col not in DROP_COLUMNS and col != 'diagnosis']
+
+
+def iter_wdbc_chunks(path: str = DATA_PATH, chunksize: int = DEFAULT_CHUNKSIZE,
+                     columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Yield cleaned chunks of a WDBC-format CSV with compact dtypes.
+    'id' and 'Unnamed: 32' are never parsed; `columns` restricts the read further.
+    """
+    features = wdbc_feature_columns(path)
+    dtypes = {col: np.float32 for col in features}
+    dtypes['diagnosis'] = DIAGNOSIS_DTYPE
+    wanted = set(columns) if columns is not None else set(features) | {'diagnosis'}
+
+    reader = pd.read_csv(path, chunksize=chunksize, dtype=dtypes,
+                         usecols=lambda col: col in wanted and col not in DROP_COLUMNS)
+    for chunk in reader:
+        yield clean_wdbc(chunk)
+
+
+def _benign_radius(chunk: pd.DataFrame) -> np.ndarray:
+    return chunk['radius_mean'].to_numpy()[chunk['diagnosis'].to_numpy() == 'B']
+
+
+def fit_preprocessor_streaming(path: str = DATA_PATH, chunksize: int = DEFAULT_CHUNKSIZE,
+                               two_pass: bool = False) -> PriorityPreprocessor:
+    """
+    Fit a PriorityPreprocessor without loading the whole file.
+    The first pass feeds the scaler (partial_fit) and the benign radius sketch; with
+    `two_pass=True` a second, radius-only pass makes the benign median exact.
+    """
+    preprocessor = PriorityPreprocessor()
+    preprocessor.feature_names_ = wdbc_feature_columns(path)
+    preprocessor.label_encoder_.fit(PRIORITY_CLASSES)
+    sketch = QuantileSketch()
+
+    for chunk in iter_wdbc_chunks(path, chunksize):
+        preprocessor.scaler_.partial_fit(chunk[preprocessor.feature_names_].to_numpy())
+        sketch.update(_benign_radius(chunk))
+
+    if sketch.count == 0:
+        raise ValueError("Could not calculate median radius, as no Benign samples were found.")
+
+    if two_pass:
+        radius_chunks = iter_wdbc_chunks(path, chunksize, columns=['diagnosis', 'radius_mean'])
+        threshold = sketch.exact_quantile(0.5, (_benign_radius(chunk) for chunk in radius_chunks))
+    else:
+        threshold = sketch.median()
+
+    preprocessor.benign_median_radius = threshold
+    preprocessor.benign_median_radius_ = threshold
+    preprocessor.radius_sketch_ = sketch
+    return preprocessor
+
+
+def iter_preprocessed_chunks(path: str, preprocessor: PriorityPreprocessor,
+                             chunksize: int = DEFAULT_CHUNKSIZE):
+    """Yield (X_scaled, y_encoded) per chunk using an already fitted preprocessor."""
+    for chunk in iter_wdbc_chunks(path, chunksize):
+        yield preprocessor.transform(chunk), preprocessor.transform_target(chunk)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB (Linux reports ru_maxrss in KB)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Streaming fit of the Task 3 preprocessing on a WDBC-format CSV.")
+    parser.add_argument('path', nargs='?', default=DATA_PATH, help="WDBC-format CSV (default: wdbc_data.csv).")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help="Rows per chunk.")
+    parser.add_argument('--two-pass', action='store_true', help="Refine the benign median to the exact value.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    fitted = fit_preprocessor_streaming(args.path, args.chunksize, args.two_pass)
+    elapsed = time.perf_counter() - start
+
+    print(f"Rows seen by scaler: {int(fitted.scaler_.n_samples_seen_)}")
+    print(f"Benign rows in sketch: {fitted.radius_sketch_.count}")
+    print(f"Benign Split Threshold (radius_mean, {'exact' if args.two_pass else 'approximate'}): "
+          f"{fitted.benign_median_radius_:.4f}")
+    print(f"Streaming fit time: {elapsed:.2f}s | Peak RSS: {peak_rss_mb():.1f} MB")